@@ -2,7 +2,6 @@ import io
 import json
 import yaml
 import csv
-import pandas as pd
 from itertools import chain
 
 from rios.conversion import (
@@ -21,25 +20,10 @@ instrument = qualtrics['instrument']
 
 form = qualtrics['form']
 
-rios = rios_to_redcap(instrument, form)
+with open('output.csv', 'w') as csvfile:
+    rios = rios_to_redcap(instrument, form, stream=csvfile)
 
 print rios
 
-redcap = pd.DataFrame.from_dict(rios['instrument'])
-
-x = redcap.transpose()
-
-print type(x)
-
-outlist = []
-
-for things, rows in x.iterrows():
-	outlist.append(rows[0])
-	
-
-with open('output.csv', 'w') as csvfile:
-    writer = csv.writer(csvfile)
-    writer.writerows(outlist)
-
     
 
@@ -0,0 +1,115 @@
+#
+# Copyright (c) 2016, Prometheus Research, LLC
+#
+# CsvReader benchmark.
+#
+# Writes a synthetic REDCap data dictionary (see synthetic.py) and times
+# reading it with the default and the ``fast`` CsvReader modes, looking up
+# the columns the REDCap processor reads on every row.
+#
+# Usage:
+#
+#   python benchmarks/csv_reader.py
+#   python benchmarks/csv_reader.py --rows 10000 --repeat 5
+
+
+import argparse
+import os
+import shutil
+import sys
+import tempfile
+import timeit
+
+import synthetic
+
+from rios.conversion.redcap.to_rios import CsvReaderWithGetName
+
+
+DEFAULT_ROWS = 100000
+
+# Columns read for every row of a current format data dictionary
+COLUMNS = (
+    'variable_field_name',
+    'form_name',
+    'section_header',
+    'field_type',
+    'field_label',
+    'choices_or_calculations',
+    'field_note',
+    'text_validation',
+    'branching_logic',
+    'matrix_group_name',
+)
+
+
+def read(filename, fast):
+    """ Reads every row and looks up COLUMNS, returns the number of rows """
+
+    rows = 0
+    with open(filename, 'r') as stream:
+        reader = CsvReaderWithGetName(stream, fast=fast)
+        for row in reader:
+            for column in COLUMNS:
+                row.get(column, '')
+            rows += 1
+    return rows
+
+
+def get_parser():
+    parser = argparse.ArgumentParser(
+        description='Times the default and fast CsvReader modes on a'
+        ' synthetic REDCap data dictionary.',
+    )
+    parser.add_argument(
+        '--rows',
+        type=int,
+        default=DEFAULT_ROWS,
+        metavar='N',
+        help='number of fields (default: {})'.format(DEFAULT_ROWS),
+    )
+    parser.add_argument(
+        '--repeat',
+        type=int,
+        default=3,
+        metavar='N',
+        help='runs per mode; the fastest is reported (default: 3)',
+    )
+    return parser
+
+
+def main(argv=None):
+    args = get_parser().parse_args(argv)
+    directory = tempfile.mkdtemp(prefix='rios-benchmark-')
+    try:
+        filename = os.path.join(directory, 'synthetic.csv')
+        with open(filename, 'w') as stream:
+            synthetic.write_redcap(
+                synthetic.generate_fields(args.rows),
+                stream,
+            )
+        results = {}
+        for mode, fast in (('default', False), ('fast', True)):
+            times = []
+            for _ in range(args.repeat):
+                start = timeit.default_timer()
+                rows = read(filename, fast)
+                times.append(timeit.default_timer() - start)
+            results[mode] = min(times)
+            sys.stdout.write(
+                '{:<8} {:>8} rows {:>8.3f}s {:>10.0f} rows/s\n'.format(
+                    mode,
+                    rows,
+                    results[mode],
+                    rows / results[mode],
+                )
+            )
+        sys.stdout.write('speedup  {:.2f}x\n'.format(
+            results['default'] / results['fast'],
+        ))
+    finally:
+        shutil.rmtree(directory)
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,142 @@
+#
+# Copyright (c) 2016, Prometheus Research, LLC
+#
+# Expression translator benchmark.
+#
+# Generates REDCap expressions of increasing length, mixing field and
+# checkbox references, function calls, and powers, and times translating
+# them to Python (as RedcapToRios does for calculations) and back to REDCap
+# (as RedcapFromRios does). Throughput is reported in tokens per second,
+# with the log-log slope of the time between sizes (see run.py): 1.0 is
+# linear scaling.
+#
+# Usage:
+#
+#   python benchmarks/expressions.py
+#   python benchmarks/expressions.py --sizes 100,1000 --repeat 10
+
+
+import argparse
+import random
+import sys
+import timeit
+
+from run import slopes, parse_list
+
+from rios.conversion.redcap.expression import (
+    parse,
+    to_python,
+    to_redcap,
+    tokenize,
+)
+
+
+DEFAULT_SIZES = (10, 100, 1000, 10000)
+
+FUNCTIONS = ('min', 'max', 'sum', 'mean', 'round', 'abs', 'sqrt')
+
+OPERATORS = ('+', '-', '*', '/')
+
+
+def generate_term(generator, index):
+    kind = generator.randrange(5)
+    if kind == 0:
+        return '[field_{}]'.format(index)
+    if kind == 1:
+        return '[check_{}({})]'.format(index, generator.randrange(1, 5))
+    if kind == 2:
+        return '{}([field_{}], {})'.format(
+            generator.choice(FUNCTIONS),
+            index,
+            generator.randrange(100),
+        )
+    if kind == 3:
+        return '(([field_{}])^(2))'.format(index)
+    return str(generator.randrange(1000))
+
+
+def generate_expression(size, seed=0):
+    """ Returns a REDCap expression of about ``size`` tokens """
+
+    generator = random.Random(seed)
+    terms = [generate_term(generator, 0)]
+    count = len(tokenize(terms[0]))
+    while count < size:
+        term = generate_term(generator, len(terms))
+        terms.append(generator.choice(OPERATORS))
+        terms.append(term)
+        count += 1 + len(tokenize(term))
+    return ' '.join(terms)
+
+
+def measure(function, argument, repeat):
+    times = []
+    for _ in range(repeat):
+        start = timeit.default_timer()
+        function(argument)
+        times.append(timeit.default_timer() - start)
+    return min(times)
+
+
+def get_parser():
+    parser = argparse.ArgumentParser(
+        description='Times the REDCap expression translators on generated'
+        ' expressions of increasing length.',
+    )
+    parser.add_argument(
+        '--sizes',
+        type=lambda text: [int(size) for size in parse_list(text)],
+        default=list(DEFAULT_SIZES),
+        metavar='N,...',
+        help='numbers of tokens (default: {})'.format(
+            ','.join(str(size) for size in DEFAULT_SIZES),
+        ),
+    )
+    parser.add_argument(
+        '--repeat',
+        type=int,
+        default=5,
+        metavar='N',
+        help='runs per measurement; the fastest is reported (default: 5)',
+    )
+    return parser
+
+
+def main(argv=None):
+    args = get_parser().parse_args(argv)
+    results = {'to_python': [], 'to_redcap': []}
+    for size in sorted(args.sizes):
+        expression = generate_expression(size)
+        tokens = len(tokenize(expression))
+        python = to_python(parse(expression))
+        results['to_python'].append({
+            'size': tokens,
+            'seconds': measure(
+                lambda text: to_python(parse(text)),
+                expression,
+                args.repeat,
+            ),
+        })
+        results['to_redcap'].append({
+            'size': tokens,
+            'seconds': measure(to_redcap, python, args.repeat),
+        })
+
+    sys.stdout.write('{:<10} {:>8} {:>10} {:>14} {:>7}\n'.format(
+        'DIRECTION', 'TOKENS', 'SECONDS', 'TOKENS/SECOND', 'SLOPE',
+    ))
+    for direction in ('to_python', 'to_redcap'):
+        rows = results[direction]
+        for row, slope in zip(rows, [None] + slopes(rows)):
+            sys.stdout.write('{:<10} {:>8} {:>10.4f} {:>14.0f} {:>7}\n'.format(
+                direction,
+                row['size'],
+                row['seconds'],
+                (row['size'] / row['seconds']) if row['seconds'] else 0,
+                '' if slope is None else '{:.2f}'.format(slope),
+            ))
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,205 @@
+#
+# Copyright (c) 2016, Prometheus Research, LLC
+#
+# REDCap function library benchmark.
+#
+# Generates random values for a number of records, and times each REDCap
+# function applied record by record with the scalar functions
+# (rios.conversion.redcap.functions), and to every record at once with the
+# NumPy functions (rios.conversion.redcap.vectorized). About a tenth of the
+# values are missing. The values are converted to arrays once, as a batch
+# of records would be before scoring, and the conversion is timed apart.
+#
+# Usage:
+#
+#   python benchmarks/functions.py
+#   python benchmarks/functions.py --records 10000 --repeat 5
+
+
+import argparse
+import random
+import sys
+import timeit
+
+import rios.conversion.redcap.functions as scalar
+
+try:
+    import numpy
+    import rios.conversion.redcap.vectorized as vectorized
+except ImportError:
+    numpy = None
+
+
+DEFAULT_RECORDS = 100000
+
+# Number of values given to the aggregate functions
+ARGUMENTS = 5
+
+
+def generate(records, seed=0):
+    """
+    Returns the arguments of each benchmark, as a dict of name: (argument
+    columns), each column holding one value per record
+    """
+
+    generator = random.Random(seed)
+
+    def number():
+        if generator.random() < 0.1:
+            return None
+        return generator.uniform(-100, 100)
+
+    def date():
+        if generator.random() < 0.1:
+            return None
+        return '{:04d}-{:02d}-{:02d}'.format(
+            generator.randrange(1950, 2016),
+            generator.randrange(1, 13),
+            generator.randrange(1, 29),
+        )
+
+    values = [
+        [number() for _ in range(records)]
+        for _ in range(ARGUMENTS)
+    ]
+    return {
+        'values': values,
+        'number': values[0],
+        'dates': ([date() for _ in range(records)],
+                  [date() for _ in range(records)]),
+    }
+
+
+def scalar_aggregate(function, values):
+    answer = []
+    for row in zip(*values):
+        present = [value for value in row if value is not None]
+        answer.append(function(*present) if present else None)
+    return answer
+
+
+def scalar_round(function, numbers):
+    return [
+        None if number is None else function(number, 2)
+        for number in numbers
+    ]
+
+
+def scalar_datediff(first, second):
+    return [
+        None if x is None or y is None else scalar.datediff(x, y, 'y')
+        for x, y in zip(first, second)
+    ]
+
+
+def as_arrays(data):
+    """ Returns the arguments of generate() converted to NumPy arrays """
+
+    return {
+        'values': [vectorized.as_array(values) for values in data['values']],
+        'number': vectorized.as_array(data['number']),
+        'dates': tuple(vectorized.as_dates(dates) for dates in data['dates']),
+    }
+
+
+def get_benchmarks(data, arrays):
+    """ Returns (name, scalar callable, vectorized callable) tuples """
+
+    benchmarks = []
+    for name in ('mean', 'median', 'stdev', 'sum_'):
+        benchmarks.append((
+            name,
+            (lambda name=name: scalar_aggregate(
+                getattr(scalar, name),
+                data['values'],
+            )),
+            (lambda name=name: getattr(vectorized, name)(
+                *arrays['values']
+            )),
+        ))
+    for name in ('round_', 'roundup', 'rounddown'):
+        benchmarks.append((
+            name,
+            (lambda name=name: scalar_round(
+                getattr(scalar, name),
+                data['number'],
+            )),
+            (lambda name=name: getattr(vectorized, name)(
+                arrays['number'],
+                2,
+            )),
+        ))
+    benchmarks.append((
+        'datediff',
+        (lambda: scalar_datediff(*data['dates'])),
+        (lambda: vectorized.datediff(
+            arrays['dates'][0],
+            arrays['dates'][1],
+            'y',
+        )),
+    ))
+    return benchmarks
+
+
+def measure(function, repeat):
+    times = []
+    for _ in range(repeat):
+        start = timeit.default_timer()
+        function()
+        times.append(timeit.default_timer() - start)
+    return min(times)
+
+
+def get_parser():
+    parser = argparse.ArgumentParser(
+        description='Times the scalar and NumPy REDCap functions on random'
+        ' records.',
+    )
+    parser.add_argument(
+        '--records',
+        type=int,
+        default=DEFAULT_RECORDS,
+        metavar='N',
+        help='number of records (default: {})'.format(DEFAULT_RECORDS),
+    )
+    parser.add_argument(
+        '--repeat',
+        type=int,
+        default=3,
+        metavar='N',
+        help='runs per function; the fastest is reported (default: 3)',
+    )
+    return parser
+
+
+def main(argv=None):
+    args = get_parser().parse_args(argv)
+    if numpy is None:
+        sys.stderr.write('NumPy is required: pip install numpy\n')
+        return 2
+    data = generate(args.records)
+    start = timeit.default_timer()
+    arrays = as_arrays(data)
+    sys.stdout.write('Converted {} records to arrays in {:.3f}s\n'.format(
+        args.records,
+        timeit.default_timer() - start,
+    ))
+    sys.stdout.write('{:<10} {:>10} {:>12} {:>9}\n'.format(
+        'FUNCTION', 'SCALAR', 'VECTORIZED', 'SPEEDUP',
+    ))
+    for name, scalar_function, vectorized_function in get_benchmarks(
+            data,
+            arrays):
+        scalar_time = measure(scalar_function, args.repeat)
+        vectorized_time = measure(vectorized_function, args.repeat)
+        sys.stdout.write('{:<10} {:>9.3f}s {:>11.3f}s {:>8.1f}x\n'.format(
+            name,
+            scalar_time,
+            vectorized_time,
+            scalar_time / vectorized_time,
+        ))
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
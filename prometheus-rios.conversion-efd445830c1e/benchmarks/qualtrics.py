@@ -0,0 +1,176 @@
+#
+# Copyright (c) 2016, Prometheus Research, LLC
+#
+# Qualtrics *.qsf reading benchmark.
+#
+# Generates a large synthetic *.qsf file (see synthetic.py), with a graphic
+# of a given size for every question, and JavaScript in every question, as
+# exports with embedded graphics and scripts have. It then times
+# qualtrics_to_rios with filemetadata=True, which reads the file once,
+# incrementally, keeping only the blocks and questions. For comparison, the
+# file is also converted from its whole parsed document, as it was before
+# the incremental reader. Each run is made in a new worker process, which
+# also reports its peak memory (see run.py).
+#
+# Usage:
+#
+#   python benchmarks/qualtrics.py
+#   python benchmarks/qualtrics.py --fields 5000 --padding 20000
+
+
+import argparse
+import collections
+import json
+import multiprocessing
+import os
+import shutil
+import sys
+import tempfile
+import timeit
+
+import six
+
+import synthetic
+from run import format_size, peak_rss
+
+
+DEFAULT_FIELDS = 2000
+
+# Bytes of the graphic of each question
+DEFAULT_PADDING = 10000
+
+# Bytes of JavaScript in each question
+SCRIPT_SIZE = 1000
+
+MODES = ('full parse', 'incremental')
+
+
+def write_qsf(fields, padding, filename):
+    """ Writes a synthetic *.qsf file with `padding` bytes per question """
+
+    stream = six.StringIO()
+    synthetic.write_qualtrics(synthetic.generate_fields(fields), stream)
+    survey = json.loads(stream.getvalue())
+    script = (
+        'Qualtrics.SurveyEngine.addOnload(function() { /* %s */ });'
+        % ('x' * SCRIPT_SIZE)
+    )
+    graphics = []
+    for element in survey['SurveyElements']:
+        if element['Element'] == 'SQ':
+            element['Payload']['QuestionJS'] = script
+            # Members in the order of Qualtrics exports
+            graphics.append(collections.OrderedDict((
+                ('SurveyID', element['SurveyID']),
+                ('Element', 'GR'),
+                ('PrimaryAttribute', element['PrimaryAttribute']),
+                ('Payload', {'Type': 'image/png', 'Data': 'A' * padding}),
+            )))
+    survey['SurveyElements'].extend(graphics)
+    with open(filename, 'w') as output:
+        json.dump(survey, output)
+
+
+def convert(mode, filename):
+    """
+    Converts `filename` in `mode`, and returns the wall time, the peak
+    memory growth, and the failure message, if any.
+    """
+
+    import simplejson
+    import rios.conversion
+    from rios.conversion.qualtrics import QualtricsToRios
+
+    baseline = peak_rss()
+    failure = None
+    with open(filename, 'r') as stream:
+        start = timeit.default_timer()
+        if mode == 'incremental':
+            package = rios.conversion.qualtrics_to_rios(
+                stream=stream,
+                filemetadata=True,
+                suppress=True,
+            )
+            failure = package.get('failure')
+        else:
+            document = simplejson.load(stream)
+            reader = rios.conversion._JsonReaderMetaDataProcessor(
+                stream,
+                document,
+            )
+            reader.process()
+            converter = QualtricsToRios(
+                stream=stream,
+                document=document,
+                **reader.data
+            )
+            converter()
+            package = converter.package
+        seconds = timeit.default_timer() - start
+    return {
+        'seconds': seconds,
+        'peak_memory': peak_rss() - baseline,
+        'failure': failure,
+    }
+
+
+def convert_isolated(mode, filename):
+    pool = multiprocessing.Pool(1)
+    try:
+        return pool.apply(convert, (mode, filename))
+    finally:
+        pool.close()
+        pool.join()
+
+
+def get_parser():
+    parser = argparse.ArgumentParser(
+        description='Times reading a large synthetic Qualtrics *.qsf file.',
+    )
+    parser.add_argument(
+        '--fields',
+        type=int,
+        default=DEFAULT_FIELDS,
+        metavar='N',
+        help='number of questions (default: {})'.format(DEFAULT_FIELDS),
+    )
+    parser.add_argument(
+        '--padding',
+        type=int,
+        default=DEFAULT_PADDING,
+        metavar='BYTES',
+        help='bytes of the graphic of each question (default: {})'.format(
+            DEFAULT_PADDING,
+        ),
+    )
+    return parser
+
+
+def main(argv=None):
+    args = get_parser().parse_args(argv)
+    directory = tempfile.mkdtemp()
+    try:
+        filename = os.path.join(directory, 'synthetic.qsf')
+        write_qsf(args.fields, args.padding, filename)
+        sys.stdout.write('{} questions, {}\n'.format(
+            args.fields,
+            format_size(os.path.getsize(filename)),
+        ))
+        sys.stdout.write('{:<14} {:>10} {:>10}\n'.format(
+            'MODE', 'SECONDS', 'PEAK MEM',
+        ))
+        for mode in MODES:
+            result = convert_isolated(mode, filename)
+            sys.stdout.write('{:<14} {:>10.3f} {:>10}{}\n'.format(
+                mode,
+                result['seconds'],
+                format_size(result['peak_memory']),
+                '  FAILED' if result['failure'] else '',
+            ))
+    finally:
+        shutil.rmtree(directory)
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,286 @@
+#
+# Copyright (c) 2016, Prometheus Research, LLC
+#
+# Scaling benchmark for the conversion API functions.
+#
+# Generates synthetic data dictionaries (see synthetic.py) of each size, and
+# times each API function on them in a fresh worker process, which also
+# reports the peak memory used by the conversion. Throughput is reported in
+# fields per second. When the time grows faster than the size between two
+# sizes (log-log slope above --threshold), the function is flagged as
+# scaling super-linearly, and the exit status is 1.
+#
+# Usage:
+#
+#   python benchmarks/run.py
+#   python benchmarks/run.py --sizes 100,1000 --functions redcap_to_rios
+#   python benchmarks/run.py --json results.json --keep /tmp/synthetic
+
+
+import argparse
+import json
+import math
+import multiprocessing
+import os
+import resource
+import shutil
+import sys
+import tempfile
+import timeit
+
+import synthetic
+
+
+FUNCTIONS = (
+    'redcap_to_rios',
+    'qualtrics_to_rios',
+    'rios_to_redcap',
+    'rios_to_qualtrics',
+)
+
+DEFAULT_SIZES = (100, 1000, 10000, 100000)
+
+DEFAULT_THRESHOLD = 1.2
+
+
+def peak_rss():
+    """ Returns the peak resident set size of this process, in bytes """
+
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux reports kilobytes, macOS reports bytes
+    return peak if sys.platform == 'darwin' else peak * 1024
+
+
+def load_arguments(function, base):
+    """ Reads the input of an API function from the synthetic files """
+
+    if function == 'redcap_to_rios':
+        return {
+            'id': 'urn:synthetic',
+            'title': 'Synthetic',
+            'description': '',
+            'stream': open(base + '.csv', 'r'),
+        }
+    elif function == 'qualtrics_to_rios':
+        return {
+            'stream': open(base + '.qsf', 'r'),
+            'filemetadata': True,
+        }
+
+    from rios.conversion.utils import load_definition
+    arguments = {}
+    for key, suffix in (('instrument', '_i'), ('form', '_f'),
+                        ('calculationset', '_c')):
+        filename = base + suffix + '.yaml'
+        if os.path.exists(filename):
+            arguments[key] = load_definition(filename)
+    return arguments
+
+
+def measure(function, base, repeat):
+    """
+    Runs an API function `repeat` times and returns the fastest wall time,
+    the peak memory growth, and the failure message, if any. Run in a new
+    worker process for each measurement, so the peak memory is not hidden by
+    an earlier, larger one.
+    """
+
+    import rios.conversion
+    api_function = getattr(rios.conversion, function)
+    times = []
+    baseline = peak_rss()
+    failure = None
+    for _ in range(repeat):
+        arguments = load_arguments(function, base)
+        start = timeit.default_timer()
+        package = api_function(suppress=True, **arguments)
+        times.append(timeit.default_timer() - start)
+        stream = arguments.get('stream')
+        if stream is not None:
+            stream.close()
+        failure = package.get('failure')
+        del package
+    return {
+        'seconds': min(times),
+        'peak_memory': peak_rss() - baseline,
+        'failure': failure,
+    }
+
+
+def run_isolated(function, base, repeat):
+    pool = multiprocessing.Pool(1)
+    try:
+        return pool.apply(measure, (function, base, repeat))
+    finally:
+        pool.close()
+        pool.join()
+
+
+def slopes(results):
+    """
+    Returns the log-log slope of the time against the size between each
+    pair of consecutive sizes: 1.0 is linear scaling, 2.0 quadratic.
+    """
+
+    answer = []
+    for small, large in zip(results, results[1:]):
+        if small['seconds'] <= 0 or large['seconds'] <= 0:
+            answer.append(None)
+            continue
+        answer.append(
+            math.log(large['seconds'] / small['seconds'])
+            / math.log(float(large['size']) / small['size'])
+        )
+    return answer
+
+
+def format_size(value):
+    for unit in ('B', 'KB', 'MB'):
+        if abs(value) < 1024:
+            return '{:.1f}{}'.format(value, unit)
+        value /= 1024.0
+    return '{:.1f}GB'.format(value)
+
+
+def report(results, threshold, stream):
+    """ Writes the results table and returns the flagged functions """
+
+    stream.write('{:<20} {:>8} {:>10} {:>14} {:>10} {:>7}\n'.format(
+        'FUNCTION', 'FIELDS', 'SECONDS', 'FIELDS/SECOND', 'PEAK MEM',
+        'SLOPE',
+    ))
+    flagged = []
+    for function in FUNCTIONS:
+        rows = results.get(function)
+        if not rows:
+            continue
+        function_slopes = [None] + slopes(rows)
+        for row, slope in zip(rows, function_slopes):
+            row['slope'] = slope
+            stream.write(
+                '{:<20} {:>8} {:>10.3f} {:>14.0f} {:>10} {:>7}{}\n'.format(
+                    function,
+                    row['size'],
+                    row['seconds'],
+                    (row['size'] / row['seconds']) if row['seconds'] else 0,
+                    format_size(row['peak_memory']),
+                    '' if slope is None else '{:.2f}'.format(slope),
+                    '  FAILED' if row['failure'] else '',
+                )
+            )
+            if slope is not None and slope > threshold:
+                flagged.append((function, row['size'], slope))
+    for function, size, slope in flagged:
+        stream.write(
+            'SUPER-LINEAR: {} up to {} fields (slope {:.2f} > {})\n'.format(
+                function,
+                size,
+                slope,
+                threshold,
+            )
+        )
+    return flagged
+
+
+def parse_list(text):
+    return [item.strip() for item in text.split(',') if item.strip()]
+
+
+def get_parser():
+    parser = argparse.ArgumentParser(
+        description='Times the conversion API functions on synthetic data'
+        ' dictionaries of increasing size.',
+    )
+    parser.add_argument(
+        '--sizes',
+        type=lambda text: [int(size) for size in parse_list(text)],
+        default=list(DEFAULT_SIZES),
+        metavar='N,...',
+        help='numbers of fields (default: {})'.format(
+            ','.join(str(size) for size in DEFAULT_SIZES),
+        ),
+    )
+    parser.add_argument(
+        '--functions',
+        type=parse_list,
+        default=list(FUNCTIONS),
+        metavar='NAME,...',
+        help='API functions to time (default: all)',
+    )
+    parser.add_argument(
+        '--repeat',
+        type=int,
+        default=1,
+        metavar='N',
+        help='runs per measurement; the fastest is reported (default: 1)',
+    )
+    parser.add_argument(
+        '--threshold',
+        type=float,
+        default=DEFAULT_THRESHOLD,
+        help='log-log slope above which scaling is flagged as super-linear'
+        ' (default: {})'.format(DEFAULT_THRESHOLD),
+    )
+    parser.add_argument(
+        '--keep',
+        default=None,
+        metavar='DIR',
+        help='write the synthetic files to this directory and keep them',
+    )
+    parser.add_argument(
+        '--json',
+        default=None,
+        metavar='FILE',
+        help='also write the results to this JSON file',
+    )
+    synthetic.add_generator_arguments(parser)
+    return parser
+
+
+def main(argv=None):
+    from rios.conversion.utils import backends
+
+    args = get_parser().parse_args(argv)
+    unknown = set(args.functions) - set(FUNCTIONS)
+    if unknown:
+        sys.stderr.write('Unknown functions: {}\n'.format(
+            ', '.join(sorted(unknown)),
+        ))
+        return 2
+
+    directory = args.keep or tempfile.mkdtemp(prefix='rios-benchmark-')
+    if not os.path.isdir(directory):
+        os.makedirs(directory)
+    results = dict((function, []) for function in args.functions)
+    sys.stderr.write('Backends: {}\n'.format(', '.join(
+        '{} {}'.format(kind, name)
+        for kind, name in sorted(backends.describe().items())
+    )))
+    try:
+        options = synthetic.generator_options(args)
+        for size in sorted(args.sizes):
+            synthetic.write_all(size, directory, **options)
+            base = os.path.join(directory, 'synthetic_{}'.format(size))
+            for function in args.functions:
+                result = run_isolated(function, base, args.repeat)
+                result['size'] = size
+                results[function].append(result)
+                sys.stderr.write('{} {}: {:.3f}s\n'.format(
+                    function,
+                    size,
+                    result['seconds'],
+                ))
+    finally:
+        if not args.keep:
+            shutil.rmtree(directory)
+
+    sys.stdout.write('\n')
+    flagged = report(results, args.threshold, sys.stdout)
+    if args.json:
+        with open(args.json, 'w') as stream:
+            json.dump(results, stream, indent=2, sort_keys=True)
+    return 1 if flagged else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,667 @@
+#
+# Copyright (c) 2016, Prometheus Research, LLC
+#
+# Synthetic data dictionary generator.
+#
+# Builds a deterministic plan of fields with a controllable mix of field
+# types, and writes it as a REDCap data dictionary CSV, a Qualtrics *.qsf
+# file, and RIOS instrument, form, and calculationset YAML files.
+#
+# Usage:
+#
+#   python benchmarks/synthetic.py 1000 -o /tmp/synthetic
+#   python benchmarks/synthetic.py 1000 --mix text=1,matrix=1 --branching 0.5
+
+
+import argparse
+import collections
+import csv
+import json
+import os
+import random
+import sys
+import yaml
+
+
+__all__ = (
+    'DEFAULT_MIX',
+    'FIELD_KINDS',
+    'generate_fields',
+    'write_redcap',
+    'write_qualtrics',
+    'rios_definitions',
+    'write_rios',
+    'write_all',
+)
+
+
+# Field kinds, in the order they are listed in usage messages
+FIELD_KINDS = (
+    'text',
+    'integer',
+    'notes',
+    'dropdown',
+    'radio',
+    'checkbox',
+    'matrix',
+    'calc',
+)
+
+# dict: each item => field kind: relative weight
+DEFAULT_MIX = collections.OrderedDict([
+    ('text', 30),
+    ('integer', 15),
+    ('notes', 5),
+    ('dropdown', 15),
+    ('radio', 10),
+    ('checkbox', 10),
+    ('matrix', 10),
+    ('calc', 5),
+])
+
+REDCAP_COLUMNS = [
+    'Variable / Field Name',
+    'Form Name',
+    'Section Header',
+    'Field Type',
+    'Field Label',
+    'Choices, Calculations, OR Slider Labels',
+    'Field Note',
+    'Text Validation Type OR Show Slider Number',
+    'Text Validation Min',
+    'Text Validation Max',
+    'Identifier?',
+    'Branching Logic (Show field only if...)',
+    'Required Field?',
+    'Custom Alignment',
+    'Question Number (surveys only)',
+    'Matrix Group Name',
+    'Matrix Ranking?',
+    'Field Annotation',
+]
+
+# dict: each item => enumeration field kind: RIOS widget type
+RIOS_WIDGETS = {
+    'text': 'inputText',
+    'integer': 'inputNumber',
+    'notes': 'textArea',
+    'dropdown': 'dropDown',
+    'radio': 'radioGroup',
+    'checkbox': 'checkGroup',
+}
+
+LOCALIZATION = 'en'
+
+
+def parse_mix(text):
+    """ Parses a ``kind=weight,...`` field mix """
+
+    mix = collections.OrderedDict()
+    for item in text.split(','):
+        kind, _, weight = item.partition('=')
+        kind = kind.strip()
+        if kind not in FIELD_KINDS:
+            raise ValueError(
+                'Unknown field kind: {} (expected one of: {})'.format(
+                    kind,
+                    ', '.join(FIELD_KINDS),
+                )
+            )
+        mix[kind] = float(weight or 1)
+    return mix
+
+
+def generate_fields(size, mix=None, fields_per_page=50, branching=0.1,
+                        matrix_rows=5, choices=4, headers=True, seed=0):
+    """
+    Returns a list of `size` field plans: dicts with ``name``, ``kind``,
+    ``page``, ``label``, ``choices``, ``branch``, ``group``, ``header``, and
+    ``operands`` keys.
+
+    Field kinds are picked at random from the `mix` of relative weights. A
+    matrix adds a group of `matrix_rows` fields (fewer if the size runs out),
+    each with its ``group`` set. A `branching` share of the fields is shown
+    only if an earlier dropdown or radio field has a given choice, and
+    ``branch`` holds that ``(field name, choice)``. Calc fields add two
+    earlier integer fields, named in ``operands``. A new page begins every
+    `fields_per_page` fields, with a section ``header`` on its first field
+    if `headers` is set. The plan only depends on the arguments, so
+    every format written from it describes the same instrument.
+    """
+
+    mix = mix or DEFAULT_MIX
+    kinds = [k for k, w in mix.items() if w > 0]
+    weights = [mix[k] for k in kinds]
+    total = float(sum(weights))
+    rng = random.Random(seed)
+
+    def pick_kind():
+        point = rng.random() * total
+        for kind, weight in zip(kinds, weights):
+            point -= weight
+            if point < 0:
+                return kind
+        return kinds[-1]
+
+    def choice_list():
+        return [
+            (str(i), 'Option {}'.format(i))
+            for i in range(1, choices + 1)
+        ]
+
+    fields = []
+    enumerated = []
+    integers = []
+    counter = collections.Counter()
+    while len(fields) < size:
+        page = 'page_{:04d}'.format(len(fields) // fields_per_page + 1)
+        header = (
+            'Section {}'.format(page)
+            if headers and len(fields) % fields_per_page == 0
+            else ''
+        )
+        kind = pick_kind()
+        counter[kind] += 1
+        name = '{}_{}'.format(kind, counter[kind])
+        branch = None
+        if (enumerated and kind not in ('matrix', 'calc')
+                and rng.random() < branching):
+            source = rng.choice(enumerated)
+            branch = (source, rng.choice(choice_list())[0])
+
+        if kind == 'matrix':
+            rows = min(matrix_rows, size - len(fields))
+            for row in range(1, rows + 1):
+                fields.append({
+                    'name': '{}_row_{}'.format(name, row),
+                    'kind': kind,
+                    'page': page,
+                    'label': 'Matrix {} row {}'.format(counter[kind], row),
+                    'choices': choice_list(),
+                    'branch': None,
+                    'group': name,
+                    'header': header if row == 1 else '',
+                    'operands': (),
+                })
+            continue
+
+        field = {
+            'name': name,
+            'kind': kind,
+            'page': page,
+            'label': 'Question {} ({})'.format(len(fields) + 1, kind),
+            'choices': (
+                choice_list()
+                if kind in ('dropdown', 'radio', 'checkbox')
+                else []
+            ),
+            'branch': branch,
+            'group': None,
+            'header': header,
+            'operands': (),
+        }
+        if kind == 'calc':
+            field['operands'] = tuple(
+                rng.choice(integers) for _ in range(2)
+            ) if integers else ()
+        fields.append(field)
+        if kind in ('dropdown', 'radio'):
+            enumerated.append(name)
+        elif kind == 'integer':
+            integers.append(name)
+    return fields
+
+
+def group_fields(fields):
+    """
+    Yields ``(page, items)`` in page order, where `items` lists the fields
+    of the page with each matrix group collapsed into one list of rows.
+    """
+
+    pages = collections.OrderedDict()
+    for field in fields:
+        items = pages.setdefault(field['page'], [])
+        if field['group']:
+            if (items and isinstance(items[-1], list)
+                    and items[-1][0]['group'] == field['group']):
+                items[-1].append(field)
+                continue
+            field = [field]
+        items.append(field)
+    return pages.items()
+
+
+def redcap_expression(field):
+    if not field['operands']:
+        return '1'
+    return ' + '.join('[{}]'.format(name) for name in field['operands'])
+
+
+def write_redcap(fields, stream):
+    """ Writes the fields as a REDCap data dictionary CSV """
+
+    writer = csv.writer(stream)
+    writer.writerow(REDCAP_COLUMNS)
+    for field in fields:
+        kind = field['kind']
+        if kind == 'calc':
+            field_type, choices = 'calc', redcap_expression(field)
+        else:
+            field_type = {
+                'integer': 'text',
+                'matrix': 'radio',
+            }.get(kind, kind)
+            choices = ' | '.join(
+                '{}, {}'.format(*choice) for choice in field['choices']
+            )
+        branching = (
+            '[{}] = "{}"'.format(*field['branch'])
+            if field['branch']
+            else ''
+        )
+        writer.writerow([
+            field['name'],
+            field['page'],
+            field['header'],
+            field_type,
+            field['label'],
+            choices,
+            '',
+            'integer' if kind == 'integer' else '',
+            '0' if kind == 'integer' else '',
+            '1000' if kind == 'integer' else '',
+            '',
+            branching,
+            '',
+            '',
+            '',
+            field['group'] or '',
+            '',
+            '',
+        ])
+
+
+def write_qualtrics(fields, stream, survey_id='SV_synthetic'):
+    """
+    Writes the fields as a Qualtrics *.qsf file. Qualtrics has no calc or
+    matrix group fields here, so calcs are written as text entry questions
+    and matrix rows as multiple choice questions.
+    """
+
+    block_elements = []
+    questions = []
+    ids = {}
+    page = None
+    for number, field in enumerate(fields, start=1):
+        if page is not None and field['page'] != page:
+            block_elements.append({'Type': 'Page Break'})
+        page = field['page']
+        question_id = 'QID{}'.format(number)
+        ids[field['name']] = question_id
+        block_elements.append({
+            'Type': 'Question',
+            'QuestionID': question_id,
+        })
+        payload = {
+            'QuestionID': question_id,
+            'DataExportTag': field['name'],
+            'QuestionText': field['label'],
+            'QuestionDescription': field['label'],
+            'Validation': {'Settings': {'ForceResponse': 'OFF'}},
+        }
+        if field['choices']:
+            payload['QuestionType'] = 'MC'
+            payload['Selector'] = (
+                'MAVR' if field['kind'] == 'checkbox' else 'SAVR'
+            )
+            payload['Choices'] = dict(
+                (choice_id, {'Display': text})
+                for choice_id, text in field['choices']
+            )
+            payload['ChoiceOrder'] = [
+                int(choice_id) for choice_id, _ in field['choices']
+            ]
+        else:
+            payload['QuestionType'] = 'TE'
+            payload['Selector'] = (
+                'ML' if field['kind'] == 'notes' else 'SL'
+            )
+        if field['branch']:
+            source, choice = field['branch']
+            payload['DisplayLogic'] = {
+                '0': {
+                    '0': {
+                        'LogicType': 'Question',
+                        'QuestionID': ids[source],
+                        'ChoiceLocator': 'q://{}/SelectableChoice/{}'.format(
+                            ids[source],
+                            choice,
+                        ),
+                        'Operator': 'Selected',
+                        'Type': 'Expression',
+                    },
+                    'Type': 'If',
+                },
+                'Type': 'BooleanExpression',
+            }
+        questions.append({
+            'SurveyID': survey_id,
+            'Element': 'SQ',
+            'PrimaryAttribute': question_id,
+            'SecondaryAttribute': field['label'],
+            'Payload': payload,
+        })
+
+    survey = {
+        'SurveyEntry': {
+            'SurveyID': survey_id,
+            'SurveyName': 'Synthetic survey',
+            'SurveyDescription': 'Synthetic survey',
+            'SurveyLanguage': LOCALIZATION.upper(),
+        },
+        'SurveyElements': [
+            {
+                'SurveyID': survey_id,
+                'Element': 'BL',
+                'PrimaryAttribute': 'Survey Blocks',
+                'Payload': {
+                    '1': {
+                        'Type': 'Default',
+                        'Description': 'Default Question Block',
+                        'ID': 'BL_synthetic',
+                        'BlockElements': block_elements,
+                    },
+                },
+            },
+        ] + questions,
+    }
+    json.dump(survey, stream, indent=2, sort_keys=True)
+
+
+def localized(text):
+    return {LOCALIZATION: text}
+
+
+def rios_definitions(fields, instrument_id='urn:synthetic'):
+    """
+    Returns the fields as RIOS ``(instrument, form, calculationset)``
+    definitions. The calculationset is None if there are no calc fields.
+    """
+
+    reference = {'id': instrument_id, 'version': '1.0'}
+    record = []
+    pages = []
+    calculations = []
+
+    def enumeration_type(field, base='enumeration'):
+        return {
+            'base': base,
+            'enumerations': dict(
+                ('id_' + choice_id, None)
+                for choice_id, _ in field['choices']
+            ),
+        }
+
+    def enumerations(field):
+        return [
+            {'id': 'id_' + choice_id, 'text': localized(text)}
+            for choice_id, text in field['choices']
+        ]
+
+    for page, items in group_fields(fields):
+        elements = []
+        for item in items:
+            field = item[0] if isinstance(item, list) else item
+            if field['header']:
+                elements.append({
+                    'type': 'header',
+                    'options': {'text': localized(field['header'])},
+                })
+            kind = field['kind']
+            if kind == 'calc':
+                expression = ' + '.join(
+                    'assessment["{}"]'.format(name)
+                    for name in field['operands']
+                ) or '1'
+                calculations.append({
+                    'id': field['name'],
+                    'description': field['label'],
+                    'type': 'integer',
+                    'method': 'python',
+                    'options': {'expression': expression},
+                })
+                continue
+
+            if kind == 'matrix':
+                record.append({
+                    'id': field['group'],
+                    'description': field['label'],
+                    'required': False,
+                    'identifiable': False,
+                    'type': {
+                        'base': 'matrix',
+                        'columns': [{
+                            'id': 'value',
+                            'description': 'value',
+                            'required': False,
+                            'identifiable': False,
+                            'type': enumeration_type(field),
+                        }],
+                        'rows': [
+                            {
+                                'id': row['name'],
+                                'description': row['label'],
+                                'required': False,
+                            }
+                            for row in item
+                        ],
+                    },
+                })
+                elements.append({
+                    'type': 'question',
+                    'options': {
+                        'fieldId': field['group'],
+                        'text': localized(field['label']),
+                        'questions': [{
+                            'fieldId': 'value',
+                            'text': localized(field['label']),
+                            'enumerations': enumerations(field),
+                        }],
+                        'rows': [
+                            {
+                                'id': row['name'],
+                                'text': localized(row['label']),
+                            }
+                            for row in item
+                        ],
+                    },
+                })
+                continue
+
+            if kind in ('dropdown', 'radio'):
+                field_type = enumeration_type(field)
+            elif kind == 'checkbox':
+                field_type = enumeration_type(field, 'enumerationSet')
+            elif kind == 'integer':
+                field_type = {
+                    'base': 'integer',
+                    'range': {'min': 0, 'max': 1000},
+                }
+            else:
+                field_type = 'text'
+            record.append({
+                'id': field['name'],
+                'description': field['label'],
+                'type': field_type,
+                'required': False,
+                'identifiable': False,
+            })
+            options = {
+                'fieldId': field['name'],
+                'text': localized(field['label']),
+                'widget': {'type': RIOS_WIDGETS[kind]},
+            }
+            if field['choices']:
+                options['enumerations'] = enumerations(field)
+            if field['branch']:
+                options['events'] = [{
+                    'action': 'disable',
+                    'trigger': '!(assessment["{}"] = "{}")'.format(
+                        *field['branch']
+                    ),
+                }]
+            elements.append({'type': 'question', 'options': options})
+        if elements:
+            pages.append({'id': page, 'elements': elements})
+
+    instrument = {
+        'id': instrument_id,
+        'version': '1.0',
+        'title': 'Synthetic instrument',
+        'record': record,
+    }
+    form = {
+        'instrument': reference,
+        'defaultLocalization': LOCALIZATION,
+        'title': localized('Synthetic instrument'),
+        'pages': pages,
+    }
+    calculationset = (
+        {'instrument': reference, 'calculations': calculations}
+        if calculations
+        else None
+    )
+    return instrument, form, calculationset
+
+
+def write_rios(fields, base, instrument_id='urn:synthetic'):
+    """
+    Writes the fields as RIOS ``<base>_i.yaml``, ``<base>_f.yaml`` and,
+    if there are calc fields, ``<base>_c.yaml`` files. Returns the
+    filenames.
+    """
+
+    dumper = getattr(yaml, 'CSafeDumper', yaml.SafeDumper)
+    filenames = []
+    definitions = rios_definitions(fields, instrument_id)
+    for suffix, definition in zip(('_i', '_f', '_c'), definitions):
+        if definition is None:
+            continue
+        filename = base + suffix + '.yaml'
+        with open(filename, 'w') as stream:
+            yaml.dump(
+                definition,
+                stream,
+                Dumper=dumper,
+                default_flow_style=False,
+            )
+        filenames.append(filename)
+    return filenames
+
+
+def write_all(size, directory, **options):
+    """
+    Generates `size` fields and writes them in every format to
+    `directory`, as ``synthetic_<size>.csv``, ``synthetic_<size>.qsf``,
+    and ``synthetic_<size>_[ifc].yaml``. Returns the filenames.
+    """
+
+    fields = generate_fields(size, **options)
+    base = os.path.join(directory, 'synthetic_{}'.format(size))
+    with open(base + '.csv', 'w') as stream:
+        write_redcap(fields, stream)
+    with open(base + '.qsf', 'w') as stream:
+        write_qualtrics(fields, stream)
+    rios = write_rios(
+        fields,
+        base,
+        instrument_id='urn:synthetic-{}'.format(size),
+    )
+    return [base + '.csv', base + '.qsf'] + rios
+
+
+def get_parser():
+    parser = argparse.ArgumentParser(
+        description='Generates synthetic REDCap, Qualtrics, and RIOS data'
+        ' dictionaries.',
+    )
+    parser.add_argument(
+        'sizes',
+        nargs='+',
+        type=int,
+        metavar='SIZE',
+        help='number of fields to generate',
+    )
+    add_generator_arguments(parser)
+    parser.add_argument(
+        '-o', '--output',
+        default='.',
+        metavar='DIR',
+        help='output directory (default: current directory)',
+    )
+    return parser
+
+
+def add_generator_arguments(parser):
+    parser.add_argument(
+        '--mix',
+        type=parse_mix,
+        default=None,
+        metavar='KIND=WEIGHT,...',
+        help='relative weights of the field kinds: {} (default: {})'.format(
+            ', '.join(FIELD_KINDS),
+            ','.join('{}={}'.format(*item) for item in DEFAULT_MIX.items()),
+        ),
+    )
+    parser.add_argument(
+        '--fields-per-page',
+        type=int,
+        default=50,
+        metavar='N',
+        help='fields on each page (default: 50)',
+    )
+    parser.add_argument(
+        '--branching',
+        type=float,
+        default=0.1,
+        metavar='SHARE',
+        help='share of fields with branching logic (default: 0.1)',
+    )
+    parser.add_argument(
+        '--no-headers',
+        dest='headers',
+        action='store_false',
+        help='do not start pages with a section header. QualtricsFromRios'
+        ' skips pages with headers',
+    )
+    parser.add_argument(
+        '--seed',
+        type=int,
+        default=0,
+        help='random seed (default: 0)',
+    )
+
+
+def generator_options(args):
+    return {
+        'mix': args.mix,
+        'fields_per_page': args.fields_per_page,
+        'branching': args.branching,
+        'headers': args.headers,
+        'seed': args.seed,
+    }
+
+
+def main(argv=None):
+    args = get_parser().parse_args(argv)
+    if not os.path.isdir(args.output):
+        os.makedirs(args.output)
+    options = generator_options(args)
+    for size in args.sizes:
+        for filename in write_all(size, args.output, **options):
+            sys.stdout.write(filename + '\n')
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
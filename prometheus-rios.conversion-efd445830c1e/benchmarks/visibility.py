@@ -0,0 +1,135 @@
+#
+# Copyright (c) 2016, Prometheus Research, LLC
+#
+# Field visibility benchmark.
+#
+# Converts a synthetic REDCap data dictionary with branching logic (see
+# synthetic.py) to RIOS, generates random records for it, and times the
+# visibility matrix of the records computed in one batch, and record by
+# record, as an interpreter evaluating each trigger for each record would.
+#
+# Usage:
+#
+#   python benchmarks/visibility.py
+#   python benchmarks/visibility.py --fields 1000 --records 100000
+
+
+import argparse
+import random
+import sys
+import timeit
+
+import six
+
+import synthetic
+
+from rios.conversion import redcap_to_rios
+
+try:
+    from rios.conversion.engine.visibility import VisibilityEvaluator
+except ImportError:
+    VisibilityEvaluator = None
+
+
+DEFAULT_FIELDS = 1000
+
+DEFAULT_RECORDS = 10000
+
+# Records evaluated one at a time; the time is scaled to all the records
+SAMPLE = 500
+
+
+def generate_records(fields, count, seed=0):
+    """ Returns `count` random records of the synthetic `fields` """
+
+    generator = random.Random(seed)
+    records = []
+    for _ in range(count):
+        record = {}
+        for field in fields:
+            if generator.random() < 0.1:
+                continue
+            if field['choices']:
+                record[field['name']] = generator.choice(field['choices'])[0]
+            elif field['kind'] == 'integer':
+                record[field['name']] = str(generator.randrange(100))
+        records.append(record)
+    return records
+
+
+def get_parser():
+    parser = argparse.ArgumentParser(
+        description='Times the visibility matrix of random records of a'
+        ' synthetic REDCap data dictionary.',
+    )
+    parser.add_argument(
+        '--fields',
+        type=int,
+        default=DEFAULT_FIELDS,
+        metavar='N',
+        help='number of fields (default: {})'.format(DEFAULT_FIELDS),
+    )
+    parser.add_argument(
+        '--records',
+        type=int,
+        default=DEFAULT_RECORDS,
+        metavar='N',
+        help='number of records (default: {})'.format(DEFAULT_RECORDS),
+    )
+    return parser
+
+
+def main(argv=None):
+    args = get_parser().parse_args(argv)
+    if VisibilityEvaluator is None:
+        sys.stderr.write('NumPy is required: pip install numpy\n')
+        return 2
+    fields = synthetic.generate_fields(args.fields)
+    stream = six.StringIO()
+    synthetic.write_redcap(fields, stream)
+    stream.seek(0)
+    package = redcap_to_rios(
+        id='urn:synthetic',
+        title='synthetic',
+        description='',
+        stream=stream,
+    )
+    records = generate_records(fields, args.records)
+
+    start = timeit.default_timer()
+    evaluator = VisibilityEvaluator(package)
+    compiled = timeit.default_timer() - start
+    sys.stdout.write('Compiled {} triggers of {} fields in {:.3f}s\n'.format(
+        len(evaluator.triggers),
+        len(evaluator.fields),
+        compiled,
+    ))
+
+    start = timeit.default_timer()
+    matrix = evaluator.evaluate(records)
+    batch = timeit.default_timer() - start
+
+    sample = records[:SAMPLE]
+    start = timeit.default_timer()
+    for record in sample:
+        evaluator.evaluate([record])
+    single = (timeit.default_timer() - start) * len(records) / len(sample)
+
+    sys.stdout.write('{:<12} {:>10} {:>14}\n'.format(
+        'MODE', 'SECONDS', 'RECORDS/SECOND',
+    ))
+    for mode, elapsed in (('per record', single), ('batch', batch)):
+        sys.stdout.write('{:<12} {:>10.3f} {:>14.0f}\n'.format(
+            mode,
+            elapsed,
+            len(records) / elapsed,
+        ))
+    sys.stdout.write('speedup      {:.1f}x, {:.1%} of fields shown\n'.format(
+        single / batch,
+        matrix.visible.mean(),
+    ))
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -28,13 +28,21 @@ setup(
     zip_safe=True,
     include_package_data=True,
     namespace_packages=['rios'],
-    entry_points={},
+    entry_points={
+        'console_scripts': [
+            'rios-convert = rios.conversion.cli:main',
+        ],
+    },
     install_requires=[
         'pyyaml',
+        'six',
         'rios.core>=0.6.0,<1',
         'simplejson==3.8.2',
     ],
     extras_require={
+        'numpy': [
+            'numpy>=1.13',
+        ],
         'dev': [
             'coverage>=3.7,<4',
             'nose>=1.3,<2',
@@ -3,6 +3,8 @@
 #
 
 
+import yaml
+
 from rios.core import (
     ValidationError,
     validate_instrument,
@@ -12,6 +14,7 @@ from rios.core import (
 from rios.conversion.redcap import RedcapToRios, RedcapFromRios
 from rios.conversion.base import structures
 from rios.conversion.qualtrics import QualtricsToRios, QualtricsFromRios
+from rios.conversion.qualtrics.to_rios import read_survey
 from rios.conversion.exception import (
     Error,
     ConversionFailureError,
@@ -19,7 +22,12 @@ from rios.conversion.exception import (
     ConversionValidationError,
     RiosRelationshipError,
 )
-from rios.conversion.utils import JsonReader
+from rios.conversion.utils import (
+    JsonReader,
+    ConversionMetrics,
+    NULL_METRICS,
+    load_definition,
+)
 
 
 __all__ = (
@@ -27,6 +35,11 @@ __all__ = (
     'qualtrics_to_rios',
     'rios_to_redcap',
     'rios_to_qualtrics',
+    'rios_to_redcap_files',
+    'rios_to_qualtrics_files',
+    'convert_many',
+    'ConversionJob',
+    'ConversionResult',
 )
 
 
@@ -85,7 +98,8 @@ def _validate_rios(instrument, form, calculationset=None):
 
 
 def redcap_to_rios(id, title, description, stream, localization=None,
-                        instrument_version=None, suppress=False):
+                        instrument_version=None, suppress=False, cache=None,
+                        metrics=False, names=None, expressions=None):
     """
     Converts a REDCap configuration into a RIOS configuration.
 
@@ -114,19 +128,66 @@ def redcap_to_rios(id, title, description, stream, localization=None,
         the returned dict will not contain key-value pairs with conversion
         data if exception suppression is set.
     :type suppress: bool
+    :param cache:
+        Optional cache of converted packages. If the same conversion was
+        stored before, the stored package is returned without converting
+        or validating anything.
+    :type cache: rios.conversion.utils.ConversionCache or None
+    :param metrics:
+        Record the wall time and count of each conversion phase (read,
+        process, finalize, validate, serialize), and counts of the rows,
+        fields, calculations, warnings, and errors. These are returned under
+        a ``metrics`` key.
+    :type metrics: bool
+    :param names:
+        Optional memo table of canonical REDCap names, to share between
+        conversions. Defaults to a new table for this conversion. The
+        lookups it answers are counted in the ``name_hits`` and
+        ``name_misses`` metrics.
+    :type names: rios.conversion.utils.MemoTable or None
+    :param expressions:
+        Optional table of translated branching logic and calculation
+        expressions, to share between conversions (see
+        ``rios.conversion.redcap.to_rios.expression_table``). Defaults to a
+        new table for this conversion. The lookups it answers are counted in
+        the ``expression_hits`` and ``expression_misses`` metrics, and their
+        hit rate is logged.
+    :type expressions: rios.conversion.utils.LruTable or None
     :returns:
         The RIOS instrument, form, and calculationset configuration. Includes
         logging data if a logger is suplied.
     :rtype: dictionary
     """
 
+    metrics = ConversionMetrics() if metrics else NULL_METRICS
+
+    if cache is not None:
+        key, stream = cache.stream_key(
+            'redcap_to_rios',
+            stream,
+            id=id,
+            title=title,
+            description=description,
+            localization=localization,
+            instrument_version=instrument_version,
+        )
+        payload = cache.get(key)
+        if payload is not None:
+            if metrics.enabled:
+                metrics.count('cache_hits')
+                payload['metrics'] = metrics.as_dict()
+            return payload
+
     converter = RedcapToRios(
         id=id,
         instrument_version=instrument_version,
         title=title,
         localization=localization,
         description=description,
-        stream=stream
+        stream=stream,
+        metrics=metrics,
+        names=names,
+        expressions=expressions,
     )
 
     payload = dict()
@@ -139,17 +200,22 @@ def redcap_to_rios(id, title, description, stream, localization=None,
         )
         if suppress:
             payload['failure'] = str(error)
+            if metrics.enabled:
+                payload['metrics'] = converter.metrics_report()
         else:
             raise error
     else:
         payload.update(converter.package)
+        if cache is not None:
+            cache.set(key, payload)
 
     return payload
 
 
 def qualtrics_to_rios(stream, instrument_version=None, title=None,
                         localization=None, description=None, id=None,
-                            filemetadata=False, suppress=False):
+                            filemetadata=False, suppress=False, cache=None,
+                            metrics=False):
     """
     Converts a Qualtrics configuration into a RIOS configuration.
 
@@ -181,6 +247,17 @@ def qualtrics_to_rios(stream, instrument_version=None, title=None,
         the returned dict will not contain key-value pairs with conversion
         data if exception suppression is set.
     :type suppress: bool
+    :param cache:
+        Optional cache of converted packages. If the same conversion was
+        stored before, the stored package is returned without converting
+        or validating anything.
+    :type cache: rios.conversion.utils.ConversionCache or None
+    :param metrics:
+        Record the wall time and count of each conversion phase (read,
+        process, finalize, validate, serialize), and counts of the rows,
+        fields, calculations, warnings, and errors. These are returned under
+        a ``metrics`` key.
+    :type metrics: bool
     :returns:
         The RIOS instrument, form, and calculationset configuration. Includes
         logging data if a logger is suplied.
@@ -195,13 +272,37 @@ def qualtrics_to_rios(stream, instrument_version=None, title=None,
             'Missing id, description, and/or title attributes'
         )
 
+    metrics = ConversionMetrics() if metrics else NULL_METRICS
+
+    if cache is not None:
+        key, stream = cache.stream_key(
+            'qualtrics_to_rios',
+            stream,
+            id=id,
+            title=title,
+            description=description,
+            localization=localization,
+            instrument_version=instrument_version,
+            filemetadata=filemetadata,
+        )
+        payload = cache.get(key)
+        if payload is not None:
+            if metrics.enabled:
+                metrics.count('cache_hits')
+                payload['metrics'] = metrics.as_dict()
+            return payload
+
     payload = dict()
 
     if filemetadata:
         # Process properties from the stream
         try:
-            reader = _JsonReaderMetaDataProcessor(stream)
-            reader.process()
+            with metrics.phase('read'):
+                reader = _JsonReaderMetaDataProcessor(
+                    stream,
+                    read_survey(stream),
+                )
+                reader.process()
         except Exception as exc:
             error = ConversionFailureError(
                 "Unable to parse Qualtrics data dictionary:",
@@ -221,6 +322,10 @@ def qualtrics_to_rios(stream, instrument_version=None, title=None,
             description = reader.data['description']
             title = reader.data['title']
             localization = reader.data['localization']
+            # The converter reuses the parsed document
+            document, reader.reader = reader.reader, None
+    else:
+        document = None
 
     converter = QualtricsToRios(
         id=id,
@@ -228,8 +333,12 @@ def qualtrics_to_rios(stream, instrument_version=None, title=None,
         title=title,
         localization=localization,
         description=description,
-        stream=stream
+        stream=stream,
+        metrics=metrics,
+        document=document,
     )
+    # The converter releases the document once its questions are indexed
+    document = None
 
     try:
         converter()
@@ -240,16 +349,21 @@ def qualtrics_to_rios(stream, instrument_version=None, title=None,
         )
         if suppress:
             payload['failure'] = str(error)
+            if metrics.enabled:
+                payload['metrics'] = converter.metrics_report()
         else:
             raise error
     else:
         payload.update(converter.package)
+        if cache is not None:
+            cache.set(key, payload)
 
     return payload
 
 
 def rios_to_redcap(instrument, form, calculationset=None,
-                                    localization=None, suppress=False):
+                            localization=None, suppress=False, cache=None,
+                            metrics=False, expressions=None, stream=None):
     """
     Converts a RIOS configuration into a REDCap configuration.
 
@@ -270,16 +384,61 @@ def rios_to_redcap(instrument, form, calculationset=None,
         the returned dict will not contain key-value pairs with conversion
         data if exception suppression is set.
     :type suppress: bool
+    :param cache:
+        Optional cache of converted packages. If the same conversion was
+        stored before, the stored package is returned without converting
+        or validating anything.
+    :type cache: rios.conversion.utils.ConversionCache or None
+    :param metrics:
+        Record the wall time and count of each conversion phase (read,
+        process, finalize, validate, serialize), and counts of the rows,
+        fields, calculations, warnings, and errors. These are returned under
+        a ``metrics`` key.
+    :type metrics: bool
+    :param expressions:
+        Optional table of translated calculation and trigger expressions,
+        to share between conversions (see
+        ``rios.conversion.redcap.to_rios.expression_table``). Defaults to a
+        new table for this conversion. The lookups it answers are counted in
+        the ``expression_hits`` and ``expression_misses`` metrics, and their
+        hit rate is logged.
+    :type expressions: rios.conversion.utils.LruTable or None
+    :param stream:
+        Optional text stream to write the REDCap data dictionary to, as CSV.
+        The rows are written as the form is processed, starting with the
+        header row, and are not kept: the ``instrument`` of the returned
+        package is empty. The cache is not used. If the conversion fails,
+        the rows written before the failure remain in the stream.
+    :type stream: File-like object or None
     :returns:
         A list where each element is a row. The first row is the header row.
     :rtype: list
     """
 
+    metrics = ConversionMetrics() if metrics else NULL_METRICS
+
+    if stream is not None:
+        cache = None
+
+    if cache is not None:
+        key = cache.definition_key(
+            'rios_to_redcap',
+            [instrument, form, calculationset],
+            localization=localization,
+        )
+        payload = cache.get(key)
+        if payload is not None:
+            if metrics.enabled:
+                metrics.count('cache_hits')
+                payload['metrics'] = metrics.as_dict()
+            return payload
+
     payload = dict()
 
     try:
-        _validate_rios(instrument, form, calculationset)
-        _check_rios_relationship(instrument, form, calculationset)
+        with metrics.phase('validate'):
+            _validate_rios(instrument, form, calculationset)
+            _check_rios_relationship(instrument, form, calculationset)
     except Exception as exc:
         error = ConversionFailureError(
             'The supplied RIOS configurations are invalid:',
@@ -296,6 +455,9 @@ def rios_to_redcap(instrument, form, calculationset=None,
         form=form,
         calculationset=calculationset,
         localization=localization,
+        metrics=metrics,
+        expressions=expressions,
+        stream=stream,
     )
 
     try:
@@ -307,16 +469,21 @@ def rios_to_redcap(instrument, form, calculationset=None,
         )
         if suppress:
             payload['failure'] = str(error)
+            if metrics.enabled:
+                payload['metrics'] = converter.metrics_report()
         else:
             raise error
     else:
         payload.update(converter.package)
+        if cache is not None:
+            cache.set(key, payload)
 
     return payload
 
 
 def rios_to_qualtrics(instrument, form, calculationset=None,
-                                    localization=None, suppress=False):
+                            localization=None, suppress=False, cache=None,
+                            metrics=False, stream=None):
     """
     Converts a RIOS configuration into a Qualtrics configuration.
 
@@ -337,15 +504,52 @@ def rios_to_qualtrics(instrument, form, calculationset=None,
         the returned dict will not contain key-value pairs with conversion
         data if exception suppression is set.
     :type suppress: bool
+    :param cache:
+        Optional cache of converted packages. If the same conversion was
+        stored before, the stored package is returned without converting
+        or validating anything.
+    :type cache: rios.conversion.utils.ConversionCache or None
+    :param metrics:
+        Record the wall time and count of each conversion phase (read,
+        process, finalize, validate, serialize), and counts of the rows,
+        fields, calculations, warnings, and errors. These are returned under
+        a ``metrics`` key.
+    :type metrics: bool
+    :param stream:
+        Optional text stream to write the Qualtrics data dictionary to. The
+        lines are written as the form is processed, and are not kept: the
+        ``instrument`` of the returned package is empty. The cache is not
+        used. If the conversion fails, the lines written before the failure
+        remain in the stream.
+    :type stream: File-like object or None
     :returns: The RIOS instrument, form, and calculationset configuration.
     :rtype: dictionary
     """
 
+    metrics = ConversionMetrics() if metrics else NULL_METRICS
+
+    if stream is not None:
+        cache = None
+
+    if cache is not None:
+        key = cache.definition_key(
+            'rios_to_qualtrics',
+            [instrument, form, calculationset],
+            localization=localization,
+        )
+        payload = cache.get(key)
+        if payload is not None:
+            if metrics.enabled:
+                metrics.count('cache_hits')
+                payload['metrics'] = metrics.as_dict()
+            return payload
+
     payload = dict()
 
     try:
-        _validate_rios(instrument, form, calculationset)
-        _check_rios_relationship(instrument, form, calculationset)
+        with metrics.phase('validate'):
+            _validate_rios(instrument, form, calculationset)
+            _check_rios_relationship(instrument, form, calculationset)
     except Exception as exc:
         error = ConversionFailureError(
             'The supplied RIOS configurations are invalid:',
@@ -362,6 +566,8 @@ def rios_to_qualtrics(instrument, form, calculationset=None,
         form=form,
         calculationset=calculationset,
         localization=localization,
+        metrics=metrics,
+        stream=stream,
     )
 
     try:
@@ -373,9 +579,100 @@ def rios_to_qualtrics(instrument, form, calculationset=None,
         )
         if suppress:
             payload['failure'] = str(error)
+            if metrics.enabled:
+                payload['metrics'] = converter.metrics_report()
         else:
             raise error
     else:
         payload.update(converter.package)
+        if cache is not None:
+            cache.set(key, payload)
 
     return payload
+
+
+def _rios_files(api_function, instrument, form, calculationset, options):
+    try:
+        definitions = {
+            'instrument': load_definition(instrument),
+            'form': load_definition(form),
+            'calculationset': (
+                load_definition(calculationset) if calculationset else None
+            ),
+        }
+    except (IOError, OSError, ValueError, yaml.YAMLError) as exc:
+        error = ConversionFailureError(
+            'Unable to read RIOS definitions. Error:',
+            str(exc)
+        )
+        if options.get('suppress', False):
+            return {'failure': str(error)}
+        raise error
+    options.update(definitions)
+    return api_function(**options)
+
+
+def rios_to_redcap_files(instrument, form, calculationset=None, **options):
+    """
+    Converts a RIOS configuration stored in files into a REDCap
+    configuration. The files are parsed by the fastest available JSON or
+    YAML backend (see ``rios.conversion.utils.backends``).
+
+    :param instrument: The filename of the RIOS instrument definition
+    :type instrument: str
+    :param form: The filename of the RIOS form definition
+    :type form: str
+    :param calculationset:
+        The filename of the RIOS calculationset definition, if any
+    :type calculationset: str or None
+    :param options:
+        The other arguments of ``rios_to_redcap``. If ``suppress`` is set,
+        a file that cannot be read is reported under a ``failure`` key.
+    :returns: The payload of ``rios_to_redcap``.
+    :rtype: dictionary
+    """
+
+    return _rios_files(
+        rios_to_redcap,
+        instrument,
+        form,
+        calculationset,
+        options,
+    )
+
+
+def rios_to_qualtrics_files(instrument, form, calculationset=None,
+                            **options):
+    """
+    Converts a RIOS configuration stored in files into a Qualtrics
+    configuration. The files are parsed by the fastest available JSON or
+    YAML backend (see ``rios.conversion.utils.backends``).
+
+    :param instrument: The filename of the RIOS instrument definition
+    :type instrument: str
+    :param form: The filename of the RIOS form definition
+    :type form: str
+    :param calculationset:
+        The filename of the RIOS calculationset definition, if any
+    :type calculationset: str or None
+    :param options:
+        The other arguments of ``rios_to_qualtrics``. If ``suppress`` is
+        set, a file that cannot be read is reported under a ``failure`` key.
+    :returns: The payload of ``rios_to_qualtrics``.
+    :rtype: dictionary
+    """
+
+    return _rios_files(
+        rios_to_qualtrics,
+        instrument,
+        form,
+        calculationset,
+        options,
+    )
+
+
+from rios.conversion.batch import (  # noqa:E402
+    ConversionJob,
+    ConversionResult,
+    convert_many,
+)
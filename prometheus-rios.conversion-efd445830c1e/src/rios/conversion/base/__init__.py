@@ -10,6 +10,12 @@ from .base import (  # noqa:F401
     DEFAULT_LOCALIZATION,
     SUCCESS_MESSAGE,
 )
+from .export import (  # noqa:F401
+    export_definition,
+    write_definition,
+    write_json,
+    write_yaml,
+)
 from .from_rios import FromRios  # noqa:F401
 from .to_rios import ToRios  # noqa:F401
 from .structures import *  # noqa:F401,F403
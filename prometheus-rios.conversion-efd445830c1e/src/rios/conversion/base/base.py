@@ -6,7 +6,8 @@
 import structures
 
 
-from rios.conversion.utils import InMemoryLogger
+from rios.conversion.utils import InMemoryLogger, NULL_METRICS
+from rios.conversion.utils.log import ERROR_PREFIX, WARNING_PREFIX
 
 
 __all__ = (
@@ -69,6 +70,38 @@ class ConversionBase(object):
             self._logger = InMemoryLogger()
             return self._logger
 
+    @property
+    def metrics(self):
+        """
+        Metrics interface. Implementations record the wall time of their
+        conversion phases and counters of the converted data here. Unless a
+        ConversionMetrics instance was given to the converter, this is a
+        no-op object that records nothing.
+        """
+
+        try:
+            return self._metrics
+        except AttributeError:
+            self._metrics = NULL_METRICS
+            return self._metrics
+
+    def metrics_report(self):
+        """
+        Counts the logged warnings and errors, and returns the recorded
+        metrics as a dictionary.
+        """
+
+        logs = self.logs
+        self.metrics.set(
+            'warnings',
+            sum(1 for log in logs if log.startswith(WARNING_PREFIX))
+        )
+        self.metrics.set(
+            'errors',
+            sum(1 for log in logs if log.startswith(ERROR_PREFIX))
+        )
+        return self.metrics.as_dict()
+
     @property
     def pplogs(self):
         """
@@ -97,7 +130,8 @@ class ConversionBase(object):
     def package(self):
         """
         Returns a dictionary with an ``instrument`` key containing the
-        converted definitions. May also add a ``logger`` key if logs exist.
+        converted definitions. May also add a ``logger`` key if logs exist,
+        and a ``metrics`` key if metrics are recorded.
 
         Implementations must override this method.
         """
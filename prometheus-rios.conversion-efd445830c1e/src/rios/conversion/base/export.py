@@ -0,0 +1,336 @@
+#
+# Copyright (c) 2016, Prometheus Research, LLC
+#
+# Single-pass export of RIOS objects.
+#
+# clean() followed by as_dict() walks a RIOS object twice, recursively, and
+# modifies it along the way. The functions here walk the object once, with
+# an explicit stack instead of recursion, and never modify it. "Empty"
+# values are skipped as they are reached, using the same rule as clean():
+# '', and empty lists, dicts, and RIOS objects are removed, while False, 0,
+# 0.0, and None are kept. An object or list that only holds empty values is
+# removed too.
+#
+# The walk produces a sequence of events, which export_definition() turns
+# into plain dicts and lists, and write_json() and write_yaml() turn into
+# text written to a stream, without building the dicts first. Plain dicts
+# are walked too, in key order, so definitions that were already exported
+# or loaded from files are written the same way.
+
+
+import json
+import six
+import yaml
+
+from rios.conversion.utils.backends import YamlDumper
+
+from .structures import _Specification
+
+
+__all__ = (
+    'FORMATS',
+    'export_definition',
+    'write_definition',
+    'write_json',
+    'write_yaml',
+)
+
+
+FORMATS = ('json', 'yaml')
+
+# Text is written to streams in chunks of at least this many characters
+CHUNK_SIZE = 65536
+
+
+# Event kinds: (MAP, key), (LIST, key), (SCALAR, key, value), (END, None).
+# The key is None for the items of a list.
+MAP = 'map'
+LIST = 'list'
+SCALAR = 'scalar'
+END = 'end'
+
+# Falsy values that are not "empty"
+_KEPT = (False, 0, 0.0, None)
+
+
+def _children(value):
+    if isinstance(value, _Specification):
+        return MAP, six.iteritems(value)
+    if type(value) is dict:
+        return MAP, iter(sorted(six.iteritems(value)))
+    if isinstance(value, dict):
+        return MAP, six.iteritems(value)
+    return LIST, ((None, item) for item in value)
+
+
+def iter_events(obj):
+    """
+    Yields the events of the export of the RIOS object or dict ``obj``.
+    Events for
+    an object or list are only yielded once it is known to hold a value
+    that is not empty.
+    """
+
+    yield (MAP, None)
+    stack = [_children(obj)[1]]
+    # Objects and lists entered but not yet yielded, as they may be empty
+    pending = []
+    while stack:
+        for key, value in stack[-1]:
+            if isinstance(value, (_Specification, dict, list, tuple)):
+                if value:
+                    kind, items = _children(value)
+                    pending.append((kind, key))
+                    stack.append(items)
+                    break
+            elif value or value in _KEPT:
+                for event in pending:
+                    yield event
+                del pending[:]
+                yield (SCALAR, key, value)
+        else:
+            stack.pop()
+            if pending:
+                pending.pop()
+            else:
+                yield (END, None)
+
+
+def export_definition(obj):
+    """
+    Returns the RIOS object ``obj`` as plain dicts and lists, without its
+    "empty" values. The result is the same as ``obj.clean().as_dict()``,
+    but ``obj`` is left unchanged, lists of plain values are exported as
+    lists, and "empty" values are removed from plain dicts too.
+    """
+
+    containers = []
+    for event in iter_events(obj):
+        kind, key = event[0], event[1]
+        if kind == END:
+            root = containers.pop()
+            continue
+        if kind == MAP:
+            value = {}
+        elif kind == LIST:
+            value = []
+        else:
+            value = event[2]
+        if containers:
+            parent = containers[-1]
+            if key is None:
+                parent.append(value)
+            else:
+                parent[key] = value
+        if kind != SCALAR:
+            containers.append(value)
+    return root
+
+
+def _json_chunks(obj, indent, separators):
+    item_separator, key_separator = separators
+    encode = json.JSONEncoder(indent=indent, separators=separators).encode
+    # One [kind, count] per open object or list
+    containers = []
+    for event in iter_events(obj):
+        kind, key = event[0], event[1]
+        if kind == END:
+            closed, count = containers.pop()
+            if indent is not None and count:
+                yield '\n' + ' ' * (indent * len(containers))
+            yield '}' if closed == MAP else ']'
+            continue
+        prefix = ''
+        if containers:
+            container = containers[-1]
+            if container[1]:
+                prefix = item_separator
+            container[1] += 1
+            if indent is not None:
+                prefix += '\n' + ' ' * (indent * len(containers))
+            if key is not None:
+                prefix += encode(key) + key_separator
+        if kind == MAP:
+            containers.append([MAP, 0])
+            yield prefix + '{'
+        elif kind == LIST:
+            containers.append([LIST, 0])
+            yield prefix + '['
+        else:
+            text = encode(event[2])
+            if indent is not None:
+                text = text.replace(
+                    '\n',
+                    '\n' + ' ' * (indent * len(containers)),
+                )
+            yield prefix + text
+
+
+def _write_chunks(chunks, stream):
+    buffered = []
+    size = 0
+    for chunk in chunks:
+        buffered.append(chunk)
+        size += len(chunk)
+        if size >= CHUNK_SIZE:
+            stream.write(''.join(buffered))
+            buffered = []
+            size = 0
+    if buffered:
+        stream.write(''.join(buffered))
+
+
+def write_json(obj, stream, indent=None, compact=False):
+    """
+    Writes the export of the RIOS object ``obj`` to ``stream`` as JSON,
+    indented by ``indent`` spaces per level if given. If ``compact`` is
+    set, no whitespace is written at all.
+    """
+
+    if compact:
+        indent = None
+        separators = (',', ':')
+    elif indent is None:
+        separators = (', ', ': ')
+    else:
+        separators = (',', ': ')
+    _write_chunks(_json_chunks(obj, indent, separators), stream)
+
+
+class _YamlEvents(yaml.representer.SafeRepresenter, yaml.resolver.Resolver):
+    """ Converts the events of an export to PyYAML emitter events """
+
+    def __init__(self, flow_style=False):
+        yaml.representer.SafeRepresenter.__init__(
+            self,
+            default_flow_style=flow_style,
+        )
+        yaml.resolver.Resolver.__init__(self)
+        self.flow_style = flow_style
+
+    def scalar(self, value):
+        """ Yields the emitter events of a plain value """
+
+        node = self.represent_data(value)
+        self.represented_objects = {}
+        self.object_keeper = []
+        self.alias_key = None
+        # As in yaml.serializer.Serializer.serialize_node()
+        stack = [(None, iter([node]))]
+        while stack:
+            for node in stack[-1][1]:
+                if isinstance(node, yaml.ScalarNode):
+                    detected = self.resolve(
+                        yaml.ScalarNode,
+                        node.value,
+                        (True, False),
+                    )
+                    default = self.resolve(
+                        yaml.ScalarNode,
+                        node.value,
+                        (False, True),
+                    )
+                    yield yaml.ScalarEvent(
+                        None,
+                        node.tag,
+                        (node.tag == detected, node.tag == default),
+                        node.value,
+                        style=node.style,
+                    )
+                    continue
+                implicit = (node.tag == self.resolve(
+                    type(node),
+                    node.value,
+                    True,
+                ))
+                if isinstance(node, yaml.SequenceNode):
+                    yield yaml.SequenceStartEvent(
+                        None,
+                        node.tag,
+                        implicit,
+                        flow_style=node.flow_style,
+                    )
+                    stack.append((node, iter(node.value)))
+                else:
+                    yield yaml.MappingStartEvent(
+                        None,
+                        node.tag,
+                        implicit,
+                        flow_style=node.flow_style,
+                    )
+                    stack.append((
+                        node,
+                        (item for pair in node.value for item in pair),
+                    ))
+                break
+            else:
+                node = stack.pop()[0]
+                if isinstance(node, yaml.SequenceNode):
+                    yield yaml.SequenceEndEvent()
+                elif node is not None:
+                    yield yaml.MappingEndEvent()
+
+    def events(self, obj):
+        yield yaml.StreamStartEvent()
+        yield yaml.DocumentStartEvent(explicit=False)
+        containers = []
+        for event in iter_events(obj):
+            kind, key = event[0], event[1]
+            if kind == END:
+                yield containers.pop()
+                continue
+            if key is not None:
+                for item in self.scalar(key):
+                    yield item
+            if kind == MAP:
+                containers.append(yaml.MappingEndEvent())
+                yield yaml.MappingStartEvent(
+                    None,
+                    None,
+                    True,
+                    flow_style=self.flow_style,
+                )
+            elif kind == LIST:
+                containers.append(yaml.SequenceEndEvent())
+                yield yaml.SequenceStartEvent(
+                    None,
+                    None,
+                    True,
+                    flow_style=self.flow_style,
+                )
+            else:
+                for item in self.scalar(event[2]):
+                    yield item
+        yield yaml.DocumentEndEvent(explicit=False)
+        yield yaml.StreamEndEvent()
+
+
+def write_yaml(obj, stream, compact=False):
+    """
+    Writes the export of the RIOS object ``obj`` to ``stream`` as YAML, in
+    block style, or in flow style on a single line if ``compact`` is set.
+    """
+
+    yaml.emit(
+        _YamlEvents(flow_style=compact).events(obj),
+        stream,
+        Dumper=YamlDumper,
+        width=(1 << 30) if compact else None,
+    )
+
+
+def write_definition(obj, stream, format='json', compact=False):
+    """
+    Writes the export of the RIOS object or dict ``obj`` to ``stream`` in
+    ``format``, one of ``FORMATS``. JSON is indented by 2 spaces and YAML
+    is written in block style, unless ``compact`` is set.
+    """
+
+    if format == 'json':
+        write_json(obj, stream, indent=2, compact=compact)
+    elif format == 'yaml':
+        write_yaml(obj, stream, compact=compact)
+    else:
+        raise ValueError(
+            'Invalid output format. Got: {}'.format(format)
+        )
@@ -3,6 +3,9 @@
 #
 
 
+import six
+
+from rios.core.validation.instrument import get_full_type_definition
 from rios.conversion.base import ConversionBase, DEFAULT_LOCALIZATION
 
 
@@ -15,21 +18,75 @@ class FromRios(ConversionBase):
     """ Converts a valid RIOS specification into a foreign instrument """
 
     def __init__(self, form, instrument, calculationset=None,
-                                localization=None, *args, **kwargs):
+                    localization=None, metrics=None, *args, **kwargs):
         """
         Expects `form`, `instrument`, and `calculationset` to be dictionary
         objects. Implementations must process the data dictionary first before
         passing to this class.
+
+        If `metrics` is a ConversionMetrics instance, the conversion phases
+        are timed and counted in it, and reported in the package.
         """
 
         self.localization = localization or DEFAULT_LOCALIZATION
         self._form = form
         self._instrument = instrument
         self._calculationset = (calculationset if calculationset else {})
+        if metrics is not None:
+            self._metrics = metrics
 
         self._definition = list()
 
-        self.fields = {f['id']: f for f in self._instrument['record']}
+        with self.metrics.phase('read'):
+            self.fields = {f['id']: f for f in self._instrument['record']}
+            self.types = self.get_types(self._instrument, self.fields)
+        self.metrics.set('fields', len(self.fields))
+        self.metrics.set(
+            'calculations',
+            len(self._calculationset.get('calculations', ()))
+        )
+
+    @staticmethod
+    def get_types(instrument, fields):
+        """
+        Returns a dict of field ID => full type definition of the field, with
+        its ``base`` type and its inherited constraints, such as ``range``
+        and ``enumerations``. Each custom type of `instrument` is resolved
+        once, however many fields share it. Fields whose type cannot be
+        resolved are left out, and fail when they are converted.
+        """
+
+        resolved = {}
+        types = {}
+        for identifier, field in six.iteritems(fields):
+            type_def = field['type']
+            try:
+                if isinstance(type_def, six.string_types):
+                    if type_def not in resolved:
+                        resolved[type_def] = get_full_type_definition(
+                            instrument,
+                            type_def,
+                        )
+                    types[identifier] = resolved[type_def]
+                else:
+                    types[identifier] = get_full_type_definition(
+                        instrument,
+                        type_def,
+                    )
+            except (TypeError, ValueError):
+                continue
+        return types
+
+    def get_type(self, field_id):
+        """ Returns the full type definition of the field `field_id` """
+
+        type_object = self.types.get(field_id, None)
+        if type_object is None:
+            type_object = get_full_type_definition(
+                self._instrument,
+                self.fields[field_id]['type'],
+            )
+        return type_object
 
     @staticmethod
     def get_local_text(localization, localized_str_obj):
@@ -44,10 +101,13 @@ class FromRios(ConversionBase):
         """
         Returns a dictionary with an ``instrument`` key matched to a value
         that is a list of lines of the foriegn instrument file. May also add
-        a ``logger`` key if logs exist.
+        a ``logger`` key if logs exist, and a ``metrics`` key if metrics are
+        recorded.
         """
 
         payload = {'instrument': self.instrument}
         if self.logger.check:
             payload.update({'logs': self.logs})
+        if self.metrics.enabled:
+            payload.update({'metrics': self.metrics_report()})
         return payload
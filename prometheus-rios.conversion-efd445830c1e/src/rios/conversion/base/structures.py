@@ -1,27 +1,48 @@
 #
 # Copyright (c) 2016, Prometheus Research, LLC
 #
-# RIOS objects are all implemented as subclasses of DefinitionSpecification
-# which is a subclass of OrderedDict.
+# RIOS objects are all implemented as mappings, subclassing either
+# DefinitionSpecification or RecordSpecification.
 #
-# A dict would suffice, but the OrderedDict output matches the order
-# of the Rios on-line documentation at
+# Objects with free-form keys (e.g., localized strings, type collections,
+# and enumeration collections) subclass DefinitionSpecification, which is a
+# subclass of OrderedDict.
+#
+# Objects with a fixed set of attributes, declared in ``props``, subclass
+# RecordSpecification, which stores each attribute in a slot instead of a
+# dict. The slots are listed in ``props`` order, so the output matches the
+# order of the Rios on-line documentation at
 # http://rios.readthedocs.org/en/latest/index.html
 #
-# The RIOS objects are instantiated with ALL their attributes however
-# all the "empty" attributes must be removed to pass RIOS validation.
-# DefinitionSpecification.clean() will recurse through the object and
-# remove all the "empty" attributes.
+# A RecordSpecification only holds the attributes that were set. Reading
+# an attribute that is not set returns an empty value of its type without
+# storing it; the add_*() methods store lists and nested objects the first
+# time they add to them, so an object never allocates children it does not
+# use.
+#
+# All the "empty" attributes must be removed to pass RIOS validation.
+# clean() will recurse through the object and remove all the "empty"
+# attributes, and as_dict() exports the object as plain dicts and lists.
 #
 # Note that clean() does not consider False, 0, 0.0, or None to be empty.
 # Use '', the empty string, to ensure an attribute will be removed.
+#
+# Setting or deleting an attribute of a RIOS object, and adding to it with
+# the add_*() methods, bumps a module wide counter, available from
+# mutation_count(). Code holding output derived from RIOS objects (e.g., the
+# dicts exported by ToRios.finalize()) compares the counter to detect that
+# its output may be stale.
 
 
+import abc
 import collections
+import six
 
 
 __all__ = (
         'DefinitionSpecification',
+        'RecordSpecification',
+        'mutation_count',
 
         'Instrument',
         'FieldObject',
@@ -51,27 +72,38 @@ __all__ = (
         )
 
 
-class DefinitionSpecification(collections.OrderedDict):
-    props = collections.OrderedDict()
+_mutations = [0]
+
+# Value of an unset RecordSpecification slot
+_MISSING = object()
+
+
+def mutation_count():
     """
-    props == {(key, type), ...}
+    Returns the number of changes made to all RIOS objects so far.
     """
-    def __init__(self, props={}, **kwargs):
-        """
-        if ``self.props`` has items, filter out any keys
-        in  ``props`` and ``kwargs`` not in self.props;
-        otherwise initialize from props and/or kwargs.
-        """
-        super(DefinitionSpecification, self).__init__()
-        self.update({k: v() for k, v in self.props.items()})
-        self.update({
-                k: v
-                for k, v in props.items()
-                if not self.props or k in self.props})
-        self.update({
-                k: v
-                for k, v in kwargs.items()
-                if not self.props or k in self.props})
+    return _mutations[0]
+
+
+class _Specification(object):
+    """ Behaviour shared by all RIOS objects """
+
+    __slots__ = ()
+
+    def _child(self, key):
+        # The child at key, stored first if it was not set
+        if key not in self:
+            self[key] = self.props[key]()
+        return self[key]
+
+    def _append(self, key, value):
+        _mutations[0] += 1
+        self._child(key).append(value)
+
+    def __reduce__(self):
+        # Rebuild without __init__, which would add back all the "empty"
+        # attributes that clean() removed.
+        return (_rebuild, (self.__class__, list(self.items())))
 
     def clean(self):
         """Removes "empty" items from self.
@@ -80,10 +112,10 @@ class DefinitionSpecification(collections.OrderedDict):
 
         All arrays are assumed to be arrays of DefinitionSpecification.
         """
-        for k, v in self.items():
+        for k, v in list(self.items()):
             if v not in [False, 0, 0.0, None]:
                 if bool(v):
-                    if isinstance(v, DefinitionSpecification):
+                    if isinstance(v, _Specification):
                         v.clean()
                     elif isinstance(v, list):
                         v = [x for x in v if x.clean()]
@@ -97,12 +129,12 @@ class DefinitionSpecification(collections.OrderedDict):
         out = dict()
 
         for key, value in self.items():
-            if isinstance(value, DefinitionSpecification):
+            if isinstance(value, _Specification):
                 out[key] = value.as_dict()
             elif isinstance(value, (list, tuple)):
                 out[key] = []
                 for v in value:
-                    if isinstance(v, DefinitionSpecification):
+                    if isinstance(v, _Specification):
                         out[key].append(v.as_dict())
                     else:
                         out[key] = v
@@ -112,6 +144,212 @@ class DefinitionSpecification(collections.OrderedDict):
         return out
 
 
+def _rebuild(cls, items):
+    obj = cls.__new__(cls)
+    obj._restore(items)
+    return obj
+
+
+class DefinitionSpecification(_Specification, collections.OrderedDict):
+    props = collections.OrderedDict()
+    """
+    props == {(key, type), ...}
+    """
+    def __init__(self, props={}, **kwargs):
+        """
+        if ``self.props`` has items, filter out any keys
+        in  ``props`` and ``kwargs`` not in self.props;
+        otherwise initialize from props and/or kwargs.
+        """
+        super(DefinitionSpecification, self).__init__()
+        self.update({k: v() for k, v in self.props.items()})
+        self.update({
+                k: v
+                for k, v in props.items()
+                if not self.props or k in self.props})
+        self.update({
+                k: v
+                for k, v in kwargs.items()
+                if not self.props or k in self.props})
+
+    def __setitem__(self, key, value, **kwargs):
+        _mutations[0] += 1
+        super(DefinitionSpecification, self).__setitem__(key, value, **kwargs)
+
+    def __delitem__(self, key, **kwargs):
+        _mutations[0] += 1
+        super(DefinitionSpecification, self).__delitem__(key, **kwargs)
+
+    def _restore(self, items):
+        collections.OrderedDict.__init__(self, items)
+
+
+class _RecordMeta(abc.ABCMeta):
+    """
+    Gives every RecordSpecification subclass one slot per prop, named after
+    the prop with a leading underbar.
+    """
+
+    def __new__(mcs, name, bases, namespace):
+        props = namespace.get('props', None)
+        if props is not None:
+            namespace['__slots__'] = tuple('_' + key for key in props)
+            namespace['_slot_items'] = tuple(
+                (key, '_' + key)
+                for key in props
+            )
+            namespace['_slot_names'] = dict(namespace['_slot_items'])
+            # False is not "empty", so clean() keeps it. Set it up front,
+            # as it costs no allocation.
+            namespace['_eager_slots'] = tuple(
+                '_' + key
+                for key, kind in props.items()
+                if kind is bool
+            )
+        return super(_RecordMeta, mcs).__new__(mcs, name, bases, namespace)
+
+
+@six.add_metaclass(_RecordMeta)
+class RecordSpecification(_Specification):
+    """
+    Base class of RIOS objects with a fixed set of attributes, declared in
+    ``props`` as (key, type) pairs. Implements the mutable mapping
+    interface; only attributes that were set, and boolean attributes, are
+    keys. Reading a declared attribute that is not set returns an empty
+    value of its type, without setting it.
+    """
+
+    props = collections.OrderedDict()
+
+    def __init__(self, props={}, **kwargs):
+        """
+        Sets the attributes in ``props`` and ``kwargs``. Keys not in
+        ``self.props`` are ignored.
+        """
+        for name in self._eager_slots:
+            setattr(self, name, False)
+        for source in (props, kwargs):
+            for key, value in source.items():
+                name = self._slot_names.get(key)
+                if name is not None:
+                    setattr(self, name, value)
+
+    def _restore(self, items):
+        for key, value in items:
+            setattr(self, self._slot_names[key], value)
+
+    def __getitem__(self, key):
+        name = self._slot_names.get(key)
+        if name is None:
+            raise KeyError(key)
+        value = getattr(self, name, _MISSING)
+        if value is _MISSING:
+            return self.props[key]()
+        return value
+
+    def __setitem__(self, key, value):
+        name = self._slot_names.get(key)
+        if name is None:
+            raise KeyError(
+                '{} has no attribute {!r}'.format(
+                    self.__class__.__name__,
+                    key,
+                )
+            )
+        _mutations[0] += 1
+        setattr(self, name, value)
+
+    def __delitem__(self, key):
+        if key not in self:
+            raise KeyError(key)
+        _mutations[0] += 1
+        delattr(self, self._slot_names[key])
+
+    def __contains__(self, key):
+        name = self._slot_names.get(key)
+        return (
+            name is not None
+            and getattr(self, name, _MISSING) is not _MISSING
+        )
+
+    def iteritems(self):
+        for key, name in self._slot_items:
+            value = getattr(self, name, _MISSING)
+            if value is not _MISSING:
+                yield key, value
+
+    def iterkeys(self):
+        for key, _ in self.iteritems():
+            yield key
+
+    def itervalues(self):
+        for _, value in self.iteritems():
+            yield value
+
+    __iter__ = iterkeys
+
+    def __len__(self):
+        return sum(1 for _ in self.iteritems())
+
+    def keys(self):
+        return list(self.iterkeys())
+
+    def values(self):
+        return list(self.itervalues())
+
+    def items(self):
+        return list(self.iteritems())
+
+    def get(self, key, default=None):
+        name = self._slot_names.get(key)
+        if name is None:
+            return default
+        value = getattr(self, name, _MISSING)
+        return default if value is _MISSING else value
+
+    def pop(self, key, *default):
+        if key not in self:
+            if default:
+                return default[0]
+            raise KeyError(key)
+        value = self[key]
+        del self[key]
+        return value
+
+    def setdefault(self, key, default=None):
+        if key not in self:
+            self[key] = default
+        return self[key]
+
+    def update(self, *args, **kwargs):
+        for source in args + (kwargs,):
+            if hasattr(source, 'keys'):
+                source = [(key, source[key]) for key in source.keys()]
+            for key, value in source:
+                self[key] = value
+
+    def clear(self):
+        for key in self.keys():
+            del self[key]
+
+    def __eq__(self, other):
+        if not isinstance(other, collections.Mapping):
+            return NotImplemented
+        return dict(self.iteritems()) == dict(other.items())
+
+    def __ne__(self, other):
+        equal = self.__eq__(other)
+        return equal if equal is NotImplemented else not equal
+
+    __hash__ = None
+
+    def __repr__(self):
+        return '{}({!r})'.format(self.__class__.__name__, self.items())
+
+
+collections.MutableMapping.register(RecordSpecification)
+
+
 class AudioSourceObject(DefinitionSpecification):
     pass
 
@@ -136,7 +374,7 @@ class TypeCollectionObject(DefinitionSpecification):
     pass
 
 
-class Instrument(DefinitionSpecification):
+class Instrument(RecordSpecification):
     props = collections.OrderedDict([
             ('id', str),
             ('version', str),
@@ -148,15 +386,15 @@ class Instrument(DefinitionSpecification):
 
     def add_field(self, field_object):
         assert isinstance(field_object, FieldObject), field_object
-        self['record'].append(field_object)
+        self._append('record', field_object)
 
     def add_type(self, type_name, type_object):
         assert isinstance(type_name, str), type_name
         assert isinstance(type_object, TypeObject), type_object
-        self['types'][type_name] = type_object
+        self._child('types')[type_name] = type_object
 
 
-class FieldObject(DefinitionSpecification):
+class FieldObject(RecordSpecification):
     props = collections.OrderedDict([
             ('id', str),
             ('description', str),
@@ -168,7 +406,7 @@ class FieldObject(DefinitionSpecification):
             ])
 
 
-class BoundConstraintObject(DefinitionSpecification):
+class BoundConstraintObject(RecordSpecification):
     """Must have at least one of ['max', 'min']
     """
     props = collections.OrderedDict([
@@ -177,7 +415,7 @@ class BoundConstraintObject(DefinitionSpecification):
             ])
 
 
-class TypeObject(DefinitionSpecification):
+class TypeObject(RecordSpecification):
     props = collections.OrderedDict([
             ('base', str),
             ('range', BoundConstraintObject),
@@ -191,21 +429,21 @@ class TypeObject(DefinitionSpecification):
 
     def add_column(self, column_object):
         assert isinstance(column_object, ColumnObject), column_object
-        self['columns'].append(column_object)
+        self._append('columns', column_object)
 
     def add_enumeration(self, name, description=''):
-        self['enumerations'].add(name, description)
+        self._child('enumerations').add(name, description)
 
     def add_field(self, field_object):
         assert isinstance(field_object, FieldObject), field_object
-        self['record'].append(field_object)
+        self._append('record', field_object)
 
     def add_row(self, row_object):
         assert isinstance(row_object, RowObject), row_object
-        self['rows'].append(row_object)
+        self._append('rows', row_object)
 
 
-class ColumnObject(DefinitionSpecification):
+class ColumnObject(RecordSpecification):
     props = collections.OrderedDict([
             ('id', str),
             ('description', str),
@@ -215,7 +453,7 @@ class ColumnObject(DefinitionSpecification):
             ])
 
 
-class RowObject(DefinitionSpecification):
+class RowObject(RecordSpecification):
     props = collections.OrderedDict([
             ('id', str),
             ('description', str),
@@ -223,20 +461,20 @@ class RowObject(DefinitionSpecification):
             ])
 
 
-class EnumerationObject(DefinitionSpecification):
+class EnumerationObject(RecordSpecification):
     props = collections.OrderedDict([
             ('description', str),
             ])
 
 
-class InstrumentReferenceObject(DefinitionSpecification):
+class InstrumentReferenceObject(RecordSpecification):
     props = collections.OrderedDict([
             ('id', str),
             ('version', str),
             ])
 
 
-class CalculationSetObject(DefinitionSpecification):
+class CalculationSetObject(RecordSpecification):
     props = collections.OrderedDict([
             ('instrument', InstrumentReferenceObject),
             ('calculations', list),
@@ -244,10 +482,10 @@ class CalculationSetObject(DefinitionSpecification):
 
     def add(self, calc_object):
         assert isinstance(calc_object, CalculationObject), calc_object
-        self['calculations'].append(calc_object)
+        self._append('calculations', calc_object)
 
 
-class CalculationObject(DefinitionSpecification):
+class CalculationObject(RecordSpecification):
     props = collections.OrderedDict([
             ('id', str),
             ('description', str),
@@ -257,7 +495,7 @@ class CalculationObject(DefinitionSpecification):
             ])
 
 
-class WebForm(DefinitionSpecification):
+class WebForm(RecordSpecification):
     props = collections.OrderedDict([
             ('instrument', InstrumentReferenceObject),
             ('defaultLocalization', str),
@@ -268,15 +506,15 @@ class WebForm(DefinitionSpecification):
 
     def add_page(self, page_object):
         assert isinstance(page_object, PageObject), page_object
-        self['pages'].append(page_object)
+        self._append('pages', page_object)
 
     def add_parameter(self, parameter_name, parameter_object):
         assert isinstance(parameter_name, str), parameter_name
         assert isinstance(parameter_object, ParameterObject), parameter_object
-        self['parameters'][parameter_name] = parameter_object
+        self._child('parameters')[parameter_name] = parameter_object
 
 
-class PageObject(DefinitionSpecification):
+class PageObject(RecordSpecification):
     props = collections.OrderedDict([
             ('id', str),
             ('elements', list),
@@ -289,10 +527,10 @@ class PageObject(DefinitionSpecification):
                 else [element_object])
         for element in element_list:
             assert isinstance(element, ElementObject), element
-            self['elements'].append(element)
+            self._append('elements', element)
 
 
-class ElementObject(DefinitionSpecification):
+class ElementObject(RecordSpecification):
     props = collections.OrderedDict([
             ('type', str),
             ('options', DefinitionSpecification),
@@ -300,14 +538,14 @@ class ElementObject(DefinitionSpecification):
             ])
 
 
-class WidgetConfigurationObject(DefinitionSpecification):
+class WidgetConfigurationObject(RecordSpecification):
     props = collections.OrderedDict([
             ('type', str),
             ('options', DefinitionSpecification),
             ])
 
 
-class QuestionObject(DefinitionSpecification):
+class QuestionObject(RecordSpecification):
     props = collections.OrderedDict([
             ('fieldId', str),
             ('text', LocalizedStringObject),
@@ -325,28 +563,28 @@ class QuestionObject(DefinitionSpecification):
         assert isinstance(
                 descriptor_object,
                 DescriptorObject), descriptor_object
-        self['enumerations'].append(descriptor_object)
+        self._append('enumerations', descriptor_object)
 
     def add_question(self, question_object):
         assert isinstance(question_object, QuestionObject), question_object
-        self['questions'].append(question_object)
+        self._append('questions', question_object)
 
     def add_row(self, descriptor_object):
         assert isinstance(
                 descriptor_object,
                 DescriptorObject), descriptor_object
-        self['rows'].append(descriptor_object)
+        self._append('rows', descriptor_object)
 
     def add_event(self, event_object):
         assert isinstance(event_object, EventObject), event_object
-        self['events'].append(event_object)
+        self._append('events', event_object)
 
     def set_widget(self, widget):
         assert isinstance(widget, WidgetConfigurationObject), widget
         self['widget'] = widget
 
 
-class DescriptorObject(DefinitionSpecification):
+class DescriptorObject(RecordSpecification):
     props = collections.OrderedDict([
             ('id', str),
             ('text', LocalizedStringObject),
@@ -355,7 +593,7 @@ class DescriptorObject(DefinitionSpecification):
             ])
 
 
-class EventObject(DefinitionSpecification):
+class EventObject(RecordSpecification):
     props = collections.OrderedDict([
             ('trigger', str),
             ('action', str),
@@ -364,7 +602,7 @@ class EventObject(DefinitionSpecification):
             ])
 
 
-class ParameterObject(DefinitionSpecification):
+class ParameterObject(RecordSpecification):
     props = collections.OrderedDict([
             ('type', str),
             ])
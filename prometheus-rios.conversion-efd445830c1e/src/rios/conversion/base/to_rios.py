@@ -3,6 +3,8 @@
 #
 
 
+import collections
+
 from rios.core import ValidationError
 from rios.conversion.exception import (
     ConversionValidationError,
@@ -10,7 +12,9 @@ from rios.conversion.exception import (
 from rios.conversion.base import structures
 from rios.conversion.base import (
     ConversionBase,
+    export_definition,
     localized_string_object,
+    write_definition,
     DEFAULT_VERSION,
     DEFAULT_LOCALIZATION,
     SUCCESS_MESSAGE,
@@ -31,10 +35,13 @@ class ToRios(ConversionBase):
     """ Converts a foreign instrument into a valid RIOS specification """
 
     def __init__(self, id, title, description, stream, localization=None,
-                                    instrument_version=None, *args, **kwargs):
+                    instrument_version=None, metrics=None, *args, **kwargs):
         """
         Expects `stream` to be a file-like object. Implementations must process
         the data dictionary first before passing to this class.
+
+        If `metrics` is a ConversionMetrics instance, the conversion phases
+        are timed and counted in it, and reported in the package.
         """
 
         # Set attributes
@@ -44,13 +51,19 @@ class ToRios(ConversionBase):
         self.localization = localization or DEFAULT_LOCALIZATION
         self.description = description
         self.stream = stream
+        if metrics is not None:
+            self._metrics = metrics
 
         # Inserted into self._form
         self.page_container = dict()
         # Inserted into self._instrument
         self.field_container = list()
         # Inserted into self._calculationset
-        self.calc_container = dict()
+        self.calc_container = collections.OrderedDict()
+
+        # Exported definition dicts, see finalize()
+        self._finalized = None
+        self._finalized_at = None
 
         # Generate yet-to-be-configured RIOS definitions
         self._instrument = structures.Instrument(
@@ -68,23 +81,65 @@ class ToRios(ConversionBase):
             title=localized_string_object(self.localization, self.title),
         )
 
+    def export(self, name):
+        """
+        Exports the ``instrument``, ``form`` or ``calculationset`` RIOS
+        definition to a new dict, without its "empty" values (see
+        ``export_definition()``).
+        """
+
+        if name == 'calculationset':
+            if not self._calculationset.get('calculations', False):
+                return dict()
+        return export_definition(getattr(self, '_' + name))
+
+    def finalize(self):
+        """
+        Exports the RIOS definitions at the end of the conversion. The
+        exported dicts are kept and returned by every later access of
+        ``instrument``, ``form``, ``calculationset`` and ``package``, until
+        any RIOS object is modified, which finalizes the definitions again
+        on the next access. The dicts are shared, so callers must not modify
+        them.
+        """
+
+        self._finalized = dict(
+            (name, self.export(name))
+            for name in ('instrument', 'form', 'calculationset')
+        )
+        self._finalized_at = structures.mutation_count()
+        self.metrics.set(
+            'fields',
+            len(self._finalized['instrument'].get('record', ()))
+        )
+        self.metrics.set(
+            'calculations',
+            len(self._finalized['calculationset'].get('calculations', ()))
+        )
+        return self._finalized
+
+    def get_finalized(self, name):
+        """
+        Returns the dict of the `name` definition kept by finalize(),
+        finalizing the definitions again if a RIOS object was modified since.
+        """
+
+        if (self._finalized is None
+                or self._finalized_at != structures.mutation_count()):
+            self.finalize()
+        return self._finalized[name]
+
     @property
     def instrument(self):
-        self._instrument.clean()
-        return self._instrument.as_dict()
+        return self.get_finalized('instrument')
 
     @property
     def form(self):
-        self._form.clean()
-        return self._form.as_dict()
+        return self.get_finalized('form')
 
     @property
     def calculationset(self):
-        if self._calculationset.get('calculations', False):
-            self._calculationset.clean()
-            return self._calculationset.as_dict()
-        else:
-            return dict()
+        return self.get_finalized('calculationset')
 
     def validate(self):
         """
@@ -92,20 +147,24 @@ class ToRios(ConversionBase):
         implementations of the __call__ method.
         """
 
+        with self.metrics.phase('finalize'):
+            finalized = self.finalize()
+        instrument = finalized['instrument']
         try:
-            val_type = "Instrument"
-            validate_instrument(self.instrument)
-            val_type = "Form"
-            validate_form(
-                self.form,
-                instrument=self.instrument,
-            )
-            if self.calculationset.get('calculations', False):
-                val_type = "Calculationset"
-                validate_calculationset(
-                    self.calculationset,
-                    instrument=self.instrument
+            with self.metrics.phase('validate'):
+                val_type = "Instrument"
+                validate_instrument(instrument)
+                val_type = "Form"
+                validate_form(
+                    finalized['form'],
+                    instrument=instrument,
                 )
+                if finalized['calculationset'].get('calculations', False):
+                    val_type = "Calculationset"
+                    validate_calculationset(
+                        finalized['calculationset'],
+                        instrument=instrument
+                    )
         except ValidationError as exc:
             error = ConversionValidationError(
                 (val_type + ' validation error:'),
@@ -122,19 +181,51 @@ class ToRios(ConversionBase):
         """
         Returns a dictionary with ``instrument``, ``form``, and possibly
         ``calculationset`` keys containing their corresponding, converted
-        definitions. May also add a ``logger`` key if logs exist.
+        definitions. May also add a ``logger`` key if logs exist, and a
+        ``metrics`` key if metrics are recorded.
         """
 
-        payload = {
-            'instrument': self.instrument,
-            'form': self.form,
-        }
-        if self._calculationset.get('calculations', False):
-            payload.update(
-                {'calculationset': self.calculations}
-            )
+        with self.metrics.phase('serialize'):
+            payload = {
+                'instrument': self.get_finalized('instrument'),
+                'form': self.get_finalized('form'),
+            }
+            calculationset = self.get_finalized('calculationset')
+            if calculationset:
+                payload.update(
+                    {'calculationset': calculationset}
+                )
         if self.logger.check:
             payload.update(
                 {'logs': self.logs}
             )
+        if self.metrics.enabled:
+            payload.update(
+                {'metrics': self.metrics_report()}
+            )
         return payload
+
+    def write_package(self, stream, format='json', compact=False):
+        """
+        Writes the ``instrument``, ``form``, and possibly ``calculationset``
+        definitions of the package to ``stream`` as a single JSON or YAML
+        mapping. The text is produced straight from the RIOS objects and
+        written in chunks, without building the package dicts.
+
+        :param stream: The file-like object to write to.
+        :param format: ``json`` or ``yaml``.
+        :type format: str
+        :param compact:
+            Write without whitespace (JSON), or in flow style on a single
+            line (YAML), for machine consumers.
+        :type compact: bool
+        """
+
+        definitions = collections.OrderedDict([
+            ('instrument', self._instrument),
+            ('form', self._form),
+        ])
+        if self._calculationset.get('calculations', False):
+            definitions['calculationset'] = self._calculationset
+        with self.metrics.phase('serialize'):
+            write_definition(definitions, stream, format, compact)
@@ -0,0 +1,391 @@
+#
+# Copyright (c) 2016, Prometheus Research, LLC
+#
+
+
+import collections
+import csv
+import multiprocessing
+import os
+import time
+import timeit
+import six
+import yaml
+
+
+from rios.conversion.base import write_definition
+from rios.conversion.exception import ConversionFailureError
+from rios.conversion.utils.backends import load_definition
+
+
+__all__ = (
+    'ConversionJob',
+    'ConversionResult',
+    'convert_many',
+)
+
+
+# dict: each item => (source format, target format): API function name
+JOB_FUNCTIONS = {
+    ('redcap', 'rios'): 'redcap_to_rios',
+    ('qualtrics', 'rios'): 'qualtrics_to_rios',
+    ('rios', 'redcap'): 'rios_to_redcap',
+    ('rios', 'qualtrics'): 'rios_to_qualtrics',
+}
+
+# dict: each item => RIOS definition: output filename suffix
+RIOS_SUFFIXES = collections.OrderedDict([
+    ('instrument', '_i'),
+    ('form', '_f'),
+    ('calculationset', '_c'),
+])
+
+RIOS_FORMATS = ('yaml', 'json')
+
+# dict: each item => foreign target format: output filename extension
+OUTPUT_EXTENSIONS = {
+    'redcap': '.csv',
+    'qualtrics': '.txt',
+}
+
+# Canonical REDCap names memoized by the jobs run in this process
+_names = []
+
+
+def shared_names():
+    """
+    Returns the MemoTable of canonical REDCap names shared by the REDCap
+    jobs run in this process, so a batch of data dictionaries that repeat
+    the same form names and choice codes only computes them once.
+    """
+
+    if not _names:
+        from rios.conversion.redcap.to_rios import canonical_name
+        from rios.conversion.utils import MemoTable
+        _names.append(MemoTable(canonical_name))
+    return _names[0]
+
+
+# Translated REDCap and RIOS expressions memoized by the jobs run in this
+# process
+_expressions = []
+
+
+def shared_expressions():
+    """
+    Returns the LruTable of translated expressions shared by the REDCap jobs
+    run in this process, in both directions, so branching logic and
+    calculations repeated across a batch are only translated once.
+    """
+
+    if not _expressions:
+        from rios.conversion.redcap.to_rios import expression_table
+        _expressions.append(expression_table())
+    return _expressions[0]
+
+
+class ConversionJob(object):
+    """
+    Describes a single conversion for :func:`convert_many`.
+
+    `source` and `target` are the formats converted from and to: a
+    ``redcap`` or ``qualtrics`` source with the ``rios`` target, or the
+    ``rios`` source with a ``redcap`` or ``qualtrics`` target.
+
+    For foreign sources, `stream` is the filename of the data dictionary.
+    For the ``rios`` source, `stream` is the filename of the instrument
+    definition, and the ``form`` and ``calculationset`` options are the
+    filenames of the other definitions. Files are opened by the worker
+    process running the job, so jobs can be sent to other processes.
+
+    If `output` is set, the worker writes the converted configuration to
+    files named after it (see :meth:`write`), and only the logs, metrics, or
+    failure are sent back with the result. RIOS output is written as
+    `output_format`, either ``yaml`` or ``json``, without whitespace or on
+    a single line if `compact` is set. REDCap and Qualtrics output is
+    written by the conversion as it is produced (the ``stream`` argument of
+    the API function), unless the job has a ``cache``, whose packages are
+    written once complete.
+
+    Any remaining keyword arguments (``id``, ``title``, ``description``,
+    ``localization``, ``instrument_version``, ``filemetadata``,
+    ``suppress``, ``cache``, ``metrics``, ``names``, ``expressions``) are
+    passed on to the corresponding conversion API function. REDCap jobs that
+    are not given ``names`` or ``expressions`` share the tables of canonical
+    names and translated expressions of the process that runs them (see
+    :func:`shared_names` and :func:`shared_expressions`).
+    """
+
+    def __init__(self, source, stream, target='rios', output=None,
+                        output_format='yaml', compact=False, **options):
+        if (source, target) not in JOB_FUNCTIONS:
+            raise ValueError(
+                'Invalid conversion job. Got: {} to {}'.format(source, target)
+            )
+        if output_format not in RIOS_FORMATS:
+            raise ValueError(
+                'Invalid output format. Got: {}'.format(output_format)
+            )
+        self.source = source
+        self.target = target
+        self.stream = stream
+        self.output = output
+        self.output_format = output_format
+        self.compact = compact
+        self.options = options
+
+    @property
+    def suppress(self):
+        return bool(self.options.get('suppress', False))
+
+    def __repr__(self):
+        return '{}({!r}, {!r}, target={!r})'.format(
+            self.__class__.__name__,
+            self.source,
+            self.stream,
+            self.target,
+        )
+
+    def __call__(self):
+        """
+        Runs the conversion and returns the API function payload. If the job
+        has an output, the converted configuration is written and replaced by
+        an ``outputs`` key listing the written files. Output streamed by a
+        failed conversion is removed.
+        """
+
+        import rios.conversion
+        api_function = getattr(
+            rios.conversion,
+            JOB_FUNCTIONS[(self.source, self.target)]
+        )
+
+        try:
+            if self.source == 'rios':
+                arguments = self.load_definitions()
+            elif isinstance(self.stream, six.string_types):
+                arguments = dict(self.options, stream=open(self.stream, 'r'))
+            else:
+                arguments = dict(self.options, stream=self.stream)
+            if self.source == 'redcap':
+                arguments.setdefault('names', shared_names())
+            if 'redcap' in (self.source, self.target):
+                arguments.setdefault('expressions', shared_expressions())
+        except (IOError, OSError, ValueError, yaml.YAMLError) as exc:
+            return self.fail('Unable to read conversion input:', exc)
+
+        output = None
+        if self.streams_output:
+            filename = self.output + OUTPUT_EXTENSIONS[self.target]
+            try:
+                output = open(filename, 'w')
+            except (IOError, OSError) as exc:
+                return self.fail('Unable to write conversion output:', exc)
+            arguments['stream'] = output
+
+        try:
+            package = api_function(**arguments)
+        except BaseException:
+            if output is not None:
+                output.close()
+                os.remove(filename)
+            raise
+        finally:
+            # Only close streams opened by the job itself
+            stream = arguments.get('stream')
+            if stream is not None and stream not in (self.stream, output):
+                stream.close()
+
+        if output is not None:
+            try:
+                output.close()
+            except (IOError, OSError) as exc:
+                os.remove(filename)
+                return self.fail('Unable to write conversion output:', exc)
+            if 'failure' in package:
+                os.remove(filename)
+            else:
+                package = self.payload(package, [filename])
+        elif self.output and 'failure' not in package:
+            try:
+                package = self.write(package)
+            except (IOError, OSError, ValueError, csv.Error,
+                    yaml.YAMLError) as exc:
+                return self.fail('Unable to write conversion output:', exc)
+
+        return package
+
+    @property
+    def streams_output(self):
+        return bool(
+            self.output
+            and self.target in OUTPUT_EXTENSIONS
+            and self.options.get('cache') is None
+        )
+
+    def fail(self, message, exc):
+        error = ConversionFailureError(message, str(exc))
+        if self.suppress:
+            return {'failure': str(error)}
+        raise error
+
+    def load_definitions(self):
+        options = dict(self.options)
+        options['instrument'] = load_definition(self.stream)
+        options['form'] = load_definition(options['form'])
+        if options.get('calculationset'):
+            options['calculationset'] = load_definition(
+                options['calculationset']
+            )
+        return options
+
+    def write(self, package):
+        """
+        Writes the converted configuration to disk. RIOS definitions are
+        written to ``<output>_i``, ``<output>_f`` and ``<output>_c`` files,
+        REDCap data dictionaries to ``<output>.csv``, and Qualtrics data
+        dictionaries to ``<output>.txt``, as UTF-8 on Python 2. Only cached
+        REDCap and Qualtrics packages are written here; the others are
+        streamed by the conversion. If the package has metrics, the time
+        spent writing is added to their ``serialize`` phase.
+        """
+
+        start = timeit.default_timer()
+        outputs = []
+        if self.target == 'rios':
+            for key, suffix in six.iteritems(RIOS_SUFFIXES):
+                if not package.get(key):
+                    continue
+                filename = '{}{}.{}'.format(
+                    self.output,
+                    suffix,
+                    self.output_format,
+                )
+                with open(filename, 'w') as stream:
+                    write_definition(
+                        package[key],
+                        stream,
+                        self.output_format,
+                        self.compact,
+                    )
+                outputs.append(filename)
+        elif self.target == 'redcap':
+            from rios.conversion.redcap.from_rios import RowWriter
+            filename = self.output + '.csv'
+            with open(filename, 'w') as stream:
+                writer = RowWriter(stream)
+                for rows in package['instrument']:
+                    for row in rows:
+                        writer.append(row)
+            outputs.append(filename)
+        else:
+            from rios.conversion.qualtrics.from_rios import encode_line
+            filename = self.output + '.txt'
+            with open(filename, 'w') as stream:
+                for line in package['instrument']:
+                    stream.write(encode_line(line) + '\n')
+            outputs.append(filename)
+
+        package = self.payload(package, outputs)
+        if 'metrics' in package:
+            serialize = package['metrics']['phases']['serialize']
+            serialize['time'] += timeit.default_timer() - start
+            serialize['count'] += 1
+        return package
+
+    def payload(self, package, outputs):
+        """
+        Returns the payload sent back for a package written to `outputs`:
+        the list of written files, with the logs and metrics of the package.
+        """
+
+        payload = {'outputs': outputs}
+        if 'logs' in package:
+            payload['logs'] = package['logs']
+        if 'metrics' in package:
+            payload['metrics'] = package['metrics']
+        return payload
+
+
+class ConversionResult(object):
+    """
+    Outcome of a single :class:`ConversionJob`.
+
+    `index` is the position of the job in the sequence given to
+    :func:`convert_many`, `package` is the payload returned by the conversion
+    API function, and `elapsed` is the wall time of the job in seconds.
+    """
+
+    def __init__(self, index, job, package, elapsed):
+        self.index = index
+        self.job = job
+        self.package = package
+        self.elapsed = elapsed
+
+    @property
+    def failure(self):
+        return self.package.get('failure', None)
+
+    def __repr__(self):
+        return '{}({!r}, {!r}, {})'.format(
+            self.__class__.__name__,
+            self.index,
+            self.job,
+            ('failure' if self.failure else 'success'),
+        )
+
+
+def _initialize_worker():
+    # Importing the conversion API pulls in the ``rios.core`` validators, so
+    # do it once per worker process instead of on the first job.
+    import rios.conversion  # noqa:F401
+
+
+def _run_job(task):
+    index, job = task
+    start = time.time()
+    package = job()
+    return ConversionResult(index, job, package, time.time() - start)
+
+
+def convert_many(jobs, processes=None, chunksize=1):
+    """
+    Converts many data dictionaries across a pool of worker processes.
+
+    Results are yielded as each job finishes, so they do not necessarily
+    arrive in the order the jobs were given; use ``ConversionResult.index``
+    to match them up. Every job keeps the ``suppress`` semantics of the
+    conversion API: suppressed jobs report errors in the ``failure`` key of
+    their package, while errors of non-suppressed jobs are raised here and
+    stop the batch.
+
+    :param jobs: The conversions to run.
+    :type jobs: iterable of ConversionJob
+    :param processes:
+        Number of worker processes. Defaults to the number of CPUs. If set to
+        1, the jobs are run in the current process without a pool.
+    :type processes: int or None
+    :param chunksize: Number of jobs sent to a worker at a time.
+    :type chunksize: int
+    :returns: A result for each job, as the jobs complete.
+    :rtype: iterator of ConversionResult
+    """
+
+    tasks = enumerate(jobs)
+
+    if processes == 1:
+        for task in tasks:
+            yield _run_job(task)
+        return
+
+    pool = multiprocessing.Pool(processes, initializer=_initialize_worker)
+    try:
+        for result in pool.imap_unordered(_run_job, tasks, chunksize):
+            yield result
+    except BaseException:
+        pool.terminate()
+        raise
+    else:
+        pool.close()
+    finally:
+        pool.join()
@@ -0,0 +1,298 @@
+#
+# Copyright (c) 2016, Prometheus Research, LLC
+#
+# The ``rios-convert`` command line interface.
+#
+# Every input file becomes a ConversionJob that is run by convert_many, so
+# a whole tree of data dictionaries is converted by a single pool of worker
+# processes, and each worker writes its converted output straight to disk.
+
+
+import argparse
+import fnmatch
+import glob
+import os
+import re
+import sys
+
+
+from rios.conversion.batch import RIOS_FORMATS, ConversionJob, convert_many
+from rios.conversion.utils import ConversionCache
+
+
+__all__ = (
+    'main',
+)
+
+
+# dict: each item => command: (source format, target format)
+COMMANDS = {
+    'redcap-to-rios': ('redcap', 'rios'),
+    'qualtrics-to-rios': ('qualtrics', 'rios'),
+    'rios-to-redcap': ('rios', 'redcap'),
+    'rios-to-qualtrics': ('rios', 'qualtrics'),
+}
+
+# dict: each item => source format: filename patterns found in directories
+SOURCE_PATTERNS = {
+    'redcap': ('*.csv',),
+    'qualtrics': ('*.qsf',),
+    'rios': ('*_i.yaml', '*_i.yml', '*_i.json'),
+}
+
+# Consecutive characters not allowed in a generated instrument ID
+RE_invalid_id_characters = re.compile(r'[^a-zA-Z0-9\-]+')
+
+# Splits a RIOS instrument filename: \1 => base name, \2 => extension
+RE_instrument_filename = re.compile(r'^(.*)_i(\.[^.]+)$')
+
+
+def find_inputs(paths, source):
+    """
+    Expands the given files, directories, and glob patterns into a list of
+    ``(filename, name)`` pairs, sorted by filename, where `name` is the path
+    the output of the file is named after. Directories are searched
+    recursively for files of the `source` format, and their files are named
+    by their path under the directory; other files by their base name.
+    """
+
+    found = {}
+    for path in paths:
+        if os.path.isdir(path):
+            for dirpath, _, filenames in os.walk(path):
+                for pattern in SOURCE_PATTERNS[source]:
+                    for name in filenames:
+                        if fnmatch.fnmatch(name, pattern):
+                            filename = os.path.join(dirpath, name)
+                            found.setdefault(
+                                filename,
+                                os.path.relpath(filename, path),
+                            )
+        elif glob.has_magic(path):
+            for filename in glob.glob(path):
+                found.setdefault(filename, os.path.basename(filename))
+        else:
+            found.setdefault(path, os.path.basename(path))
+    return sorted(found.items())
+
+
+def instrument_id(filename):
+    """ Generates an instrument ID from a data dictionary filename """
+
+    name = os.path.splitext(os.path.basename(filename))[0]
+    name = RE_invalid_id_characters.sub('-', name).strip('-').lower()
+    return 'urn:' + (name or 'instrument')
+
+
+def split_instrument_filename(filename):
+    """ Returns the base name and the extension of an instrument filename """
+
+    match = RE_instrument_filename.match(filename)
+    if match:
+        return match.groups()
+    return os.path.splitext(filename)
+
+
+def make_job(args, source, target, filename, cache=None, name=None):
+    """
+    Builds the ConversionJob for a single input file. Its output is named
+    after `name`, a path relative to the output directory, which defaults to
+    the base name of the file.
+    """
+
+    options = {
+        'target': target,
+        'localization': args.localization,
+        'suppress': True,
+    }
+    if cache is not None:
+        options['cache'] = cache
+    if name is None:
+        name = os.path.basename(filename)
+    if source == 'rios':
+        base, extension = split_instrument_filename(filename)
+        output = split_instrument_filename(name)[0]
+        calculationset = base + '_c' + extension
+        options['form'] = base + '_f' + extension
+        options['calculationset'] = (
+            calculationset if os.path.exists(calculationset) else None
+        )
+    else:
+        base = os.path.splitext(filename)[0]
+        output = os.path.splitext(name)[0]
+        options['output_format'] = args.format
+        options['compact'] = args.compact
+        options['instrument_version'] = args.instrument_version
+        if args.filemetadata:
+            options['filemetadata'] = True
+        else:
+            options['id'] = instrument_id(filename)
+            options['title'] = os.path.basename(base)
+            options['description'] = ''
+    options['output'] = os.path.join(args.output, output)
+    return ConversionJob(source, filename, **options)
+
+
+def print_failures(failures, stream):
+    """ Prints a table with one row per failed input file """
+
+    width = max(len(filename) for filename, _ in failures)
+    width = max(width, len('FILE'))
+    stream.write('\n{} FAILED:\n'.format(len(failures)))
+    stream.write('{}  {}\n'.format('FILE'.ljust(width), 'ERROR'))
+    stream.write('{}  {}\n'.format('-' * width, '-' * 5))
+    for filename, failure in failures:
+        lines = [line.strip() for line in failure.splitlines()]
+        lines = [line for line in lines if line]
+        stream.write('{}  {}\n'.format(
+            filename.ljust(width),
+            ' '.join(lines[1:3]) or failure,
+        ))
+
+
+def get_parser():
+    parser = argparse.ArgumentParser(
+        prog='rios-convert',
+        description='Converts instruments to and from RIOS.',
+    )
+    parser.add_argument(
+        'command',
+        choices=sorted(COMMANDS),
+        help='the conversion to perform',
+    )
+    parser.add_argument(
+        'paths',
+        nargs='+',
+        metavar='PATH',
+        help='input files, directories, or glob patterns. Inputs for the'
+        ' RIOS conversions are instrument files named <name>_i.yaml or'
+        ' <name>_i.json, next to <name>_f and optional <name>_c files',
+    )
+    parser.add_argument(
+        '-o', '--output',
+        default='.',
+        metavar='DIR',
+        help='directory the converted files are written to'
+        ' (default: current directory)',
+    )
+    parser.add_argument(
+        '-j', '--jobs',
+        type=int,
+        default=None,
+        metavar='N',
+        help='number of worker processes (default: number of CPUs)',
+    )
+    parser.add_argument(
+        '-f', '--format',
+        choices=RIOS_FORMATS,
+        default='yaml',
+        help='format of converted RIOS files (default: yaml)',
+    )
+    parser.add_argument(
+        '--compact',
+        action='store_true',
+        help='write converted RIOS files without whitespace (json) or on a'
+        ' single line (yaml)',
+    )
+    parser.add_argument(
+        '-l', '--localization',
+        default=None,
+        help='RFC5646 language tag of the instrument text (default: en)',
+    )
+    parser.add_argument(
+        '--instrument-version',
+        default=None,
+        help='version of converted RIOS instruments (default: 1.0)',
+    )
+    parser.add_argument(
+        '--filemetadata',
+        action='store_true',
+        help='take the instrument ID, title, description, and localization'
+        ' from Qualtrics files',
+    )
+    parser.add_argument(
+        '--cache',
+        default=None,
+        metavar='DIR',
+        help='reuse conversions stored in this cache directory, which may be'
+        ' shared by concurrent runs',
+    )
+    parser.add_argument(
+        '--cache-size',
+        type=int,
+        default=256,
+        metavar='MB',
+        help='size limit of the cache directory (default: 256)',
+    )
+    parser.add_argument(
+        '-q', '--quiet',
+        action='store_true',
+        help='only report failures',
+    )
+    return parser
+
+
+def main(argv=None, stdout=None, stderr=None):
+    """
+    Runs the ``rios-convert`` command. Returns the exit status: 0 if every
+    input was converted, 1 if any conversion failed, and 2 for usage errors.
+    """
+
+    stdout = stdout or sys.stdout
+    stderr = stderr or sys.stderr
+    parser = get_parser()
+    args = parser.parse_args(argv)
+    source, target = COMMANDS[args.command]
+
+    inputs = find_inputs(args.paths, source)
+    if not inputs:
+        stderr.write('rios-convert: no input files found\n')
+        return 2
+    filenames = [filename for filename, _ in inputs]
+
+    cache = None
+    if args.cache:
+        cache = ConversionCache(
+            args.cache,
+            max_size=args.cache_size * 1024 * 1024,
+        )
+    jobs = [
+        make_job(args, source, target, filename, cache, name)
+        for filename, name in inputs
+    ]
+
+    # Inputs whose outputs would overwrite each other
+    outputs = {}
+    for filename, job in zip(filenames, jobs):
+        other = outputs.setdefault(job.output, filename)
+        if other != filename:
+            stderr.write(
+                'rios-convert: {} and {} would both be written to {}\n'
+                .format(other, filename, job.output)
+            )
+            return 2
+    for output in outputs:
+        directory = os.path.dirname(output)
+        if not os.path.isdir(directory):
+            os.makedirs(directory)
+
+    failures = []
+    for result in convert_many(jobs, processes=args.jobs):
+        filename = filenames[result.index]
+        if result.failure:
+            failures.append((filename, result.failure))
+        elif not args.quiet:
+            stdout.write('{} -> {} ({:.2f}s)\n'.format(
+                filename,
+                ', '.join(result.package['outputs']),
+                result.elapsed,
+            ))
+
+    if failures:
+        print_failures(sorted(failures), stderr)
+        return 1
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,12 @@
+#
+# Copyright (c) 2016, Prometheus Research, LLC
+#
+
+
+from .calculation import (  # noqa:F401
+    CalculationEngine,
+    CalculationError,
+    CalculationResult,
+    assessment_values,
+)
+from .graph import DependencyGraph, get_references  # noqa:F401
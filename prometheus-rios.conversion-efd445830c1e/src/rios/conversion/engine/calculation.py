@@ -0,0 +1,262 @@
+#
+# Copyright (c) 2016, Prometheus Research, LLC
+#
+# Calculationset evaluation engine.
+#
+# The expressions of a RIOS calculationset, such as the ones written by
+# redcap_to_rios(), are compiled once into code objects, and ordered so that
+# each calculation comes after the calculations it refers to (see graph.py).
+# Records are then evaluated in batches, one calculation at a time over every
+# record of the batch, so the time spent in each calculation is measured once
+# per batch rather than once per record. When answers of a record change,
+# only the calculations which depend on them are computed again.
+
+
+import collections
+import math
+import six
+import timeit
+
+import rios.conversion.redcap.functions  # noqa:F401
+
+from rios.conversion.exception import ConversionValueError
+from rios.conversion.engine.graph import DependencyGraph
+
+
+__all__ = (
+    'CalculationEngine',
+    'CalculationError',
+    'CalculationResult',
+    'assessment_values',
+)
+
+
+# dict: each item => RIOS calculation type: conversion of its results
+TYPE_CONVERSIONS = {
+    'integer': int,
+    'float': float,
+    'text': six.text_type,
+    'boolean': bool,
+}
+
+
+def assessment_values(record):
+    """
+    Returns the values of an assessment record, as the ``assessment`` of
+    calculation expressions. `record` is either a dict of field values, or
+    a RIOS assessment document, whose fields hold their value under a
+    ``value`` key.
+    """
+
+    values = record.get('values', None) if 'instrument' in record else None
+    if isinstance(values, dict):
+        return dict(
+            (field, (entry.get('value', None)
+                     if isinstance(entry, dict) else entry))
+            for field, entry in six.iteritems(values)
+        )
+    return record
+
+
+class CompiledCalculation(object):
+    """ A calculation of a calculationset, with its compiled expression """
+
+    __slots__ = ('id', 'type', 'expression', 'code', 'convert')
+
+    def __init__(self, calculation):
+        self.id = calculation['id']
+        self.type = calculation.get('type', None)
+        method = calculation.get('method', None)
+        options = calculation.get('options', None) or {}
+        self.expression = options.get('expression', None)
+        if method != 'python' or not self.expression:
+            raise ConversionValueError(
+                'Unsupported calculation method. Calculation:',
+                '{}, method: {}'.format(self.id, method),
+            )
+        try:
+            self.code = compile(
+                self.expression,
+                '<calculation {}>'.format(self.id),
+                'eval',
+            )
+        except SyntaxError as exc:
+            raise ConversionValueError(
+                'Invalid calculation expression. Calculation:',
+                '{}, error: {}'.format(self.id, exc),
+            )
+        self.convert = TYPE_CONVERSIONS.get(self.type, None)
+
+    def __repr__(self):
+        return '{}({!r})'.format(self.__class__.__name__, self.id)
+
+
+class CalculationError(object):
+    """
+    A calculation that failed on a record. `index` is the position of the
+    record in its batch.
+    """
+
+    __slots__ = ('index', 'calculation', 'error')
+
+    def __init__(self, index, calculation, error):
+        self.index = index
+        self.calculation = calculation
+        self.error = error
+
+    def __str__(self):
+        return 'Record {}, calculation {}: {}'.format(
+            self.index,
+            self.calculation,
+            repr(self.error),
+        )
+
+    def __repr__(self):
+        return '{}({!r}, {!r}, {!r})'.format(
+            self.__class__.__name__,
+            self.index,
+            self.calculation,
+            self.error,
+        )
+
+
+class CalculationResult(object):
+    """
+    Outcome of evaluating a batch of records.
+
+    `values` holds a dict of calculation results for each record, in the
+    order of the batch. A calculation that fails on a record has the value
+    None, and a CalculationError in `errors`. `timings` maps each
+    calculation to the wall time spent evaluating it over the batch, in
+    seconds, in evaluation order.
+    """
+
+    __slots__ = ('values', 'errors', 'timings')
+
+    def __init__(self, values, errors, timings):
+        self.values = values
+        self.errors = errors
+        self.timings = timings
+
+    def __repr__(self):
+        return '{}({} records, {} errors)'.format(
+            self.__class__.__name__,
+            len(self.values),
+            len(self.errors),
+        )
+
+
+class CalculationEngine(object):
+    """
+    Evaluates the calculations of a RIOS calculationset.
+
+    Usage:
+
+        package = redcap_to_rios(...)
+        engine = CalculationEngine(package)
+        result = engine.evaluate(records)
+        result.values[0]['bmi']
+
+    `calculationset` is a calculationset definition, or a package with a
+    ``calculationset`` key, as returned by the conversion API functions.
+    Expressions are compiled when the engine is created, and a
+    ConversionValueError is raised if one cannot be compiled, or if the
+    calculations refer to unknown or circular calculations.
+
+    The dependencies of the calculations are kept in ``graph``, a
+    DependencyGraph, which update() uses to recompute only the calculations
+    affected by a change.
+    """
+
+    def __init__(self, calculationset):
+        if 'calculationset' in calculationset:
+            calculationset = calculationset['calculationset']
+        calculations = collections.OrderedDict()
+        for calculation in (calculationset or {}).get('calculations', ()):
+            compiled = CompiledCalculation(calculation)
+            calculations[compiled.id] = compiled
+        self.calculations = calculations
+        self.graph = DependencyGraph(calculationset)
+        self.order = tuple(calculations[name] for name in self.graph.order)
+        self.namespace = {
+            'math': math,
+            'rios': rios,
+        }
+
+    def evaluate(self, records):
+        """
+        Evaluates every calculation on each of `records`, and returns a
+        CalculationResult. Records are dicts of field values or RIOS
+        assessment documents (see assessment_values()).
+        """
+
+        assessments = [assessment_values(record) for record in records]
+        values = [dict() for _ in assessments]
+        errors = []
+        timings = collections.OrderedDict()
+        namespace = dict(self.namespace)
+        timer = timeit.default_timer
+        for calculation in self.order:
+            identifier = calculation.id
+            code = calculation.code
+            convert = calculation.convert
+            start = timer()
+            for index, assessment in enumerate(assessments):
+                calculations = values[index]
+                namespace['assessment'] = assessment
+                namespace['calculations'] = calculations
+                try:
+                    value = eval(code, namespace)
+                    if convert is not None and value is not None:
+                        value = convert(value)
+                except Exception as exc:
+                    errors.append(CalculationError(index, identifier, exc))
+                    value = None
+                calculations[identifier] = value
+            timings[identifier] = timer() - start
+        return CalculationResult(values, errors, timings)
+
+    def evaluate_record(self, record):
+        """
+        Evaluates every calculation on `record`, and returns the dict of
+        calculation results. Raises a ConversionValueError with the first
+        error if a calculation fails.
+        """
+
+        result = self.evaluate([record])
+        if result.errors:
+            error = result.errors[0]
+            raise ConversionValueError(
+                'Calculation failed. Calculation:',
+                '{}, error: {!r}'.format(error.calculation, error.error),
+            )
+        return result.values[0]
+
+    def update(self, record, values, fields):
+        """
+        Recomputes the calculations of `record` which depend on `fields`,
+        after their answers changed. `values` is the dict of calculation
+        results of the record, as returned by evaluate_record(), and is
+        updated in place. Returns the names of the recomputed calculations,
+        in evaluation order. Raises a ConversionValueError if one fails.
+        """
+
+        names = self.graph.affected(tuple(fields))
+        if not names:
+            return names
+        namespace = dict(self.namespace)
+        namespace['assessment'] = assessment_values(record)
+        namespace['calculations'] = values
+        for name in names:
+            calculation = self.calculations[name]
+            try:
+                value = eval(calculation.code, namespace)
+                if calculation.convert is not None and value is not None:
+                    value = calculation.convert(value)
+            except Exception as exc:
+                raise ConversionValueError(
+                    'Calculation failed. Calculation:',
+                    '{}, error: {!r}'.format(name, exc),
+                )
+            values[name] = value
+        return names
@@ -0,0 +1,192 @@
+#
+# Copyright (c) 2016, Prometheus Research, LLC
+#
+# Calculation dependency graph.
+#
+# The python expressions written by the converters refer to assessment
+# fields as assessment["field"] and to other calculations as
+# calculations["name"]. The graph is built from these references: each
+# field maps to the calculations which read it, and each calculation to the
+# calculations it reads and the calculations which read it. The
+# calculations are put in topological order once, so the calculations
+# affected by a change can be listed in evaluation order without sorting
+# the whole graph again.
+
+
+import collections
+import re
+import six
+
+from rios.conversion.exception import ConversionValueError
+
+
+__all__ = (
+    'DependencyGraph',
+    'get_references',
+)
+
+
+# Find assessment reference: assessment["a"] or assessment['a']
+# \1 => quote, \2 => field
+RE_assessment_reference = re.compile(
+        r'''\bassessment\[\s*(["'])'''
+        r'''(.*?)'''
+        r'''\1\s*\]''')
+
+# Find calculation reference: calculations["c"] or calculations['c']
+# \1 => quote, \2 => calculation
+RE_calculation_reference = re.compile(
+        r'''\bcalculations\[\s*(["'])'''
+        r'''(.*?)'''
+        r'''\1\s*\]''')
+
+
+def _unique(matches):
+    return tuple(collections.OrderedDict(
+        (match.group(2), None) for match in matches
+    ))
+
+
+def get_references(expression):
+    """
+    Returns the fields and the calculations a calculation expression refers
+    to, as two tuples of names in order of first reference.
+    """
+
+    return (
+        _unique(RE_assessment_reference.finditer(expression)),
+        _unique(RE_calculation_reference.finditer(expression)),
+    )
+
+
+class DependencyGraph(object):
+    """
+    Dependency graph of the calculations of a calculationset.
+
+    `calculationset` is a calculationset definition, or a package with a
+    ``calculationset`` key, as returned by the conversion API functions.
+    Only calculations with a python ``expression`` have references.
+
+    Attributes:
+
+    - ``fields``: field => the calculations which refer to it
+    - ``calculations``: calculation => the calculations it refers to
+    - ``dependents``: calculation => the calculations which refer to it
+    - ``order``: the calculations in evaluation order, each after the
+      calculations it refers to, and otherwise in calculationset order
+
+    A ConversionValueError is raised if a calculation refers to an unknown
+    calculation, or if calculations refer to each other in a cycle.
+    """
+
+    def __init__(self, calculationset):
+        if 'calculationset' in calculationset:
+            calculationset = calculationset['calculationset']
+        fields = collections.OrderedDict()
+        calculations = collections.OrderedDict()
+        dependents = collections.OrderedDict()
+        for calculation in (calculationset or {}).get('calculations', ()):
+            name = calculation['id']
+            options = calculation.get('options', None) or {}
+            field_references, calculation_references = get_references(
+                options.get('expression', None) or ''
+            )
+            calculations[name] = calculation_references
+            dependents[name] = []
+            for field in field_references:
+                fields.setdefault(field, []).append(name)
+
+        for name, references in six.iteritems(calculations):
+            unknown = [
+                reference for reference in references
+                if reference not in calculations
+            ]
+            if unknown:
+                raise ConversionValueError(
+                    'Reference to an unknown calculation. Calculation:',
+                    '{}, references: {}'.format(name, ', '.join(unknown)),
+                )
+            for reference in references:
+                dependents[reference].append(name)
+
+        self.fields = collections.OrderedDict(
+            (field, tuple(names)) for field, names in six.iteritems(fields)
+        )
+        self.calculations = calculations
+        self.dependents = collections.OrderedDict(
+            (name, tuple(names)) for name, names in six.iteritems(dependents)
+        )
+        self.order = self.get_order(calculations)
+        self.positions = dict(
+            (name, position) for position, name in enumerate(self.order)
+        )
+        # Calculations affected by each field, computed on demand
+        self._affected = {}
+
+    @staticmethod
+    def get_order(calculations):
+        """
+        Returns the names of `calculations`, a dict of calculation => the
+        calculations it refers to, in topological order.
+        """
+
+        order = []
+        # Calculations: 0 => not visited, 1 => in progress, 2 => done
+        state = dict((name, 0) for name in calculations)
+        for root in calculations:
+            if state[root]:
+                continue
+            state[root] = 1
+            stack = [(root, iter(calculations[root]))]
+            while stack:
+                name, references = stack[-1]
+                for reference in references:
+                    if state[reference] == 1:
+                        raise ConversionValueError(
+                            'Circular calculation references. Calculation:',
+                            '{} => {}'.format(name, reference),
+                        )
+                    if not state[reference]:
+                        state[reference] = 1
+                        stack.append((
+                            reference,
+                            iter(calculations[reference]),
+                        ))
+                        break
+                else:
+                    stack.pop()
+                    state[name] = 2
+                    order.append(name)
+        return tuple(order)
+
+    def affected(self, fields=(), calculations=()):
+        """
+        Returns the calculations which must be recomputed when `fields`
+        change, or when `calculations` change or are recomputed: the
+        calculations which refer to them, directly or through other
+        calculations, and `calculations` themselves. They are returned in
+        evaluation order.
+        """
+
+        if len(fields) == 1 and not calculations:
+            field = fields[0]
+            answer = self._affected.get(field)
+            if answer is None:
+                answer = self._affected[field] = self._closure(
+                    self.fields.get(field, ())
+                )
+            return answer
+        roots = list(calculations)
+        for field in fields:
+            roots.extend(self.fields.get(field, ()))
+        return self._closure(roots)
+
+    def _closure(self, roots):
+        seen = set(roots)
+        stack = list(roots)
+        while stack:
+            for dependent in self.dependents[stack.pop()]:
+                if dependent not in seen:
+                    seen.add(dependent)
+                    stack.append(dependent)
+        return tuple(sorted(seen, key=self.positions.__getitem__))
@@ -0,0 +1,431 @@
+#
+# Copyright (c) 2016, Prometheus Research, LLC
+#
+# Field visibility evaluator.
+#
+# The branching logic of a REDCap field is converted into a RIOS form event
+# which disables the field when its trigger, !(branching logic), is true.
+# The evaluator compiles the triggers of a form once, from the REDCap
+# syntax tree of each trigger (see rios.conversion.redcap.expression), into
+# functions of NumPy arrays. A batch of records is then evaluated one
+# trigger at a time over every record, giving a record x field matrix of
+# visibility.
+#
+# Values are compared as REDCap does: as numbers if both sides are numbers,
+# and as text otherwise, so "1" = 1 is true. A blank value is neither a
+# number nor equal to anything but a blank value.
+#
+# Requires NumPy, which is an optional dependency: pip install
+# rios.conversion[numpy]
+
+
+import collections
+import warnings
+
+import numpy
+import six
+
+from rios.conversion.exception import ConversionValueError
+from rios.conversion.redcap import expression, vectorized
+from rios.conversion.engine.calculation import assessment_values
+
+
+__all__ = (
+    'VisibilityEvaluator',
+    'VisibilityMatrix',
+)
+
+
+# Event actions which hide their targets while their trigger is true
+HIDING_ACTIONS = ('disable', 'hide')
+
+
+class _Value(object):
+    """
+    The values of an expression for a batch of records: `number` holds the
+    numbers, with NaN for values that are not numbers, and `text` holds the
+    values as text, or is None for computed numbers. Either may be a single
+    value for every record.
+    """
+
+    __slots__ = ('number', 'text')
+
+    def __init__(self, number, text=None):
+        self.number = number
+        self.text = text
+
+    @property
+    def blank(self):
+        if self.text is None:
+            return numpy.isnan(self.number)
+        return self.text == u''
+
+    @property
+    def truth(self):
+        if self.text is None:
+            return ~numpy.isnan(self.number) & (self.number != 0)
+        return numpy.where(
+            numpy.isnan(self.number),
+            self.text != u'',
+            self.number != 0,
+        )
+
+
+def _number(value):
+    if isinstance(value, bool):
+        return float(value)
+    if value is None or isinstance(value, (list, tuple, set, dict)):
+        return numpy.nan
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        return numpy.nan
+
+
+def _text(value):
+    if value is None or isinstance(value, (list, tuple, set, dict)):
+        return u''
+    if isinstance(value, bool):
+        return u'1' if value else u'0'
+    return six.text_type(value)
+
+
+def _constant(text):
+    return _Value(
+        numpy.float64(_number(text)),
+        numpy.array(six.text_type(text)),
+    )
+
+
+def _equal(left, right):
+    numeric = ~(numpy.isnan(left.number) | numpy.isnan(right.number))
+    if left.text is not None and right.text is not None:
+        other = left.text == right.text
+    else:
+        other = left.blank & right.blank
+    with numpy.errstate(invalid='ignore'):
+        return numpy.where(numeric, left.number == right.number, other)
+
+
+def _compare(operator, left, right):
+    if operator == '=':
+        result = _equal(left, right)
+    elif operator == '<>':
+        result = ~_equal(left, right)
+    else:
+        with numpy.errstate(invalid='ignore'):
+            if operator == '<':
+                result = left.number < right.number
+            elif operator == '<=':
+                result = left.number <= right.number
+            elif operator == '>':
+                result = left.number > right.number
+            else:
+                result = left.number >= right.number
+    return _Value(numpy.asarray(result, dtype=float))
+
+
+def _arithmetic(operator, left, right):
+    with numpy.errstate(invalid='ignore', divide='ignore', over='ignore'):
+        if operator == '+':
+            return _Value(left.number + right.number)
+        if operator == '-':
+            return _Value(left.number - right.number)
+        if operator == '*':
+            return _Value(left.number * right.number)
+        if operator == '/':
+            return _Value(left.number / right.number)
+        return _Value(numpy.power(left.number, right.number))
+
+
+def _extreme(function):
+    def compute(*values):
+        with warnings.catch_warnings():
+            # All-NaN records warn, and give NaN as intended
+            warnings.simplefilter('ignore', RuntimeWarning)
+            return function(
+                numpy.vstack(numpy.broadcast_arrays(*[
+                    numpy.atleast_1d(value.number) for value in values
+                ])),
+                axis=0,
+            )
+    return compute
+
+
+def _numeric(function):
+    def compute(*values):
+        return function(*[value.number for value in values])
+    return compute
+
+
+def _datediff(date1, date2, units, date_fmt=None):
+    return vectorized.datediff(
+        numpy.atleast_1d(date1.text),
+        numpy.atleast_1d(date2.text),
+        six.text_type(units.text),
+        six.text_type(date_fmt.text) if date_fmt is not None else 'ymd',
+    )
+
+
+# dict: each item => REDCap function: function of _Value arguments,
+# returning numbers
+FUNCTIONS = {
+    'abs': _numeric(numpy.abs),
+    'datediff': _datediff,
+    'max': _extreme(numpy.nanmax),
+    'mean': _numeric(vectorized.mean),
+    'median': _numeric(vectorized.median),
+    'min': _extreme(numpy.nanmin),
+    'round': _numeric(vectorized.round_),
+    'rounddown': _numeric(vectorized.rounddown),
+    'roundup': _numeric(vectorized.roundup),
+    'sqrt': _numeric(numpy.sqrt),
+    'stdev': _numeric(vectorized.stdev),
+    'sum': _numeric(vectorized.sum_),
+}
+
+
+class _Columns(object):
+    """ The values of the fields of a batch of records, built on demand """
+
+    def __init__(self, records):
+        self.records = records
+        self.fields = {}
+        self.checkboxes = {}
+
+    def field(self, name):
+        value = self.fields.get(name)
+        if value is None:
+            # Each distinct value is converted once. Unhashable values,
+            # such as lists, are blank.
+            distinct = {None: 0}
+            items = [None]
+            positions = []
+            for record in self.records:
+                item = record.get(name, None)
+                try:
+                    position = distinct[item]
+                except KeyError:
+                    position = distinct[item] = len(items)
+                    items.append(item)
+                except TypeError:
+                    position = 0
+                positions.append(position)
+            positions = numpy.array(positions, dtype=int)
+            value = _Value(
+                numpy.array([_number(entry) for entry in items],
+                            dtype=float)[positions],
+                numpy.array([_text(entry) for entry in items],
+                            dtype=object).astype(six.text_type)[positions],
+            )
+            self.fields[name] = value
+        return value
+
+    def checkbox(self, name, code):
+        value = self.checkboxes.get((name, code))
+        if value is None:
+            checked = numpy.array([
+                code in item if isinstance(item, (list, tuple, set)) else
+                _text(item) == code
+                for item in (record.get(name, None) for record in self.records)
+            ], dtype=float)
+            value = _Value(checked, numpy.where(checked, u'1', u'0'))
+            self.checkboxes[(name, code)] = value
+        return value
+
+
+def _compile(node, text):
+    """
+    Returns a function of a _Columns object which evaluates the syntax tree
+    `node` of the expression `text`, as a _Value.
+    """
+
+    kind = node[0]
+    if kind in ('number', 'string'):
+        value = _constant(node[1][1:-1] if kind == 'string' else node[1])
+        return lambda columns: value
+    if kind in ('field', 'event'):
+        name, code = node[-2], node[-1]
+        if code is None:
+            return lambda columns: columns.field(name)
+        return lambda columns: columns.checkbox(name, code)
+    if kind == 'group':
+        return _compile(node[1], text)
+    if kind == 'unary':
+        operand = _compile(node[2], text)
+        if node[1] == 'not':
+            return lambda columns: _Value(
+                (~operand(columns).truth).astype(float)
+            )
+        if node[1] == '-':
+            return lambda columns: _Value(-operand(columns).number)
+        return lambda columns: _Value(operand(columns).number)
+    if kind == 'call':
+        name = node[1].lower()
+        arguments = [_compile(argument, text) for argument in node[2]]
+        if name == 'if' and len(arguments) == 3:
+            condition, true, false = arguments
+
+            def conditional(columns):
+                test = condition(columns).truth
+                left, right = true(columns), false(columns)
+                return _Value(
+                    numpy.where(test, left.number, right.number),
+                    (numpy.where(test, left.text, right.text)
+                     if left.text is not None and right.text is not None
+                     else None),
+                )
+            return conditional
+        function = FUNCTIONS.get(name)
+        if function is None:
+            raise ConversionValueError(
+                'Unsupported function in expression: {}. Got:'.format(name),
+                text,
+            )
+        return lambda columns: _Value(numpy.asarray(
+            function(*[argument(columns) for argument in arguments]),
+            dtype=float,
+        ))
+    if kind == 'chain':
+        items = node[1]
+        operands = [_compile(item, text) for item in items[0::2]]
+        operators = items[1::2]
+
+        def chain(columns):
+            value = operands[0](columns)
+            for operator, operand in zip(operators, operands[1:]):
+                other = operand(columns)
+                if operator == 'and':
+                    value = _Value((value.truth & other.truth).astype(float))
+                elif operator == 'or':
+                    value = _Value((value.truth | other.truth).astype(float))
+                elif operator in ('=', '<>', '<', '<=', '>', '>='):
+                    value = _compare(operator, value, other)
+                else:
+                    value = _arithmetic(operator, value, other)
+            return value
+        return chain
+    raise ConversionValueError(
+        'Unsupported "{}" in expression. Got:'.format(node[1]),
+        text,
+    )
+
+
+def compile_trigger(trigger):
+    """
+    Returns a function of a _Columns object which evaluates the REXL
+    `trigger` of a converted form, as a boolean array. The trigger is
+    translated back to REDCap syntax and parsed once.
+    """
+
+    evaluate = _compile(
+        expression.parse(expression.to_redcap(trigger)),
+        trigger,
+    )
+    return lambda columns: evaluate(columns).truth
+
+
+class VisibilityMatrix(object):
+    """
+    The visibility of the fields of a form for a batch of records.
+
+    `fields` lists the fields of the form in order, and `visible` is a
+    boolean array with a row for each record and a column for each field.
+    """
+
+    __slots__ = ('fields', 'visible', '_columns')
+
+    def __init__(self, fields, visible):
+        self.fields = fields
+        self.visible = visible
+        self._columns = dict(
+            (field, index) for index, field in enumerate(fields)
+        )
+
+    def column(self, field):
+        """ Returns the visibility of `field` for each record """
+
+        return self.visible[:, self._columns[field]]
+
+    def counts(self):
+        """ Returns the number of records each field is visible for """
+
+        return collections.OrderedDict(
+            zip(self.fields, self.visible.sum(axis=0).tolist())
+        )
+
+    def __repr__(self):
+        return '{}({} records, {} fields)'.format(
+            self.__class__.__name__,
+            self.visible.shape[0],
+            self.visible.shape[1],
+        )
+
+
+class VisibilityEvaluator(object):
+    """
+    Computes which fields of a form are shown for each record of a batch.
+
+    Usage:
+
+        package = redcap_to_rios(...)
+        evaluator = VisibilityEvaluator(package)
+        matrix = evaluator.evaluate(records)
+        matrix.column('given_birth')
+
+    `form` is a form definition, or a package with a ``form`` key, as
+    returned by the conversion API functions. A field is hidden while the
+    trigger of any of its ``disable`` or ``hide`` events is true. Events
+    with ``targets`` apply to their targets, and other events to their own
+    question. Triggers are compiled when the evaluator is created, and a
+    ConversionValueError is raised if one cannot be compiled.
+    """
+
+    def __init__(self, form):
+        if 'form' in form:
+            form = form['form']
+        fields = []
+        events = []
+        for page in form.get('pages', ()):
+            for element in page.get('elements', ()):
+                options = element.get('options', None) or {}
+                field = options.get('fieldId', None)
+                if field is not None:
+                    fields.append(field)
+                for event in options.get('events', None) or ():
+                    if event.get('action') in HIDING_ACTIONS:
+                        events.append((
+                            event['trigger'],
+                            event.get('targets', None) or [field],
+                        ))
+        self.fields = tuple(fields)
+        indexes = dict((field, index) for index, field in enumerate(fields))
+        # Compiled triggers, each with the columns of the fields it hides
+        self.triggers = []
+        compiled = {}
+        for trigger, targets in events:
+            columns = [indexes[target] for target in targets
+                       if target in indexes]
+            if not columns:
+                continue
+            if trigger not in compiled:
+                compiled[trigger] = compile_trigger(trigger)
+            self.triggers.append((compiled[trigger], columns))
+
+    def evaluate(self, records):
+        """
+        Returns the VisibilityMatrix of `records`, which are dicts of field
+        values or RIOS assessment documents. Checkbox fields hold the list
+        of checked codes. Calculation results may be added to the records
+        to evaluate triggers which refer to calculations.
+        """
+
+        records = [assessment_values(record) for record in records]
+        visible = numpy.ones((len(records), len(self.fields)), dtype=bool)
+        columns = _Columns(records)
+        size = (len(records),)
+        for trigger, indexes in self.triggers:
+            hidden = numpy.broadcast_to(trigger(columns), size)
+            for index in indexes:
+                visible[:, index] &= ~hidden
+        return VisibilityMatrix(self.fields, visible)
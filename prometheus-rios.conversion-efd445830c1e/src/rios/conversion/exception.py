@@ -71,6 +71,16 @@ class Error(Exception):
         paragraph = Paragraph(message, payload)
         self.paragraphs = [paragraph]
 
+    def __reduce__(self):
+        # Keep the whole context trace when errors cross process boundaries
+        # (e.g., when raised inside a multiprocessing worker).
+        first = self.paragraphs[0]
+        return (
+            self.__class__,
+            (first.message, first.payload),
+            {'paragraphs': self.paragraphs},
+        )
+
     def wrap(self, message, payload=None):
         """
         Adds a paragraph to the context trace.
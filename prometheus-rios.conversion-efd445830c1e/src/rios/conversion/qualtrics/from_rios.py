@@ -3,7 +3,8 @@
 #
 
 
-from rios.core.validation.instrument import get_full_type_definition
+import six
+
 from rios.conversion.base import FromRios
 from rios.conversion.exception import (
     ConversionValueError,
@@ -26,53 +27,106 @@ class QuestionNumber:
         return self.number
 
 
+def encode_line(line):
+    """ Returns `line` encoded as UTF-8 on Python 2, where files take bytes """
+
+    if six.PY2 and isinstance(line, six.text_type):
+        return line.encode('utf-8')
+    return line
+
+
+class LineWriter(object):
+    """
+    Passes the lines appended to it to `write`, leaving out the page breaks
+    before the first line and the blank lines after the last one. Blank
+    lines are only counted until a line follows them, so the lines are
+    trimmed without being kept.
+    """
+
+    def __init__(self, write):
+        self.write = write
+        self.count = 0
+        self.blanks = 0
+
+    def append(self, line):
+        if not self.count and line == '[[PageBreak]]':
+            return
+        if line == '':
+            self.blanks += 1
+            return
+        for _ in range(self.blanks):
+            self.write('')
+        self.write(line)
+        self.count += self.blanks + 1
+        self.blanks = 0
+
+    def close(self):
+        """ Drops the trailing blank lines """
+
+        self.blanks = 0
+
+    def __len__(self):
+        return self.count
+
+
 class QualtricsFromRios(FromRios):
     """
     Converts RIOS instrument and form definitions into a Qualtrics data
     dictionary.
     """
 
+    def __init__(self, *args, **kwargs):
+        """
+        Accepts the FromRios arguments, and `stream`. If `stream` is given,
+        the Qualtrics data dictionary is written to it, line by line as the
+        form is processed, instead of being kept in the ``instrument`` of the
+        package, which is then empty. On Python 2, the lines are written as
+        UTF-8.
+        """
+
+        self.stream = kwargs.pop('stream', None)
+        super(QualtricsFromRios, self).__init__(*args, **kwargs)
+
     def __call__(self):
-        self.lines = []
+        if self.stream is not None:
+            write = self.stream.write
+            self.lines = LineWriter(
+                lambda line: write(encode_line(line) + '\n')
+            )
+        else:
+            self.lines = LineWriter(self._definition.append)
         self.question_number = QuestionNumber()
-        for page in self._form['pages']:
-            try:
-                self.page_processor(page)
-            except Exception as exc:
-                if isinstance(exc, ConversionValueError):
-                    # Don't need to specify what's being skipped here, because
-                    # deeper level exceptions access that data.
-                    self.logger.warning(str(exc))
-                elif isinstance(exc, QualtricsFormatError):
-                    error = Error(
-                        "RIOS data dictionary conversion failure:",
-                        "Unable to parse the data dictionary"
-                    )
-                    self.logger.error(str(error))
-                    raise error
-                else:
-                    error = Error(
-                        "An unknown or unexpected error occured:",
-                        repr(exc)
-                    )
-                    error.wrap(
-                        "RIOS data dictionary conversion failure:",
-                        "Unable to parse the data dictionary"
-                    )
-                    self.logger.error(str(error))
-                    raise error
-
-        # Skip the first line ([[PageBreak]]) and the last 2 lines (blank)
-        def rmv_extra_strings(lst):
-            if len(lst) > 0:
-                if lst[0] == '[[PageBreak]]':
-                    rmv_extra_strings(lst[1:])
-                elif lst[-1] == "":
-                    rmv_extra_strings(lst[:-1])
-            return lst[:]
+        with self.metrics.phase('process'):
+            for page in self._form['pages']:
+                try:
+                    self.page_processor(page)
+                except Exception as exc:
+                    if isinstance(exc, ConversionValueError):
+                        # Don't need to specify what's being skipped here,
+                        # because deeper level exceptions access that data.
+                        self.logger.warning(str(exc))
+                    elif isinstance(exc, QualtricsFormatError):
+                        error = Error(
+                            "RIOS data dictionary conversion failure:",
+                            "Unable to parse the data dictionary"
+                        )
+                        self.logger.error(str(error))
+                        raise error
+                    else:
+                        error = Error(
+                            "An unknown or unexpected error occured:",
+                            repr(exc)
+                        )
+                        error.wrap(
+                            "RIOS data dictionary conversion failure:",
+                            "Unable to parse the data dictionary"
+                        )
+                        self.logger.error(str(error))
+                        raise error
 
-        for line in rmv_extra_strings(self.lines):
-            self._definition.append(line)
+        with self.metrics.phase('serialize'):
+            self.lines.close()
+        self.metrics.set('rows', len(self.lines))
 
     def page_processor(self, page):
         # Start the page
@@ -121,12 +175,7 @@ class QualtricsFromRios(FromRios):
 
     def question_processor(self, question_options):
         field_id = question_options['fieldId']
-        field = self.fields[field_id]
-        type_object = get_full_type_definition(
-            self._instrument,
-            field['type']
-        )
-        base = type_object['base']
+        base = self.get_type(field_id)['base']
         if base not in ('enumeration', 'enumerationSet',):
             error = ConversionValueError(
                 "Invalid question type:",
@@ -137,7 +186,10 @@ class QualtricsFromRios(FromRios):
         self.lines.append(
             '%d. %s' % (
                 self.question_number.next(),
-                self.get_local_text(question_options['text']),
+                self.get_local_text(
+                    self.localization,
+                    question_options['text'],
+                ),
             )
         )
         if base == 'enumerationSet':
@@ -146,7 +198,7 @@ class QualtricsFromRios(FromRios):
         self.lines.append('')
         for enumeration in question_options['enumerations']:
             self.lines.append(
-                self.get_local_text(enumeration['text'])
+                self.get_local_text(self.localization, enumeration['text'])
             )
         # Two blank lines between questions
         self.lines.append('')
@@ -4,11 +4,14 @@
 
 
 import collections
+import re
 import six
+import sys
 
 
 from rios.conversion.base import ToRios, localized_string_object, structures
-from rios.conversion.utils import JsonReader
+from rios.conversion.utils import JsonReader, JsonStream
+from rios.conversion.utils.backends import load_json
 from rios.conversion.exception import (
     Error,
     ConversionValueError,
@@ -18,9 +21,98 @@ from rios.conversion.exception import (
 
 __all__ = (
     'QualtricsToRios',
+    'read_survey',
 )
 
 
+# Kinds of survey elements used by the converter: blocks and questions
+SURVEY_ELEMENTS = ('BL', 'SQ')
+
+# Find the kind of a survey element: "Element": "kind"
+# \1 => kind
+RE_ELEMENT_KIND = re.compile(r'"Element"\s*:\s*"([^"\\]*)"')
+
+# Characters of a survey element searched for its kind
+KIND_LOOKAHEAD = 1024
+
+
+def element_kind(text):
+    """
+    Returns the ``Element`` of the survey element whose JSON text starts
+    `text`, if it can be told without decoding the element: when the key
+    comes before any nested or closing bracket. Returns None otherwise.
+    """
+
+    brackets = [
+        position
+        for position in (text.find(bracket, 1) for bracket in '{[}')
+        if position >= 0
+    ]
+    match = RE_ELEMENT_KIND.search(
+        text,
+        0,
+        min(brackets) if brackets else len(text),
+    )
+    return match.group(1) if match is not None else None
+
+
+def read_elements(document, kinds):
+    """
+    Yields the items of the ``SurveyElements`` array at the position of
+    `document`, a JsonStream, whose ``Element`` is one of `kinds`, or is
+    missing. Elements of other kinds are skipped without being decoded when
+    their kind can be told from their first members (see element_kind()).
+    """
+
+    for _ in document.items():
+        kind = element_kind(document.ahead(KIND_LOOKAHEAD))
+        if kind is not None and kind not in kinds:
+            document.skip()
+            continue
+        element = document.value()
+        if isinstance(element, dict):
+            kind = element.get('Element', None)
+            if kind and kind not in kinds:
+                continue
+        yield element
+
+
+def read_survey(stream, kinds=SURVEY_ELEMENTS):
+    """
+    Reads a Qualtrics *.qsf document from `stream`, a filename or a
+    file-like object, incrementally. Returns a dict with its
+    ``SurveyEntry`` and the ``SurveyElements`` of the `kinds` (see
+    read_elements()). Flows, quotas, graphics, translations and the other
+    elements are skipped as they are read, so memory is bounded by the
+    elements kept rather than by the whole file.
+
+    A malformed document raises the ValueError of the JSON decoder, as
+    reading the whole file would, when `stream` can be read again.
+    """
+
+    document = JsonStream(stream)
+    survey = {}
+    try:
+        for key in document.members():
+            if key == 'SurveyElements':
+                survey[key] = list(read_elements(document, kinds))
+            elif key == 'SurveyEntry':
+                survey[key] = document.value()
+            else:
+                document.skip()
+        document.close()
+    except ValueError:
+        error = sys.exc_info()
+        if isinstance(stream, six.string_types):
+            with open(stream, 'rU') as stream:
+                load_json(stream)
+        elif hasattr(stream, 'seek'):
+            stream.seek(0)
+            load_json(stream)
+        six.reraise(*error)
+    return survey
+
+
 class PageName(object):
     """ Provides easy naming for pages """
 
@@ -98,17 +190,32 @@ class JsonReaderMainProcessor(JsonReader):
 class QualtricsToRios(ToRios):
     """ Converts a Qualtrics *.qsf file to the RIOS specification format """
 
-    def __init__(self, filemetadata=False, *args, **kwargs):
+    def __init__(self, filemetadata=False, document=None, *args, **kwargs):
+        """
+        Accepts the ToRios arguments, and `document`, the QSF document of
+        `stream` (see read_survey()) if the caller has already read it, for
+        example to get the survey metadata. The stream is then not read
+        again.
+        """
+
         super(QualtricsToRios, self).__init__(*args, **kwargs)
         self.page_name = PageName()
+        self.document = document
 
     def __call__(self):
         """ Process the qsf input, and create output files """
 
         # Preprocessing
         try:
-            self.reader = JsonReaderMainProcessor(self.stream)
-            self.reader.process()
+            with self.metrics.phase('read'):
+                document = self.document
+                if document is None:
+                    document = read_survey(self.stream)
+                self.reader = JsonReaderMainProcessor(self.stream, document)
+                self.reader.process()
+                # Only the questions and block elements are used, so the
+                # rest of the document, such as graphics, can be released
+                self.reader.reader = self.document = None
         except Exception as exc:
             error = Error(
                 "Unable to parse Qualtrics data dictionary:",
@@ -120,111 +227,114 @@ class QualtricsToRios(ToRios):
             )
             self.logger.error(str(error))
             raise error
-
-        # Initialize processor
-        process = Processor(self.reader, self.localization)
-
-        # MAIN PROCESSING
-        # Occures in two steps:
-        #   1) Process data and page names into containers
-        #   2) Iterate over containers to construct RIOS definitions
-        # NOTE:
-        #   1) Each CSV row is an ordered dict (see CsvReader in utils/)
-        #   2) Start=2, because spread sheet programs set header row to 1
-        #       and first data row to 2 (for user friendly errors)
-        question_data = self.reader.data['questions']
-
-        page_question_map = collections.OrderedDict()
-        page_names = set()
-
-        page_name = self.page_name.next()
-        page_names.add(page_name)
-        for form_element in self.reader.data['block_elements']:
-            element_type = form_element.get('Type', None)
-            if element_type == 'Page Break':
-                page_name = self.page_name.next()
-                page_names.add(page_name)
-            elif element_type == 'Question':
-                question_id = form_element.get('QuestionID', None)
-                if question_id is None:
-                    error = QualtricsFormatError(
-                        "Block element QuestionID value not found in:",
-                        str(form_element)
-                    )
-                    self.logger.error(str(error))
-                    raise error
-                elif question_id not in question_data:
+        self.metrics.set('rows', len(self.reader.data['questions']))
+
+        with self.metrics.phase('process'):
+            # Initialize processor
+            process = Processor(self.reader, self.localization)
+
+            # MAIN PROCESSING
+            # Occures in two steps:
+            #   1) Process data and page names into containers
+            #   2) Iterate over containers to construct RIOS definitions
+            # NOTE:
+            #   1) Each CSV row is an ordered dict (see CsvReader in utils/)
+            #   2) Start=2, because spread sheet programs set header row to 1
+            #       and first data row to 2 (for user friendly errors)
+            question_data = self.reader.data['questions']
+
+            page_question_map = collections.OrderedDict()
+            page_names = set()
+
+            page_name = self.page_name.next()
+            page_names.add(page_name)
+            for form_element in self.reader.data['block_elements']:
+                element_type = form_element.get('Type', None)
+                if element_type == 'Page Break':
+                    page_name = self.page_name.next()
+                    page_names.add(page_name)
+                elif element_type == 'Question':
+                    question_id = form_element.get('QuestionID', None)
+                    if question_id is None:
+                        error = QualtricsFormatError(
+                            "Block element QuestionID value not found in:",
+                            str(form_element)
+                        )
+                        self.logger.error(str(error))
+                        raise error
+                    elif question_id not in question_data:
+                        error = QualtricsFormatError(
+                            "QuestionID value not found in question data."
+                            " Got ID:",
+                            str(question_id)
+                        )
+                        self.logger.error(str(error))
+                        raise error
+                    elif page_name not in page_question_map:
+                        page_question_map[page_name] = {
+                            question_id: question_data[question_id],
+                        }
+                    else:
+                        page_question_map[page_name].update(
+                            {question_id: question_data[question_id]}
+                        )
+                else:
                     error = QualtricsFormatError(
-                        "QuestionID value not found in question data. Got ID:",
-                        str(question_id)
+                        "Invalid type for block element. Expected types:",
+                        "\"Page Break\" or \"Question\""
                     )
+                    if element_type:
+                        error.wrap("But got invalid type value:",
+                                   str(element_type))
+                    else:
+                        error.wrap("Missing type value")
                     self.logger.error(str(error))
                     raise error
-                elif page_name not in page_question_map:
-                    page_question_map[page_name] = {
-                        question_id: question_data[question_id],
-                    }
-                else:
-                    page_question_map[page_name].update(
-                        {question_id: question_data[question_id]}
-                    )
-            else:
-                error = QualtricsFormatError(
-                    "Invalid type for block element. Expected types:",
-                    "\"Page Break\" or \"Question\""
-                )
-                if element_type:
-                    error.wrap("But got invalid type value:",
-                               str(element_type))
-                else:
-                    error.wrap("Missing type value")
-                self.logger.error(str(error))
-                raise error
 
-        for page_name in page_names:
-            self.page_container.update(
-                {page_name: structures.PageObject(id=page_name), }
-            )
+            for page_name in page_names:
+                self.page_container.update(
+                    {page_name: structures.PageObject(id=page_name), }
+                )
 
-        for page_name, page in six.iteritems(self.page_container):
-            mapping_data = page_question_map[page_name]
-            for question_id, question_data in six.iteritems(mapping_data):
-                try:
-                    # WHERE THE MAGIC HAPPENS
-                    fields = process(page, question_data)
-
-                    # Clear processor's internal storage for next question
-                    process.clear_storage()
-
-                    for field in fields:
-                        self.field_container.append(field)
-
-                except Exception as exc:
-                    if isinstance(exc, ConversionValueError):
-                        error = Error(
-                            "Skipping question: " + str(question_id)
-                            + ". Error:",
-                            str(exc)
-                        )
-                        self.logger.warning(str(error))
-                    else:
-                        error = Error(
-                            "An unknown error occured:",
-                            repr(exc)
-                        )
-                        error.wrap(
-                            "REDCap data dictionary conversion failure:",
-                            "Unable to parse REDCap data dictionary CSV"
-                        )
-                        self.logger.error(str(error))
-                        raise exc
-
-        # Construct insrument objects
-        for field in self.field_container:
-            self._instrument.add_field(field)
-        # Page container is a dict instead of a list, so iterate over vals
-        for page in six.itervalues(self.page_container):
-            self._form.add_page(page)
+            for page_name, page in six.iteritems(self.page_container):
+                mapping_data = page_question_map[page_name]
+                for question_id, question_data in six.iteritems(mapping_data):
+                    try:
+                        # WHERE THE MAGIC HAPPENS
+                        fields = process(page, question_data)
+
+                        # Clear processor's internal storage for next question
+                        process.clear_storage()
+
+                        for field in fields:
+                            self.field_container.append(field)
+
+                    except Exception as exc:
+                        if isinstance(exc, ConversionValueError):
+                            error = Error(
+                                "Skipping question: " + str(question_id)
+                                + ". Error:",
+                                str(exc)
+                            )
+                            self.logger.warning(str(error))
+                        else:
+                            error = Error(
+                                "An unknown error occured:",
+                                repr(exc)
+                            )
+                            error.wrap(
+                                "REDCap data dictionary conversion failure:",
+                                "Unable to parse REDCap data dictionary CSV"
+                            )
+                            self.logger.error(str(error))
+                            raise exc
+
+            # Construct insrument objects
+            for field in self.field_container:
+                self._instrument.add_field(field)
+            # Page container is a dict instead of a list, so iterate over vals
+            for page in six.itervalues(self.page_container):
+                self._form.add_page(page)
 
         # Post-processing/validation
         self.validate()
@@ -0,0 +1,632 @@
+#
+# Copyright (c) 2016, Prometheus Research, LLC
+#
+# REDCap expression translator.
+#
+# REDCap calculations and branching logic are tokenized and parsed once into
+# a small syntax tree of tuples, which is then written out as a Python
+# calculation expression or a REXL trigger in a single pass. Runs of
+# operators of the same precedence (e.g., a long sum of fields) are kept in
+# one flat node instead of a nested binary tree, so both the parser and the
+# writer take linear time in the length of the expression, and their
+# recursion depth only grows with the nesting of parentheses and function
+# calls.
+#
+# Nodes:
+#
+#   ('number', text)
+#   ('string', text)              text includes the quotes
+#   ('name', text)                a bare name, e.g. a constant
+#   ('field', name, code)         [name] or [name(code)]
+#   ('event', event, name, code)  [event][name] or [event][name(code)]
+#   ('call', name, [arguments])
+#   ('group', node)               a parenthesized expression
+#   ('unary', operator, node)
+#   ('chain', [node, operator, node, ...])
+#
+# Expressions the parser cannot read are translated by translate_text()
+# instead, which only rewrites what it recognizes and keeps the rest.
+#
+# to_redcap() translates the other way, from the Python and REXL written
+# here back to REDCap syntax. It rewrites the token stream in one pass,
+# keeping the text between tokens, so it accepts any expression, including
+# ones it does not fully understand.
+
+
+import re
+
+from rios.conversion.exception import ConversionValueError
+from rios.conversion.utils import balanced_match
+
+
+__all__ = (
+    'FUNCTION_TO_PYTHON',
+    'FUNCTION_TO_REDCAP',
+    'parse',
+    'to_python',
+    'to_redcap',
+    'to_rexl',
+    'tokenize',
+    'translate_text',
+)
+
+
+# dict: each item => REDCap name: rios.conversion name
+FUNCTION_TO_PYTHON = {
+    'min': 'min',
+    'max': 'max',
+    'mean': 'rios.conversion.redcap.functions.mean',
+    'median': 'rios.conversion.redcap.functions.median',
+    'sum': 'rios.conversion.redcap.functions.sum_',
+    'stdev': 'rios.conversion.redcap.functions.stdev',
+    'round': 'rios.conversion.redcap.functions.round_',
+    'roundup': 'rios.conversion.redcap.functions.roundup',
+    'rounddown': 'rios.conversion.redcap.functions.rounddown',
+    'sqrt': 'math.sqrt',
+    'abs': 'abs',
+    'datediff': 'rios.conversion.redcap.functions.datediff',
+}
+
+# dict: each item => rios.conversion name: REDCap name
+FUNCTION_TO_REDCAP = {
+    python: redcap
+    for redcap, python in FUNCTION_TO_PYTHON.items()
+}
+
+# Tables of field references that are written as [field] in REDCap
+REFERENCE_TABLES = ('assessment', 'calculations')
+
+# Token kinds, matched in this order
+RE_token = re.compile(r'''
+    (?P<space>\s+)
+  | (?P<field>\[[^\[\]]*\])
+  | (?P<number>(?:\d+\.?\d*|\.\d+)(?:[eE][-+]?\d+)?)
+  | (?P<string>"[^"]*"|'[^']*')
+  | (?P<name>[A-Za-z_][\w.]*)
+  | (?P<operator><>|!=|<=|>=|==|&&|\|\||[-+*/^=<>(),!])
+''', re.VERBOSE)
+
+# Token kinds of Python and REXL expressions, matched in this order. Any
+# other character is an operator token, so every text can be tokenized.
+RE_rios_token = re.compile(r'''
+    (?P<space>\s+)
+  | (?P<string>"[^"]*"|'[^']*')
+  | (?P<number>(?:\d+\.?\d*|\.\d+)(?:[eE][-+]?\d+)?)
+  | (?P<subscript>\[\s*(?:"[^"]*"|'[^']*')\s*\])
+  | (?P<name>[A-Za-z_][\w.]*)
+  | (?P<operator>==|!=|<=|>=|<>|.)
+''', re.VERBOSE | re.DOTALL)
+
+# dict: each item => Python or REXL operator: REDCap operator
+OPERATOR_TO_REDCAP = {
+    '!=': '<>',
+    '==': '=',
+}
+
+# Splits the inside of a field reference: \1 => name, \2 => checkbox code
+RE_field = re.compile(r'^\s*([^()\s]+)\s*(?:\(\s*([^()]*?)\s*\))?\s*$')
+
+# Operators of each binary precedence level, lowest first
+LEVELS = (
+    ('or', '||'),
+    ('and', '&&'),
+    None,  # unary not
+    ('=', '==', '<>', '!=', '<', '<=', '>', '>='),
+    ('+', '-'),
+    ('*', '/'),
+)
+
+# dict: each item => operator spelling: canonical operator
+OPERATORS = {
+    'or': 'or',
+    '||': 'or',
+    'and': 'and',
+    '&&': 'and',
+    '==': '=',
+    '!=': '<>',
+}
+
+# dict: each item => canonical operator: (Python, REXL)
+OUTPUT_OPERATORS = {
+    'or': ('or', 'or'),
+    'and': ('and', 'and'),
+    'not': ('not ', 'not '),
+    '=': ('==', '='),
+    '<>': ('!=', '!='),
+}
+
+
+def tokenize(text):
+    """
+    Returns the tokens of a REDCap expression, as a list of
+    ``(kind, text, position)`` tuples. Word operators (``and``, ``or``,
+    ``not``) are returned as operator tokens.
+    """
+
+    tokens = []
+    position = 0
+    length = len(text)
+    while position < length:
+        match = RE_token.match(text, position)
+        if not match:
+            raise ConversionValueError(
+                'Unable to read expression at position {}. Got:'.format(
+                    position,
+                ),
+                text,
+            )
+        kind = match.lastgroup
+        value = match.group(kind)
+        if kind == 'name' and value.lower() in ('and', 'or', 'not'):
+            kind, value = 'operator', value.lower()
+        if kind != 'space':
+            tokens.append((kind, value, position))
+        position = match.end()
+    return tokens
+
+
+def _field(token, text):
+    match = RE_field.match(token[1][1:-1])
+    if not match:
+        raise ConversionValueError(
+            'Invalid field reference at position {}. Got:'.format(token[2]),
+            text,
+        )
+    return match.groups()
+
+
+class _Parser(object):
+    """ Recursive descent parser of a token list """
+
+    def __init__(self, text):
+        self.text = text
+        self.tokens = tokenize(text)
+        self.position = 0
+
+    def error(self, message):
+        if self.position < len(self.tokens):
+            where = 'at position {}'.format(self.tokens[self.position][2])
+        else:
+            where = 'at the end'
+        return ConversionValueError(
+            '{} {}. Got:'.format(message, where),
+            self.text,
+        )
+
+    def peek(self):
+        if self.position < len(self.tokens):
+            return self.tokens[self.position]
+        return (None, None, None)
+
+    def take(self, value):
+        token = self.peek()
+        if token[0] != 'operator' or token[1] != value:
+            raise self.error('Expected "{}"'.format(value))
+        self.position += 1
+
+    def parse(self):
+        if not self.tokens:
+            raise self.error('Empty expression')
+        node = self.expression(0)
+        if self.position != len(self.tokens):
+            raise self.error('Unexpected "{}"'.format(self.peek()[1]))
+        return node
+
+    def expression(self, level):
+        if level == len(LEVELS):
+            return self.unary()
+        operators = LEVELS[level]
+        if operators is None:
+            token = self.peek()
+            if token[0] == 'operator' and token[1] in ('not', '!'):
+                self.position += 1
+                return ('unary', 'not', self.expression(level))
+            return self.expression(level + 1)
+        items = [self.expression(level + 1)]
+        while True:
+            token = self.peek()
+            if token[0] != 'operator' or token[1] not in operators:
+                break
+            self.position += 1
+            items.append(OPERATORS.get(token[1], token[1]))
+            items.append(self.expression(level + 1))
+        return items[0] if len(items) == 1 else ('chain', items)
+
+    def unary(self):
+        token = self.peek()
+        if token[0] == 'operator' and token[1] in ('-', '+'):
+            self.position += 1
+            return ('unary', token[1], self.unary())
+        return self.power()
+
+    def power(self):
+        items = [self.atom()]
+        while True:
+            token = self.peek()
+            if token[0] != 'operator' or token[1] != '^':
+                break
+            self.position += 1
+            items.append('^')
+            items.append(self.atom())
+        return items[0] if len(items) == 1 else ('chain', items)
+
+    def atom(self):
+        token = self.peek()
+        kind, value = token[0], token[1]
+        if kind is None:
+            raise self.error('Unexpected end of expression')
+        self.position += 1
+        if kind in ('number', 'string'):
+            return (kind, value)
+        if kind == 'field':
+            name, code = _field(token, self.text)
+            following = self.peek()
+            if following[0] == 'field':
+                # [event][field]
+                self.position += 1
+                field, code = _field(following, self.text)
+                return ('event', name, field, code)
+            return ('field', name, code)
+        if kind == 'name':
+            following = self.peek()
+            if following[0] == 'operator' and following[1] == '(':
+                self.position += 1
+                arguments = []
+                if self.peek()[1] != ')':
+                    arguments.append(self.expression(0))
+                    while self.peek()[1] == ',':
+                        self.position += 1
+                        arguments.append(self.expression(0))
+                self.take(')')
+                return ('call', value, arguments)
+            return ('name', value)
+        if kind == 'operator' and value == '(':
+            node = self.expression(0)
+            self.take(')')
+            return ('group', node)
+        self.position -= 1
+        raise self.error('Unexpected "{}"'.format(value))
+
+
+def parse(text):
+    """
+    Parses a REDCap calculation or branching logic expression, and returns
+    its syntax tree. Raises ConversionValueError if it is malformed.
+    """
+
+    return _Parser(text).parse()
+
+
+def _ungroup(node):
+    return node[1] if node[0] == 'group' else node
+
+
+def _reference(node, calculations):
+    """ Returns the table["name"] text of a field node, and its code """
+
+    if node[0] == 'field':
+        name, code = node[1], node[2]
+        table = 'calculations' if name in calculations else 'assessment'
+    else:
+        table, name, code = node[1], node[2], node[3]
+    return '%s["%s"]' % (table, name), code
+
+
+def _checkbox_test(items):
+    """
+    Returns the checkbox node of a comparison chain which compares a
+    checkbox with 1 or 0, e.g. [a(1)] = '1', and whether it tests that the
+    box is checked. Returns None for other chains.
+    """
+
+    if len(items) != 3 or items[1] not in ('=', '<>'):
+        return None
+    checkbox, value = _ungroup(items[0]), _ungroup(items[2])
+    if checkbox[0] in ('number', 'string'):
+        checkbox, value = value, checkbox
+    if checkbox[0] not in ('field', 'event') or checkbox[-1] is None:
+        return None
+    if value[0] == 'string':
+        value = value[1][1:-1].strip()
+    elif value[0] == 'number':
+        value = value[1]
+    else:
+        return None
+    if value not in ('0', '1'):
+        return None
+    return checkbox, (value == '1') == (items[1] == '=')
+
+
+def _write(node, target, calculations, get_name):
+    """
+    Returns the text of a syntax tree. `target` is 0 for Python and 1 for
+    REXL.
+    """
+
+    output = []
+    append = output.append
+    # Work list of nodes and literal text, in reverse order
+    stack = [node]
+    while stack:
+        node = stack.pop()
+        if not isinstance(node, tuple):
+            append(node)
+            continue
+        kind = node[0]
+        if kind in ('number', 'string', 'name'):
+            append(node[1])
+        elif kind in ('field', 'event'):
+            reference, code = _reference(node, calculations)
+            if code is None:
+                append(reference)
+            else:
+                # Checkbox: [name(code)] is true if the code is checked
+                append('("%s" in %s)' % (get_name(code), reference))
+        elif kind == 'call':
+            name, arguments = node[1], node[2]
+            if name.lower() == 'if' and len(arguments) == 3 and target == 0:
+                # if(condition, then, else)
+                stack.extend([
+                    ')', arguments[2], ' else ', arguments[0], ' if ',
+                    arguments[1],
+                ])
+                append('(')
+                continue
+            parts = [')']
+            for index in range(len(arguments) - 1, -1, -1):
+                parts.append(arguments[index])
+                if index:
+                    parts.append(', ')
+            stack.extend(parts)
+            append(FUNCTION_TO_PYTHON.get(name.lower(), name) + '(')
+        elif kind == 'group':
+            if node[1][0] == 'chain' and _checkbox_test(node[1][1]):
+                # Checkbox tests are written in parentheses already
+                stack.append(node[1])
+                continue
+            stack.append(')')
+            stack.append(node[1])
+            append('(')
+        elif kind == 'unary':
+            operator = node[1]
+            stack.append(node[2])
+            if operator == 'not':
+                append(OUTPUT_OPERATORS['not'][target])
+            else:
+                append(operator)
+        else:
+            items = node[1]
+            test = _checkbox_test(items)
+            if test is not None:
+                # [name(code)] = '1' is true if the code is checked, and
+                # [name(code)] = '0' if it is not
+                reference, code = _reference(test[0], calculations)
+                append('("%s" %s %s)' % (
+                    get_name(code),
+                    'in' if test[1] else 'not in',
+                    reference,
+                ))
+                continue
+            if items[1] == '^':
+                # a ^ b ^ c => math.pow(math.pow(a, b), c)
+                parts = []
+                for index in range(len(items) - 1, 0, -2):
+                    parts.append(')')
+                    parts.append(_ungroup(items[index]))
+                    parts.append(', ')
+                parts.append(_ungroup(items[0]))
+                stack.extend(parts)
+                append('math.pow(' * (len(items) // 2))
+                continue
+            parts = []
+            for index in range(len(items) - 1, 0, -2):
+                parts.append(items[index])
+                operator = items[index - 1]
+                if operator in OUTPUT_OPERATORS:
+                    operator = OUTPUT_OPERATORS[operator][target]
+                parts.append(' %s ' % operator)
+            parts.append(items[0])
+            stack.extend(parts)
+    return ''.join(output)
+
+
+def to_python(node, calculations=(), get_name=None):
+    """
+    Returns a syntax tree as a Python calculation expression.
+
+    Field references become ``calculations["name"]`` if the name is in
+    `calculations`, and ``assessment["name"]`` otherwise. A checkbox
+    ``[name(code)]`` becomes ``("code" in assessment["name"])``, and its
+    comparisons with 1 or 0 become ``in`` or ``not in`` tests. Checkbox
+    codes are converted with `get_name`, if given. REDCap functions are
+    replaced by their ``rios.conversion.redcap.functions`` counterparts,
+    ``^`` by ``math.pow()``, and ``if()`` by a conditional expression.
+    """
+
+    return _write(node, 0, calculations, get_name or _same)
+
+
+def to_rexl(node, calculations=(), get_name=None):
+    """
+    Returns a syntax tree as a REXL trigger expression. It is written as by
+    to_python(), except that ``=`` is kept for equality, and ``if()`` is
+    kept as a function call.
+    """
+
+    return _write(node, 1, calculations, get_name or _same)
+
+
+# Patterns of translate_text()
+
+# Find database reference: [table_name][field_name]
+# \1 => table_name, \2 => field_name
+RE_database_ref = re.compile(r'\[([\w_]+)\]\[([\w_]+)\]')
+
+# Find variable reference
+# \1 => variable name
+RE_variable_ref = re.compile(r'''\[([\w_]+)\]''')
+
+# dict of function name: pattern which finds "name("
+RE_funcs = dict(
+    (name, re.compile(r'\b%s\(' % name))
+    for name in FUNCTION_TO_PYTHON
+)
+
+
+def translate_text(text, calculations=()):
+    """
+    Translates a REDCap expression to Python without parsing it, as the
+    converter did before it had a parser, for expressions that parse()
+    rejects. Field references, function names, ``(a)^(b)`` and ``<>`` are
+    rewritten, and the rest of the text is kept as is.
+    """
+
+    s = RE_database_ref.sub(r'\1["\2"]', text)
+    s = RE_variable_ref.sub(
+        lambda match: '%s["%s"]' % (
+            'calculations' if match.group(1) in calculations
+            else 'assessment',
+            match.group(1),
+        ),
+        s,
+    )
+    for name, pattern in RE_funcs.items():
+        # The matched pattern includes the '('
+        s = pattern.sub('%s(' % FUNCTION_TO_PYTHON[name], s)
+    answer = ''
+    position = 0
+    carat_pos = s.find(')^(', position)
+    while carat_pos != -1:
+        begin, end = balanced_match(s, carat_pos)
+        answer += s[position:begin]
+        answer += 'math.pow(' + s[begin + 1:end - 1]
+        begin, end = balanced_match(s, carat_pos + 2)
+        answer += ', ' + s[begin + 1:end - 1] + ')'
+        position = end
+        carat_pos = s.find(')^(', position)
+    answer += s[position:]
+    return answer.replace('<>', '!=')
+
+
+def _same(name):
+    return name
+
+
+def _rios_tokens(text):
+    return [
+        (match.lastgroup, match.group(match.lastgroup))
+        for match in RE_rios_token.finditer(text)
+    ]
+
+
+def _next(tokens, index):
+    """ Returns the index of the first token from `index` that is not space """
+
+    while index < len(tokens) and tokens[index][0] == 'space':
+        index += 1
+    return index
+
+
+def to_redcap(text):
+    """
+    Translates a Python calculation or REXL trigger expression, as written
+    by to_python() and to_rexl(), back to REDCap syntax:
+
+    - ``assessment["a"]`` and ``calculations["a"]`` => ``[a]``
+    - ``table["a"]`` => ``[table][a]``
+    - ``("b" in assessment["a"])`` => ``([a(b)] = '1')``, and
+      ``("b" not in assessment["a"])`` => ``([a(b)] = '0')``
+    - ``(x if c else y)`` => ``if(c, x, y)``
+    - ``math.pow(a, b)`` => ``(a)^(b)``
+    - rios.conversion function names => REDCap function names
+    - ``!=`` => ``<>`` and ``==`` => ``=``
+
+    The rest of the text is kept as is. Takes linear time in the length of
+    the expression, times the nesting of its conditional expressions.
+    """
+
+    tokens = _rios_tokens(text)
+    output = []
+    append = output.append
+    # Open parentheses: the position of "(" in the output, and of the "if"
+    # and "else" of a conditional expression inside them
+    groups = []
+    # Depths of the open math.pow() calls, and whether their comma was seen
+    powers = []
+    index = 0
+    length = len(tokens)
+    while index < length:
+        kind, value = tokens[index]
+        index += 1
+        if kind == 'string':
+            # ("code" in table["field"]) or ("code" not in table["field"])
+            keyword = _next(tokens, index)
+            checked = True
+            if keyword < length and tokens[keyword] == ('name', 'not'):
+                keyword = _next(tokens, keyword + 1)
+                checked = False
+            table = _next(tokens, keyword + 1)
+            if (keyword < length and tokens[keyword] == ('name', 'in')
+                    and table + 1 < length
+                    and tokens[table][0] == 'name'
+                    and tokens[table + 1][0] == 'subscript'):
+                field = tokens[table + 1][1].strip('[] \t\n')[1:-1]
+                reference = '%s(%s)' % (field, value[1:-1])
+                if tokens[table][1] not in REFERENCE_TABLES:
+                    reference = '%s][%s' % (tokens[table][1], reference)
+                append("[%s] = '%s'" % (reference, '1' if checked else '0'))
+                index = table + 2
+                continue
+            append(value)
+        elif kind == 'name':
+            following = tokens[index] if index < length else (None, None)
+            if following[0] == 'subscript':
+                field = following[1].strip('[] \t\n')[1:-1]
+                if value in REFERENCE_TABLES:
+                    append('[%s]' % field)
+                else:
+                    append('[%s][%s]' % (value, field))
+                index += 1
+            elif following == ('operator', '(') and value == 'math.pow':
+                groups.append([len(output), None, None])
+                powers.append([len(groups), False])
+                append('(')
+                index = _next(tokens, index + 1)
+            elif following == ('operator', '('):
+                append(FUNCTION_TO_REDCAP.get(value, value))
+            elif value in ('if', 'else') and groups:
+                groups[-1][1 if value == 'if' else 2] = len(output)
+                append(value)
+            else:
+                append(value)
+        elif kind == 'operator':
+            if value == '(':
+                groups.append([len(output), None, None])
+            elif value == ')':
+                if powers and powers[-1][0] == len(groups):
+                    powers.pop()
+                    while output and output[-1].isspace():
+                        output.pop()
+                if groups:
+                    start, condition, other = groups.pop()
+                    if (condition is not None and other is not None
+                            and condition < other):
+                        # (then if condition else other)
+                        output[start:] = ['if(%s, %s, %s)' % (
+                            ''.join(output[condition + 1:other]).strip(),
+                            ''.join(output[start + 1:condition]).strip(),
+                            ''.join(output[other + 1:]).strip(),
+                        )]
+                        continue
+            elif (value == ',' and powers
+                    and powers[-1] == [len(groups), False]):
+                powers[-1][1] = True
+                while output and output[-1].isspace():
+                    output.pop()
+                append(')^(')
+                index = _next(tokens, index)
+                continue
+            append(OPERATOR_TO_REDCAP.get(value, value))
+        else:
+            append(value)
+    return ''.join(output)
@@ -4,19 +4,21 @@
 
 
 import re
+import csv
 import collections
+import six
 
 
-from rios.core.validation.instrument import get_full_type_definition
 from rios.conversion.base import FromRios
 from rios.conversion.exception import (
     ConversionValueError,
     RiosFormatError,
     Error,
 )
+from rios.conversion.redcap.expression import REFERENCE_TABLES
 from rios.conversion.redcap.to_rios import (
-    FUNCTION_TO_PYTHON,
-    OPERATOR_TO_REXL,
+    expression_table,
+    record_expression_lookups,
 )
 
 
@@ -46,21 +48,6 @@ COLUMNS = [
         "Field Annotation",
         ]
 
-# dict: each item => rios.conversion name: REDCap name
-FUNCTION_TO_REDCAP = {rios: red for red, rios in FUNCTION_TO_PYTHON.items()}
-
-# dict of function name: pattern which finds "name("
-RE_funcs = {
-        k: re.compile(r'\b%s\(' % k)
-        for k in FUNCTION_TO_REDCAP.keys()}
-
-# array of (regex pattern, replacement)
-RE_ops = [(re.compile(rexl), redcap) for redcap, rexl in OPERATOR_TO_REXL]
-
-# Find math.pow function: math.pow(base, exponent)
-# \1 => base, \2 => exponent
-RE_pow_function = re.compile(r'\bmath.pow\(\s*(.+)\s*,\s*(.+)\s*\)')
-
 # Find variable reference: table["field"] or table['field']
 # \1 => table, \2 => quote \3 => field
 RE_variable_reference = re.compile(
@@ -70,13 +57,55 @@ RE_variable_reference = re.compile(
         r'''\2\s*\]''')
 
 
+class RowWriter(object):
+    """
+    Writes the rows appended to it to a CSV stream, and counts them. On
+    Python 2, where the csv module only writes bytes, text cells are
+    encoded as UTF-8.
+    """
+
+    def __init__(self, stream):
+        self.writer = csv.writer(stream)
+        self.count = 0
+
+    def append(self, row):
+        if six.PY2:
+            row = [
+                cell.encode('utf-8') if isinstance(cell, six.text_type)
+                else cell
+                for cell in row
+            ]
+        self.writer.writerow(row)
+        self.count += 1
+
+    def __len__(self):
+        return self.count
+
+
 class RedcapFromRios(FromRios):
     """ Converts a RIOS configuration into a REDCap configuration """
 
+    def __init__(self, *args, **kwargs):
+        """
+        Accepts the FromRios arguments, and `expressions`, a table of
+        translated expressions to share with other conversions (see
+        rios.conversion.redcap.to_rios.expression_table()). By default, each
+        conversion memoizes expressions in its own table.
+
+        If `stream` is given, the REDCap data dictionary is written to it as
+        CSV, row by row as the form is processed, instead of being kept in
+        the ``instrument`` of the package, which is then empty.
+        """
+
+        self.expressions = kwargs.pop('expressions', None)
+        if self.expressions is None:
+            self.expressions = expression_table()
+        self.stream = kwargs.pop('stream', None)
+        super(RedcapFromRios, self).__init__(*args, **kwargs)
+
     def __call__(self):
-        self._rows = collections.deque()
-        self._rows.append(COLUMNS)
-        self.section_header = ''
+        # Expression lookups made by this conversion
+        hits, misses = self.expressions.hits, self.expressions.misses
 
         if 'pages' not in self._form or not self._form['pages']:
             raise RiosFormatError(
@@ -84,67 +113,80 @@ class RedcapFromRios(FromRios):
                 "RIOS form configuration does not contain page data"
             )
 
-        # Process form and instrument configurations
-        for page in self._form['pages']:
-            try:
-                self.page_processor(page)
-            except Exception as exc:
-                if isinstance(exc, ConversionValueError):
-                    # Don't need to create a new error instance, b/c
-                    # ConversionValueErrors caught here already contain
-                    # identifying information.
-                    self.logger.warning(str(exc))
-                elif isinstance(exc, RiosFormatError):
-                    error = Error(
-                        "Error parsing the data dictionary:",
-                        str(exc)
-                    )
-                    error.wrap(
-                        "RIOS data dictionary conversion failure:",
-                        "Unable to parse the data dictionary"
-                    )
-                    self.logger.error(str(error))
-                    raise error
-                else:
-                    error = Error(
-                        "An unknown or unexpected error occured:",
-                        repr(exc)
-                    )
-                    error.wrap(
-                        "RIOS data dictionary conversion failure:",
-                        "Unable to parse the data dictionary"
-                    )
-                    self.logger.error(repr(error))
-                    raise exc
+        if self.stream is not None:
+            self._rows = RowWriter(self.stream)
+        else:
+            self._rows = collections.deque()
+        self._rows.append(COLUMNS)
+        self.section_header = ''
 
-        # Process calculations
-        if self._calculationset:
-            for calculation in self._calculationset['calculations']:
+        # Process form and instrument configurations
+        with self.metrics.phase('process'):
+            for page in self._form['pages']:
                 try:
-                    calc_id = calculation.get('id', None)
-                    calc_description = calculation.get('id', None)
-                    if not calc_id or not calc_description:
-                        raise RiosFormatError(
-                            "Missing ID or description for a calculation:",
-                            str(
-                                calc_id
-                                or calc_description
-                                or "Calculation is not identifiable"
-                            )
-                        )
-                    self.process_calculation(calculation)
+                    self.page_processor(page)
                 except Exception as exc:
                     if isinstance(exc, ConversionValueError):
+                        # Don't need to create a new error instance, b/c
+                        # ConversionValueErrors caught here already contain
+                        # identifying information.
+                        self.logger.warning(str(exc))
+                    elif isinstance(exc, RiosFormatError):
                         error = Error(
-                            "Skipping calculation element with ID:",
-                            str(calc_id)
+                            "Error parsing the data dictionary:",
+                            str(exc)
                         )
-                        error.wrap("Error:", str(exc))
-                        self.logger.warning(str(exc))
+                        error.wrap(
+                            "RIOS data dictionary conversion failure:",
+                            "Unable to parse the data dictionary"
+                        )
+                        self.logger.error(str(error))
+                        raise error
                     else:
+                        error = Error(
+                            "An unknown or unexpected error occured:",
+                            repr(exc)
+                        )
+                        error.wrap(
+                            "RIOS data dictionary conversion failure:",
+                            "Unable to parse the data dictionary"
+                        )
+                        self.logger.error(repr(error))
                         raise exc
 
-        self._definition.append(self._rows)
+            # Process calculations
+            if self._calculationset:
+                for calculation in self._calculationset['calculations']:
+                    try:
+                        calc_id = calculation.get('id', None)
+                        calc_description = calculation.get('id', None)
+                        if not calc_id or not calc_description:
+                            raise RiosFormatError(
+                                "Missing ID or description for a calculation:",
+                                str(
+                                    calc_id
+                                    or calc_description
+                                    or "Calculation is not identifiable"
+                                )
+                            )
+                        self.process_calculation(calculation)
+                    except Exception as exc:
+                        if isinstance(exc, ConversionValueError):
+                            error = Error(
+                                "Skipping calculation element with ID:",
+                                str(calc_id)
+                            )
+                            error.wrap("Error:", str(exc))
+                            self.logger.warning(str(exc))
+                        else:
+                            raise exc
+
+        if self.stream is None:
+            with self.metrics.phase('serialize'):
+                self._definition.append(self._rows)
+        # Header row is not counted
+        self.metrics.set('rows', len(self._rows) - 1)
+        record_expression_lookups(self, hits, misses)
 
     def page_processor(self, page):
         self.form_name = page.get('id', None)
@@ -190,41 +232,30 @@ class RedcapFromRios(FromRios):
         Convert REXL expression into REDCap expressions
 
         - convert operators
-        - convert caret to pow
-        - convert redcap function names to python
+        - convert pow to caret
+        - convert python function names to redcap
         - convert database reference:  a["b"] => [a][b]
         - convert assessment variable reference: assessment["a"] => [a]
         - convert calculation variable reference: calculations["c"] => [c]
+
+        The expression is translated in a single pass over its tokens; see
+        rios.conversion.redcap.expression.to_redcap. Translations are
+        memoized in the expressions table.
         """
 
-        s = rexl
-        for pattern, replacement in RE_ops:
-            s = pattern.sub(replacement, s)
-        s = RE_pow_function.sub(r'(\1)^(\2)', s)
-        for name, pattern in RE_funcs.items():
-            # the matched pattern includes the '('
-            s = pattern.sub('%s(' % FUNCTION_TO_REDCAP[name], s)
-        s = self.convert_variables(s)
-        return s
+        return self.expressions(('redcap', rexl, frozenset()))
 
     @staticmethod
     def convert_variables(s):
-        start = 0
-        answer = ''
-        while 1:
-            match = RE_variable_reference.search(s[start:])
-            if match:
-                table, quote, field = match.groups()
-                if table in ['assessment', 'calculations']:
-                    replacement = '[%s]' % field
-                else:
-                    replacement = '[%s][%s]' % (table, field)
-                answer += s[start: start + match.start()] + replacement
-                start += match.end()
-            else:
-                break
-        answer += s[start:]
-        return answer
+        """ Converts the variable references in ``s`` to REDCap syntax """
+
+        def replace(match):
+            table, quote, field = match.groups()
+            if table in REFERENCE_TABLES:
+                return '[%s]' % field
+            return '[%s][%s]' % (table, field)
+
+        return RE_variable_reference.sub(replace, s)
 
     def get_choices(self, array):
         return ' | '.join(['%s, %s' % (
@@ -315,13 +346,12 @@ class RedcapFromRios(FromRios):
         choices = self.get_choices(column['enumerations'])
         section_header = self.section_header
         matrix_group_name = question['fieldId']
-        field = self.fields[matrix_group_name]
-        type_object = get_full_type_definition(
-            self._instrument,
-            field['type']
-        )
-        base = type_object['base']
+        base = self.get_type(matrix_group_name)['base']
         field_type, valid_type = self.get_type_tuple(base, question)
+        # Every row of the matrix has the flags of the matrix field
+        field = self.fields[matrix_group_name]
+        identifiable = 'y' if field.get('identifiable', False) else ''
+        required = 'y' if field.get('required', False) else ''
         for row in question['rows']:
             self._rows.append(
                 [
@@ -336,9 +366,9 @@ class RedcapFromRios(FromRios):
                     valid_type,
                     '',
                     '',
-                    'y' if field.get('identifiable', False) else '',
+                    identifiable,
                     '',
-                    'y' if field.get('required', False) else '',
+                    required,
                     '',
                     '',
                     matrix_group_name,
@@ -375,9 +405,7 @@ class RedcapFromRios(FromRios):
         else:
             field_id = question['fieldId']
             field = self.fields[field_id]
-            type_object = get_full_type_definition(
-                    self._instrument,
-                    field['type'])
+            type_object = self.get_type(field_id)
             base = type_object['base']
             field_type, valid_type = self.get_type_tuple(base, question)
             min_value, max_value = get_range(type_object)
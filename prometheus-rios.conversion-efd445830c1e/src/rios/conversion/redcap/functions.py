@@ -20,8 +20,42 @@ __all__ = (
 )
 
 
-def datediff(date1, date2, units, date_fmt="ymd"):
+# Seconds per unit of datediff(redcap=True), with REDCap's average year and
+# month
+SECONDS_PER_UNIT = {
+    'y': 365.2425 * 86400,
+    'M': 30.44 * 86400,
+    'd': 86400,
+    'h': 3600,
+    'm': 60,
+    's': 1,
+}
+
+
+def datediff(date1, date2, units, date_fmt="ymd", redcap=False,
+                signed=False):
+    """
+    Returns the difference `date1` - `date2` in `units`. The dates are
+    strings in `date_fmt` order, or "today".
+
+    By default, years and months are 365 and 30 days, and the difference is
+    signed and computed with the ``/`` operator, as it always was. If
+    `redcap` is set, the difference is computed as REDCap does: a float
+    using the average year and month lengths of ``SECONDS_PER_UNIT``, which
+    is the absolute difference unless `signed` is set, with "today" as
+    midnight of the current date, and "now" as the current time.
+    """
+
     def _datetime(date):
+        if date == "today":
+            if not redcap:
+                return datetime.datetime.today()
+            return datetime.datetime.combine(
+                datetime.date.today(),
+                datetime.time(),
+            )
+        if date == "now" and redcap:
+            return datetime.datetime.now()
         return datetime.datetime(**dict(zip(
                 [{'y': 'year', 'm': 'month', 'd': 'day'}[x]
                         for x in date_fmt],
@@ -46,12 +80,14 @@ def datediff(date1, date2, units, date_fmt="ymd"):
             else:
                 raise ValueError(units)
 
-    if "today" in [date1, date2]:
-        today = datetime.datetime.today()
-    minuend = today if date1 == "today" else _datetime(date1)
-    subtrahend = today if date2 == "today" else _datetime(date2)
-    difference = minuend - subtrahend
-    return _timedelta(difference)
+    difference = _datetime(date1) - _datetime(date2)
+    if not redcap:
+        return _timedelta(difference)
+    if units not in SECONDS_PER_UNIT:
+        raise ValueError(units)
+    seconds = difference.days * 86400 + difference.seconds
+    value = seconds / float(SECONDS_PER_UNIT[units])
+    return value if signed else abs(value)
 
 
 def mean(*data):
@@ -63,9 +99,9 @@ def median(*data):
         sorted_data = sorted(data)
         n = len(sorted_data)
         if n % 2 == 1:
-            return float(sorted_data[n / 2])
+            return float(sorted_data[n // 2])
         else:
-            m = n / 2
+            m = n // 2
             return (sorted_data[m - 1] + sorted_data[m]) / 2.0
     else:
         return None
@@ -6,7 +6,6 @@
 import re
 import json
 import six
-import collections
 import ast
 
 
@@ -14,9 +13,14 @@ from rios.conversion.base import structures
 from rios.conversion.utils import (
     InstrumentCalcStorage,
     CsvReader,
-    balanced_match,
+    LruTable,
+    MemoTable,
 )
 from rios.conversion.base import ToRios, localized_string_object
+from rios.conversion.redcap import expression
+from rios.conversion.redcap.expression import (  # noqa:F401
+    FUNCTION_TO_PYTHON,
+)
 from rios.conversion.exception import (
     RedcapFormatError,
     ConversionValueError,
@@ -36,43 +40,13 @@ RE_non_alphanumeric = re.compile(r'\W+')
 # result available as: \1
 RE_strip_outer_underbars = re.compile(r'^_*(.*[^_])_*$')
 
-# Find database reference:  [table_name][field_name]
-# \1 => table_name, \2 => field_name
-RE_database_ref = re.compile(r'\[([\w_]+)\]\[([\w_]+)\]')
-
-# Find variable reference
-# \1 => variable name
-RE_variable_ref = re.compile(r'''\[([\w_]+)\]''')
-
-# dict: each item => REDCap name: rios.conversion name
-FUNCTION_TO_PYTHON = {
-    'min': 'min',
-    'max': 'max',
-    'mean': 'rios.conversion.redcap.functions.mean',
-    'median': 'rios.conversion.redcap.function.median',
-    'sum': 'rios.conversion.redcap.functions.sum_',
-    'stdev': 'rios.conversion.redcap.functions.stdev',
-    'round': 'rios.conversion.redcap.functions.round_',
-    'roundup': 'rios.conversion.redcap.functions.roundup',
-    'rounddown': 'rios.conversion.redcap.functions.rounddown',
-    'sqrt': 'math.sqrt',
-    'abs': 'abs',
-    'datediff': 'rios.conversion.redcap.functions.datediff',
-}
-
-# dict of function name: pattern which finds "name("
-RE_funcs = {
-    k: re.compile(r'\b%s\(' % k)
-    for k in FUNCTION_TO_PYTHON.keys()
-}
-
 # Array of tuples: (REDCap operator, rios.conversion operator)
 OPERATOR_TO_REXL = [
     (r'<>', r'!='),
 ]
 
-# array of (regex pattern, replacement)
-RE_ops = [(re.compile(redcap), rexl) for redcap, rexl in OPERATOR_TO_REXL]
+# Number of translated expressions kept by an expression table
+EXPRESSION_CACHE_SIZE = 4096
 
 
 def isint(s):
@@ -82,94 +56,160 @@ def isint(s):
     return chk
 
 
+def canonical_name(name):
+    """
+    Return canonical name, a valid RIOS Identifier.
+
+    - replace (one or more) non-alphanumeric with underbar.
+    - strip leading and trailing underbars.
+    - convert to lowercase.
+    - ensure 'choices' field is 'choices_or_calculations'
+      (REDCap has several names for the 'choices' field
+      but they all begin with 'choices' and contain 'calc')
+    - if the name begins with a digit, then prepend "id_"
+    """
+    if name is None:
+        raise ValueError("Name cannot be None")
+    x = RE_strip_outer_underbars.sub(
+            r'\1',
+            RE_non_alphanumeric.sub('_', name.strip().lower()))
+    if x.startswith('choices') and 'calc' in x:
+        x = 'choices_or_calculations'
+    if x.startswith('branching_logic'):
+        x = 'branching_logic'
+    if x not in ('text_validation_min', 'text_validation_max') \
+            and x.startswith('text_validation'):
+        x = 'text_validation'
+    if x and x[0].isdigit():
+        x = 'id_' + x
+    return x
+
+
+def translate_expression(key):
+    """
+    Translates an expression. `key` is a tuple of:
+
+    - the translation: 'calculation' (REDCap to Python), 'trigger' (REDCap
+      to REXL), or 'redcap' (Python or REXL to REDCap)
+    - the expression
+    - a frozenset of the calculation variables the expression may refer to
+
+    The translation depends on nothing else, so its results can be memoized
+    by key (see expression_table()).
+    """
+
+    kind, text, variables = key
+    if kind == 'redcap':
+        return expression.to_redcap(text)
+    node = expression.parse(text)
+    if kind == 'calculation':
+        return expression.to_python(node, variables, canonical_name)
+    return '!(%s)' % expression.to_rexl(node, variables, canonical_name)
+
+
+def expression_table(max_size=EXPRESSION_CACHE_SIZE):
+    """ Returns a new LruTable of translate_expression() """
+
+    return LruTable(translate_expression, max_size)
+
+
+def record_expression_lookups(converter, hits, misses):
+    """
+    Logs the hit rate of the lookups made in the expressions table of
+    `converter` since the table counted `hits` and `misses`, and records
+    them in its metrics when metrics are recorded.
+    """
+
+    hits = converter.expressions.hits - hits
+    misses = converter.expressions.misses - misses
+    converter.metrics.set('expression_hits', hits)
+    converter.metrics.set('expression_misses', misses)
+    if hits or misses:
+        converter.logger.info(
+            'Expression cache: {} hits, {} misses, {:.1%} hit rate'.format(
+                hits,
+                misses,
+                float(hits) / (hits + misses),
+            )
+        )
+
+
 class CsvReaderWithGetName(CsvReader):
     """
     RIOS imposes restrictions on the range of strings which can be used for
     IDs. This program quietly converts input IDs using
     Csv2OrderedDict.get_name() in the hopes of obtaining a valid RIOS ID.
+
+    Canonical names are memoized in `names`, a MemoTable of
+    canonical_name(), which may be shared by several readers.
     """
 
+    def __init__(self, fname, fast=False, names=None):
+        super(CsvReaderWithGetName, self).__init__(fname, fast=fast)
+        self.names = names if names is not None else MemoTable(canonical_name)
+
     def get_name(self, name):
-        """
-        Return canonical name, a valid RIOS Identifier.
-
-        - replace (one or more) non-alphanumeric with underbar.
-        - strip leading and trailing underbars.
-        - convert to lowercase.
-        - ensure 'choices' field is 'choices_or_calculations'
-          (REDCap has several names for the 'choices' field
-          but they all begin with 'choices' and contain 'calc')
-        - if the name begins with a digit, then prepend "id_"
-        """
-        if name is None:
-            raise ValueError("Name cannot be None")
-        x = RE_strip_outer_underbars.sub(
-                r'\1',
-                RE_non_alphanumeric.sub('_', name.strip().lower()))
-        if x.startswith('choices') and 'calc' in x:
-            x = 'choices_or_calculations'
-        if x.startswith('branching_logic'):
-            x = 'branching_logic'
-        if x not in ('text_validation_min', 'text_validation_max') \
-                and x.startswith('text_validation'):
-            x = 'text_validation'
-        if x and x[0].isdigit():
-            x = 'id_' + x
-        return x
+        """ Return canonical name, a valid RIOS Identifier. """
+        return self.names(name)
 
 
 class RedcapToRios(ToRios):
     """ Converts a REDCap CSV file to the RIOS specification format """
 
+    def __init__(self, *args, **kwargs):
+        """
+        Accepts the ToRios arguments, `names`, a MemoTable of
+        canonical_name(), and `expressions`, a table of translated
+        expressions (see expression_table()), to share with other
+        conversions. By default, each conversion memoizes canonical names
+        and expressions in its own tables.
+        """
+
+        self.names = kwargs.pop('names', None)
+        if self.names is None:
+            self.names = MemoTable(canonical_name)
+        self.expressions = kwargs.pop('expressions', None)
+        if self.expressions is None:
+            self.expressions = expression_table()
+        super(RedcapToRios, self).__init__(*args, **kwargs)
+
     def __call__(self):
+        # Canonical name and expression lookups made by this conversion
+        hits, misses = self.names.hits, self.names.misses
+        expression_hits = self.expressions.hits
+        expression_misses = self.expressions.misses
+
         # Pre-processing
-        self.reader = CsvReaderWithGetName(self.stream)  # noqa: F821
-        self.reader.load_attributes()
-
-        # Determine and initializeprocessor
-        first_field = self.reader.attributes[0]
-        if first_field == 'variable_field_name':
-            # Process new CSV format
-            process = Processor(self.reader, self.localization)
-        elif first_field == 'fieldid':
-            # Process legacy CSV format
-            process = LegacyProcessor(self.reader, self.localization)
-        else:
-            error = RedcapFormatError(
-                "Unknown input CSV header format. Got value:",
-                ", ".join(self.reader.attributes)
-            )
-            error.wrap(
-                "REDCap data dictionary conversion failure:",
-                "Unable to parse REDCap data dictionary CSV"
+        with self.metrics.phase('read'):
+            self.reader = CsvReaderWithGetName(  # noqa: F821
+                self.stream,
+                fast=True,
+                names=self.names,
             )
-            self.logger.error(str(error))
-            raise error
-
-        # MAIN PROCESSING
-        # Occures in two steps:
-        #   1) Process data and page names into containers
-        #   2) Iterate over containers to construct RIOS definitions
-        # NOTE:
-        #   1) Each CSV row is an ordered dict (see CsvReader in utils/)
-        #   2) Start=2, because spread sheet programs set header row to 1
-        #       and first data row to 2 (for user friendly errors)
-        data = collections.OrderedDict()
-        page_names = set()
-        for line, row in enumerate(self.reader, start=2):
-            if 'page' in row:
-                # Page name for legacy REDCap data dictionary format
-                if row['page']:
-                    page_name = self.reader.get_name(row['page'])
-                else:
-                    page_name = 'page_0'
-            elif 'form_name' in row:
-                # Page name for current REDCap data dictionary format
-                page_name = self.reader.get_name(row['form_name'])
+            self.reader.load_attributes()
+
+            # Determine and initializeprocessor
+            first_field = self.reader.attributes[0]
+            if first_field == 'variable_field_name':
+                # Process new CSV format
+                process = Processor(
+                    self.reader,
+                    self.localization,
+                    self.expressions,
+                    self.logger,
+                )
+            elif first_field == 'fieldid':
+                # Process legacy CSV format
+                process = LegacyProcessor(
+                    self.reader,
+                    self.localization,
+                    self.expressions,
+                    self.logger,
+                )
             else:
                 error = RedcapFormatError(
-                    'REDCap data dictionaries must contain'
-                    ' the \"Form Name\" column'
+                    "Unknown input CSV header format. Got value:",
+                    ", ".join(self.reader.attributes)
                 )
                 error.wrap(
                     "REDCap data dictionary conversion failure:",
@@ -178,88 +218,130 @@ class RedcapToRios(ToRios):
                 self.logger.error(str(error))
                 raise error
 
-            # Need unique list of page names to create one page instance
-            # per page name
-            page_names.add(page_name)
+        # MAIN PROCESSING
+        # Occurs in a single pass over the CSV rows, which are read as they
+        # are processed, so the rows are never all held in memory:
+        #   1) A page is created, and added to the form, the first time its
+        #       page name appears, so pages keep the order of the CSV
+        #   2) Each row is processed into its page and instrument fields
+        # NOTE:
+        #   1) Each CSV row is a CsvRow mapping (see CsvReader in utils/)
+        #   2) Start=2, because spread sheet programs set header row to 1
+        #       and first data row to 2 (for user friendly errors)
+        line = 1
+        with self.metrics.phase('process'):
+            for line, row in enumerate(self.reader, start=2):
+                page = self.get_page(row)
+                try:
+                    # WHERE THE MAGIC HAPPENS
+                    fields, calcs = process(page, row)
+
+                    # Clear processor's internal storage for next line
+                    process.clear_storage()
+
+                    for field in fields:
+                        self.field_container.append(field)
+                        self._instrument.add_field(field)
+                    for calc in calcs:
+                        self.calc_container[calc['id']] = calc
+
+                except Exception as exc:
+                    if isinstance(exc, ConversionValueError):
+                        error = Error(
+                            "Skipping line: " + str(line) + ". Error:",
+                            str(exc)
+                        )
+                        self.logger.warning(str(error))
+                    elif isinstance(exc, RedcapFormatError):
+                        error = Error(
+                            "Error on line: " + str(line) + ". Error:",
+                            str(exc)
+                        )
+                        error.wrap(
+                            "REDCap data dictionary conversion failure:",
+                            "Unable to parse the data dictionary"
+                        )
+                        self.logger.error(str(error))
+                        raise error
+                    else:
+                        error = Error(
+                            "An unknown or unexpected error occured:",
+                            repr(exc)
+                        )
+                        error.wrap(
+                            "REDCap data dictionary conversion failure:",
+                            "Unable to parse the data dictionary"
+                        )
+                        self.logger.error(str(error))
+                        raise error
+
+            # Construct calculationset object
+            for calc in six.itervalues(self.calc_container):
+                self._calculationset.add(calc)
+        self.metrics.set('rows', line - 1)
+        self.metrics.set('name_hits', self.names.hits - hits)
+        self.metrics.set('name_misses', self.names.misses - misses)
+        record_expression_lookups(self, expression_hits, expression_misses)
+
+        # Post-processing/validation
+        self.validate()
 
-            # Insert into data container
-            data[line] = {'page_name': page_name, 'row': row}
+    def get_page(self, row):
+        """
+        Returns the page of a CSV row. The page is created, and added to the
+        form, the first time its page name appears.
+        """
 
-        # Created pages for the data dictionary instrument
-        for page_name in page_names:
-            self.page_container.update(
-                {page_name: structures.PageObject(id=page_name), }
+        if 'page' in row:
+            # Page name for legacy REDCap data dictionary format
+            if row['page']:
+                page_name = self.reader.get_name(row['page'])
+            else:
+                page_name = 'page_0'
+        elif 'form_name' in row:
+            # Page name for current REDCap data dictionary format
+            page_name = self.reader.get_name(row['form_name'])
+        else:
+            error = RedcapFormatError(
+                'REDCap data dictionaries must contain'
+                ' the \"Form Name\" column'
             )
+            error.wrap(
+                "REDCap data dictionary conversion failure:",
+                "Unable to parse REDCap data dictionary CSV"
+            )
+            self.logger.error(str(error))
+            raise error
 
-        # Process the row
-        for line, row_pkg in six.iteritems(data):
-            page = self.page_container[row_pkg['page_name']]
-            row = row_pkg['row']
-            try:
-                # WHERE THE MAGIC HAPPENS
-                fields, calcs = process(page, row)
-
-                # Clear processor's internal storage for next line
-                process.clear_storage()
-
-                for field in fields:
-                    self.field_container.append(field)
-                for calc in calcs:
-                    self.calc_container.update(calc)
-
-            except Exception as exc:
-                if isinstance(exc, ConversionValueError):
-                    error = Error(
-                        "Skipping line: " + str(line) + ". Error:",
-                        str(exc)
-                    )
-                    self.logger.warning(str(error))
-                elif isinstance(exc, RedcapFormatError):
-                    error = Error(
-                        "Error on line: " + str(line) + ". Error:",
-                        str(exc)
-                    )
-                    error.wrap(
-                        "REDCap data dictionary conversion failure:",
-                        "Unable to parse the data dictionary"
-                    )
-                    self.logger.error(str(error))
-                    raise error
-                else:
-                    error = Error(
-                        "An unknown or unexpected error occured:",
-                        repr(exc)
-                    )
-                    error.wrap(
-                        "REDCap data dictionary conversion failure:",
-                        "Unable to parse the data dictionary"
-                    )
-                    self.logger.error(str(error))
-                    raise error
-
-        # Construct insrument and calculationset objects
-        for field in self.field_container:
-            self._instrument.add_field(field)
-        for calc in self.calc_container:
-            self._calculationset.add(calc)
-        # Page container is a dict instead of a list, so iterate over vals
-        for page in six.itervalues(self.page_container):
+        page = self.page_container.get(page_name)
+        if page is None:
+            page = structures.PageObject(id=page_name)
+            self.page_container[page_name] = page
             self._form.add_page(page)
-
-        # Post-processing/validation
-        self.validate()
+        return page
 
 
 class ProcessorBase(object):
     """ Abstract base class for processor objects """
 
-    def __init__(self, reader, localization):
+    def __init__(self, reader, localization, expressions=None,
+                 logger=None):
         self.reader = reader
         self.localization = localization
 
+        # Logger of the warnings about expressions translated as text
+        self.logger = logger
+
         # Set to hold unique calc variables
         self.calculation_variables = set()
 
+        # Table of translated expressions, keyed on the expression and a
+        # frozenset of the calc variables at the time, which only grow
+        self.expressions = (
+            expressions if expressions is not None else expression_table()
+        )
+        self._variables = frozenset()
+
         # Objects to construct instruments, forms, and calcsets
         self._storage = InstrumentCalcStorage()
 
@@ -300,40 +382,22 @@ class ProcessorBase(object):
         - convert database reference:  [a][b] => a["b"]
         - convert assessment variable reference: [a] => assessment["a"]
         - convert calculation variable reference: [c] => calculations["c"]
+        - convert checkbox reference: [a(b)] => ("b" in assessment["a"])
         - convert redcap function names to python
         - convert caret to pow
         - convert operators
+
+        The expression is parsed once, see rios.conversion.redcap.expression,
+        and the translation is memoized in the expressions table.
         """
-        s = RE_database_ref.sub(r'\1["\2"]', calc)
-        variables = RE_variable_ref.findall(s)
-        s = RE_variable_ref.sub(r'calculations["\1"]', s)
-        for var in variables:
-            if var not in self.calculation_variables:
-                s = s.replace(
-                        'calculations["%s"]' % var,
-                        'assessment["%s"]' % var)
-        for name, pattern in RE_funcs.items():
-            # The matched pattern includes the '('
-            s = pattern.sub('%s(' % FUNCTION_TO_PYTHON[name], s)
-        s = self.convert_carat_function(s)
-        for pattern, replacement in RE_ops:
-            s = pattern.sub(replacement, s)
-        return s
+        return self.translate('calculation', calc)
 
     def convert_carat_function(self, string):
-        answer = ''
-        position = 0
-        carat_pos = string.find(')^(', position)
-        while carat_pos != -1:
-            begin, end = balanced_match(string, carat_pos)
-            answer += string[position: begin]
-            answer += 'math.pow(' + string[begin + 1: end - 1]
-            begin, end = balanced_match(string, carat_pos + 2)
-            answer += ', ' + string[begin + 1: end - 1] + ')'
-            position = end
-            carat_pos = string.find(')^(', position)
-        answer += string[position:]
-        return answer
+        """
+        Convert RedCap expression into Python, with carets converted to
+        math.pow(): (a)^(b) => math.pow(a, b)
+        """
+        return self.convert_calc(string)
 
     def convert_text_type(self, text_type):
         if text_type.startswith('date'):
@@ -346,8 +410,29 @@ class ProcessorBase(object):
             return 'text'
 
     def convert_trigger(self, trigger):
-        s = self.convert_calc(trigger)
-        return '!(%s)' % s
+        return self.translate('trigger', trigger)
+
+    def translate(self, kind, text):
+        """
+        Returns translate_expression((kind, text, calc variables)). An
+        expression that cannot be parsed is translated as text instead (see
+        expression.translate_text()), with a warning.
+        """
+
+        if len(self._variables) != len(self.calculation_variables):
+            self._variables = frozenset(self.calculation_variables)
+        try:
+            return self.expressions((kind, text, self._variables))
+        except ConversionValueError as exc:
+            translation = expression.translate_text(text, self._variables)
+            if self.logger is not None:
+                self.logger.warning(str(Error(
+                    'Unable to parse expression, translated as text:',
+                    str(exc),
+                )))
+        if kind == 'calculation':
+            return translation
+        return '!(%s)' % translation
 
     def convert_value(self, value, text_type):
         if text_type == 'integer':
@@ -446,13 +531,16 @@ class Processor(ProcessorBase):
 
         # Now that we have a header only OR question and maybe a header, we
         # either add the header by itself as a section header, or we add a new
-        # question containing a possible sub-header. If no header or question,
-        # then we have a calculation, which is handled when instrument fields
-        # are constructed in the qestion_processor function.
+        # question containing a possible sub-header. If no question, then we
+        # have a calculation, which is only added to the calculationset.
         if header and not question:
             # Add non-questions to form (e.g., headers)
             page.add_element(header)
 
+        if not question:
+            # Stores the calculation, see get_type()
+            self.get_type(None, row)
+
         # Process existing ques or process and add new ques to the form
         if question:
             add_question_and_store_fields = self.question_and_field_processor(
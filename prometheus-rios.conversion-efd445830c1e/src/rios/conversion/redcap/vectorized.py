@@ -0,0 +1,222 @@
+#
+# Copyright (c) 2016, Prometheus Research, LLC
+#
+# Vectorized REDCap Function Routines
+#
+# NumPy versions of the functions in rios.conversion.redcap.functions, for
+# scoring many records at once. Each argument is an array holding one value
+# per record (or a single value for every record), and the result is an
+# array with one value per record. Missing values (None, '', NaN, NaT) are
+# ignored by the aggregates, as REDCap ignores blank values, and give a
+# missing result (NaN) elsewhere. A record whose values are all missing
+# aggregates to what the scalar function gives without arguments: 0 for
+# mean(), stdev() and sum_(), and NaN (None) for median().
+#
+# Requires NumPy, which is an optional dependency: pip install
+# rios.conversion[numpy]
+
+
+import datetime
+import warnings
+
+import numpy
+
+from rios.conversion.redcap.functions import SECONDS_PER_UNIT
+
+
+__all__ = (
+    'as_array',
+    'as_dates',
+    'datediff',
+    'mean',
+    'median',
+    'round_',
+    'rounddown',
+    'roundup',
+    'stdev',
+    'sum_',
+)
+
+
+# Values read as missing
+MISSING = (None, '')
+
+
+def as_array(values):
+    """ Returns `values` as a float array, with NaN for missing values """
+
+    if isinstance(values, numpy.ndarray) and values.dtype.kind == 'f':
+        return values
+    try:
+        return numpy.array(values, dtype=float)
+    except (TypeError, ValueError):
+        return numpy.array(
+            [numpy.nan if value in MISSING else value for value in values],
+            dtype=float,
+        )
+
+
+def as_dates(values, date_fmt="ymd", today=None):
+    """
+    Returns `values` as a datetime64 array of seconds, with NaT for missing
+    values. Strings are dates in `date_fmt` order, or "today" or "now", as
+    in rios.conversion.redcap.functions.datediff(). "today" is the datetime
+    `today`, midnight of the current date by default. Each distinct string
+    is parsed once.
+    """
+
+    if isinstance(values, numpy.ndarray) and values.dtype.kind == 'M':
+        return values.astype('datetime64[s]')
+    if not isinstance(values, (list, tuple, numpy.ndarray)):
+        values = [values]
+    distinct, inverse = numpy.unique(
+        numpy.array(
+            ['' if value is None else value for value in values],
+            dtype=object,
+        ).astype(str),
+        return_inverse=True,
+    )
+    order = [date_fmt.index(part) for part in 'ymd']
+    parsed = []
+    for value in distinct:
+        if value == 'today':
+            parsed.append(numpy.datetime64(
+                today or datetime.date.today(),
+                's',
+            ))
+        elif value == 'now':
+            parsed.append(numpy.datetime64(
+                datetime.datetime.now().replace(microsecond=0),
+                's',
+            ))
+        elif value in MISSING or value in ('nan', 'None', 'NaT'):
+            parsed.append(numpy.datetime64('NaT', 's'))
+        else:
+            parts = value.split('-')
+            parsed.append(numpy.datetime64(datetime.date(
+                *[int(parts[index]) for index in order]
+            ), 's'))
+    return numpy.array(parsed, dtype='datetime64[s]')[inverse]
+
+
+def _stack(data):
+    return numpy.vstack(numpy.broadcast_arrays(
+        *[numpy.atleast_1d(as_array(values)) for values in data]
+    ))
+
+
+def _count_and_total(data):
+    stacked = _stack(data)
+    present = ~numpy.isnan(stacked)
+    count = present.sum(axis=0)
+    total = numpy.where(present, stacked, 0.0).sum(axis=0)
+    return stacked, count, total
+
+
+# dict: each item => datediff() unit: seconds per unit, and whether the
+# difference is counted in whole days first, by default
+LEGACY_UNITS = {
+    'y': (365 * 86400, True),
+    'M': (30 * 86400, True),
+    'd': (86400, True),
+    'h': (3600, False),
+    'm': (60, False),
+    's': (1, False),
+}
+
+
+def datediff(date1, date2, units, date_fmt="ymd", redcap=False,
+                signed=False):
+    """
+    Returns the differences between two arrays of dates in `units`, as
+    rios.conversion.redcap.functions.datediff() does for each record.
+    """
+
+    if units not in SECONDS_PER_UNIT:
+        raise ValueError(units)
+    today = None
+    if not redcap:
+        today = datetime.datetime.now().replace(microsecond=0)
+    difference = (
+        as_dates(date1, date_fmt, today) - as_dates(date2, date_fmt, today)
+    ).astype('timedelta64[s]')
+    missing = numpy.isnat(difference)
+    seconds = numpy.where(missing, 0, difference.astype('int64'))
+    if redcap:
+        value = seconds / float(SECONDS_PER_UNIT[units])
+        if not signed:
+            value = numpy.abs(value)
+    else:
+        # The same operations as the scalar function, whose "/" divides
+        # integers like the one here, on either Python version
+        unit, whole_days = LEGACY_UNITS[units]
+        if whole_days:
+            value = (seconds // 86400) / (unit // 86400)
+        else:
+            value = seconds / unit
+    return numpy.where(missing, numpy.nan, value)
+
+
+def mean(*data):
+    _, count, total = _count_and_total(data)
+    with numpy.errstate(invalid='ignore', divide='ignore'):
+        return numpy.where(count == 0, 0.0, total / count)
+
+
+def median(*data):
+    with warnings.catch_warnings():
+        # All-NaN columns warn, and give NaN as intended
+        warnings.simplefilter('ignore', RuntimeWarning)
+        return numpy.nanmedian(_stack(data), axis=0)
+
+
+def round_(number, decimal_places):
+    """ Rounds half away from zero, as Python 2 and REDCap do """
+
+    x = 10.0 ** as_array(decimal_places)
+    number = as_array(number)
+    rounded = numpy.floor(numpy.abs(number) * x + 0.5)
+    return numpy.copysign(rounded, number) / x
+
+
+def rounddown(number, decimal_places):
+    number = as_array(number)
+    rounded = round_(number, decimal_places)
+    x = 0.5 * 10.0 ** -as_array(decimal_places)
+    with numpy.errstate(invalid='ignore'):
+        return numpy.where(
+            rounded <= number,
+            rounded,
+            round_(number - x, decimal_places),
+        )
+
+
+def roundup(number, decimal_places):
+    number = as_array(number)
+    rounded = round_(number, decimal_places)
+    x = 0.5 * 10.0 ** -as_array(decimal_places)
+    with numpy.errstate(invalid='ignore'):
+        return numpy.where(
+            rounded >= number,
+            rounded,
+            round_(number + x, decimal_places),
+        )
+
+
+def stdev(*data):
+    """ Calculates the population standard deviation, as stdev() does """
+
+    stacked, count, total = _count_and_total(data)
+    with numpy.errstate(invalid='ignore', divide='ignore'):
+        average = total / count
+        squares = numpy.where(
+            numpy.isnan(stacked),
+            0.0,
+            (stacked - average) ** 2,
+        ).sum(axis=0)
+        return numpy.where(count < 2, 0.0, numpy.sqrt(squares / count))
+
+
+def sum_(*data):
+    _, _, total = _count_and_total(data)
+    return total
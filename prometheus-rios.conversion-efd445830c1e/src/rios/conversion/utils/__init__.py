@@ -3,8 +3,13 @@
 #
 
 
+from .backends import load_definition  # noqa:F401
 from .balanced_match import balanced_match  # noqa:F401
+from .cache import ConversionCache  # noqa:F401
 from .csv_reader import CsvReader  # noqa:F401
 from .json_reader import JsonReader  # noqa:F401
+from .json_stream import JsonStream  # noqa:F401
 from .instrument_calc_storage import InstrumentCalcStorage  # noqa:F401
 from .log import InMemoryLogger  # noqa:F401
+from .memo import LruTable, MemoTable  # noqa:F401
+from .metrics import ConversionMetrics, NULL_METRICS  # noqa:F401
@@ -0,0 +1,120 @@
+#
+# Copyright (c) 2016, Prometheus Research, LLC
+#
+# JSON and YAML parser backends.
+#
+# The fastest available parser of each format is selected once, when this
+# module is imported: a JSON module whose decoder runs in C (simplejson
+# built with its speedups, or the standard json module), and the libyaml
+# loader and dumper when PyYAML was built with libyaml. Otherwise the pure
+# Python parsers are used, which give the same results, only slower.
+# describe() reports the selected backends.
+
+
+import importlib
+
+import yaml
+
+
+__all__ = (
+    'JSON_BACKEND',
+    'YAML_BACKEND',
+    'YamlLoader',
+    'YamlDumper',
+    'describe',
+    'json_decoder',
+    'load_definition',
+    'load_json',
+    'load_yaml',
+    'loads_json',
+    'select_json',
+)
+
+
+# JSON modules, in order of preference
+JSON_MODULES = ('simplejson', 'json')
+
+
+def _accelerated(module):
+    scanner = getattr(module, 'scanner', None)
+    return getattr(scanner, 'c_make_scanner', None) is not None
+
+
+def select_json(names=JSON_MODULES):
+    """
+    Returns the name and the module of the first of `names` whose decoder
+    runs in C, or of the first one that can be imported if none does. The
+    name of a module without a C decoder ends with " (python)". Raises an
+    ImportError if none of them can be imported.
+    """
+
+    fallback = None
+    for name in names:
+        try:
+            module = importlib.import_module(name)
+        except ImportError:
+            continue
+        if _accelerated(module):
+            return name, module
+        if fallback is None:
+            fallback = (name + ' (python)', module)
+    if fallback is None:
+        raise ImportError(
+            'No JSON module available. Tried: {}'.format(', '.join(names))
+        )
+    return fallback
+
+
+JSON_BACKEND, _json = select_json()
+
+_decoder = _json.JSONDecoder()
+
+if getattr(yaml, '__with_libyaml__', False):
+    YAML_BACKEND = 'libyaml'
+    YamlLoader = yaml.CSafeLoader
+    YamlDumper = yaml.CSafeDumper
+else:
+    YAML_BACKEND = 'python'
+    YamlLoader = yaml.SafeLoader
+    YamlDumper = yaml.SafeDumper
+
+
+def describe():
+    """ Returns the selected backend of each format, by format """
+
+    return {
+        'json': JSON_BACKEND,
+        'yaml': YAML_BACKEND,
+    }
+
+
+def json_decoder():
+    """
+    Returns the JSONDecoder of the selected JSON module, whose raw_decode()
+    decodes a value from a position of a string.
+    """
+
+    return _decoder
+
+
+def load_json(stream):
+    return _json.load(stream)
+
+
+def loads_json(text):
+    return _json.loads(text)
+
+
+def load_yaml(stream):
+    """ Loads a YAML document safely, as yaml.safe_load() does """
+
+    return yaml.load(stream, Loader=YamlLoader)
+
+
+def load_definition(filename):
+    """ Loads a RIOS definition from a JSON file, named *.json, or YAML """
+
+    with open(filename, 'r') as stream:
+        if filename.endswith('.json'):
+            return load_json(stream)
+        return load_yaml(stream)
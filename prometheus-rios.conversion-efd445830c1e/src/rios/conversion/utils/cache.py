@@ -0,0 +1,293 @@
+#
+# Copyright (c) 2016, Prometheus Research, LLC
+#
+
+
+import errno
+import hashlib
+import json
+import os
+import tempfile
+import six
+
+
+from six.moves import cPickle as pickle
+
+
+__all__ = ('ConversionCache',)
+
+
+DEFAULT_MAX_SIZE = 256 * 1024 * 1024
+
+CACHE_SUFFIX = '.pickle'
+
+# Characters or bytes of a data dictionary hashed at a time
+CHUNK_SIZE = 64 * 1024
+
+
+def _seekable(stream):
+    seekable = getattr(stream, 'seekable', None)
+    if seekable is not None:
+        return seekable()
+    # Python 2 files have no seekable(), and fail to seek on pipes
+    try:
+        stream.seek(0, os.SEEK_CUR)
+    except (AttributeError, IOError, OSError):
+        return False
+    return True
+
+
+def _distribution_version(name):
+    try:
+        import pkg_resources
+        return pkg_resources.get_distribution(name).version
+    except Exception:
+        return 'unknown'
+
+
+# Converted output depends on both libraries, so a new version of either
+# one must not reuse packages stored by the old version.
+LIBRARY_VERSION = '{}/{}'.format(
+    _distribution_version('rios.conversion'),
+    _distribution_version('rios.core'),
+)
+
+
+class ConversionCache(object):
+    """
+    Content-addressed, on-disk storage for converted packages.
+
+    Usage:
+
+        cache = ConversionCache('/var/cache/rios')
+        package = redcap_to_rios(..., cache=cache)
+
+    Packages are keyed on a hash of the conversion input, the conversion
+    arguments, and the library version, so a re-run of an identical
+    conversion returns the stored package without converting or validating
+    anything. Only successful conversions are stored.
+
+    Each package is stored in its own file. Files are written to a temporary
+    name and renamed into place, so any number of processes can share one
+    cache `directory`. When the files grow past `max_size` bytes, the least
+    recently used packages are removed. Each instance adds the size of the
+    files it stores to the total it found when it last scanned the
+    directory, and only scans it again once that passes `max_size`, so
+    packages stored by other processes in the meantime are only counted on
+    the next scan.
+
+    Packages are stored with ``pickle``, so only use a `directory` that is
+    not writable by untrusted users.
+
+    The ``hits`` and ``misses`` counters record lookups made by this
+    instance.
+    """
+
+    def __init__(self, directory, max_size=DEFAULT_MAX_SIZE):
+        self.directory = directory
+        self.max_size = max_size
+        self.hits = 0
+        self.misses = 0
+        # Bytes stored in the directory, None until it is scanned
+        self._size = None
+        if not os.path.isdir(directory):
+            try:
+                os.makedirs(directory)
+            except OSError as exc:
+                # Another process may have created it in the meantime
+                if exc.errno != errno.EEXIST:
+                    raise
+
+    @property
+    def hit_rate(self):
+        lookups = self.hits + self.misses
+        return (float(self.hits) / lookups) if lookups else 0.0
+
+    @property
+    def stats(self):
+        return {
+            'hits': self.hits,
+            'misses': self.misses,
+            'hit_rate': self.hit_rate,
+        }
+
+    @staticmethod
+    def make_key(kind, data, **arguments):
+        """
+        Returns the cache key of a conversion: a hash of the conversion
+        `kind` (usually the API function name), the input `data` bytes, the
+        conversion `arguments`, and the library version.
+        """
+
+        digest = ConversionCache._digest(kind, arguments)
+        ConversionCache._update(digest, data)
+        return digest.hexdigest()
+
+    @staticmethod
+    def _digest(kind, arguments):
+        digest = hashlib.sha256()
+        digest.update(LIBRARY_VERSION.encode('utf-8'))
+        digest.update(b'\0')
+        digest.update(kind.encode('utf-8'))
+        digest.update(b'\0')
+        digest.update(json.dumps(arguments, sort_keys=True).encode('utf-8'))
+        digest.update(b'\0')
+        return digest
+
+    @staticmethod
+    def _update(digest, data):
+        if isinstance(data, six.text_type):
+            data = data.encode('utf-8')
+        digest.update(data)
+
+    def stream_key(self, kind, stream, **arguments):
+        """
+        Reads a data dictionary `stream` (a filename or file-like object) and
+        returns its cache key, the same as make_key() returns for its data,
+        along with a stream over the data for the converter to use.
+
+        The data is hashed in chunks. A filename is opened again, and a
+        seekable stream is rewound, so only the data of streams that cannot
+        seek is kept in memory, to be read again from a new stream.
+        """
+
+        if isinstance(stream, six.string_types):
+            with open(stream, 'r') as fi:
+                key = self.stream_key(kind, fi, **arguments)[0]
+            return key, open(stream, 'r')
+
+        seekable = _seekable(stream)
+        if seekable:
+            stream.seek(0)
+        digest = self._digest(kind, arguments)
+        chunks = []
+        while True:
+            chunk = stream.read(CHUNK_SIZE)
+            if not chunk:
+                break
+            self._update(digest, chunk)
+            if not seekable:
+                chunks.append(chunk)
+        if seekable:
+            stream.seek(0)
+            return digest.hexdigest(), stream
+        data = chunk.join(chunks)
+        replay = (
+            six.StringIO(data)
+            if isinstance(data, six.text_type)
+            else six.BytesIO(data)
+        )
+        return digest.hexdigest(), replay
+
+    def definition_key(self, kind, definitions, **arguments):
+        """
+        Returns the cache key of a conversion from RIOS `definitions`: a
+        list of the instrument, form, and calculationset dicts.
+        """
+
+        data = json.dumps(definitions, sort_keys=True, default=list)
+        return self.make_key(kind, data, **arguments)
+
+    def get_filename(self, key):
+        return os.path.join(self.directory, key + CACHE_SUFFIX)
+
+    def get(self, key):
+        """ Returns the package stored under `key`, or None """
+
+        filename = self.get_filename(key)
+        try:
+            with open(filename, 'rb') as stream:
+                package = pickle.load(stream)
+        except Exception:
+            # Missing, evicted, or unreadable entries are all misses
+            self.misses += 1
+            return None
+        try:
+            # Mark as recently used for eviction
+            os.utime(filename, None)
+        except OSError:
+            pass
+        self.hits += 1
+        return package
+
+    def set(self, key, package):
+        """
+        Stores `package` under `key` and evicts old packages if needed.
+        Caching is best-effort: returns False if the package could not be
+        stored.
+        """
+
+        if 'metrics' in package:
+            # Metrics describe a single conversion run, not the package
+            package = dict(package)
+            del package['metrics']
+        filename = self.get_filename(key)
+        temporary = None
+        try:
+            fd, temporary = tempfile.mkstemp(
+                dir=self.directory,
+                prefix='.tmp-',
+            )
+            with os.fdopen(fd, 'wb') as stream:
+                pickle.dump(package, stream, pickle.HIGHEST_PROTOCOL)
+                size = stream.tell()
+            try:
+                os.rename(temporary, filename)
+            except OSError:
+                # Some platforms can't rename over an existing file. Another
+                # process has stored the same package, so keep that one.
+                if not os.path.exists(filename):
+                    raise
+                os.remove(temporary)
+            if self._size is not None:
+                self._size += size
+            if self.max_size is not None and (
+                    self._size is None or self._size > self.max_size):
+                self.evict()
+        except (EnvironmentError, pickle.PicklingError):
+            if temporary and os.path.exists(temporary):
+                os.remove(temporary)
+            return False
+        return True
+
+    def evict(self):
+        """
+        Scans the directory, and removes least recently used packages until
+        their size is under max_size.
+        """
+
+        entries = []
+        total = 0
+        for name in os.listdir(self.directory):
+            if not name.endswith(CACHE_SUFFIX):
+                continue
+            try:
+                stat = os.stat(os.path.join(self.directory, name))
+            except OSError:
+                continue
+            entries.append((stat.st_mtime, stat.st_size, name))
+            total += stat.st_size
+        entries.sort()
+        for _, size, name in entries:
+            if self.max_size is None or total <= self.max_size:
+                break
+            try:
+                os.remove(os.path.join(self.directory, name))
+            except OSError:
+                # Already removed by another process
+                pass
+            total -= size
+        self._size = total
+
+    def clear(self):
+        """ Removes every stored package and resets the counters """
+
+        for name in os.listdir(self.directory):
+            if name.endswith(CACHE_SUFFIX):
+                try:
+                    os.remove(os.path.join(self.directory, name))
+                except OSError:
+                    pass
+        self._size = None
+        self.hits = 0
+        self.misses = 0
@@ -6,13 +6,84 @@
 import collections
 import csv
 import re
+import six
 
 
 __all__ = (
     "CsvReader",
+    "CsvRow",
 )
 
 
+class CsvRow(object):
+    """
+    A read-only mapping of column names to the cells of a CSV row, used by
+    CsvReader in ``fast`` mode.
+
+    `index` maps each column name to its position, and is shared by all the
+    rows of a file, so a row only holds its list of cells. Cells are
+    stripped when they are accessed. Columns past the end of a short row
+    are missing, as with the OrderedDicts of the default mode.
+    """
+
+    __slots__ = ('index', 'cells')
+
+    def __init__(self, index, cells):
+        self.index = index
+        self.cells = cells
+
+    def __getitem__(self, key):
+        position = self.index[key]
+        if position >= len(self.cells):
+            raise KeyError(key)
+        return self.cells[position].strip()
+
+    def get(self, key, default=None):
+        position = self.index.get(key)
+        if position is None or position >= len(self.cells):
+            return default
+        return self.cells[position].strip()
+
+    def __contains__(self, key):
+        position = self.index.get(key)
+        return position is not None and position < len(self.cells)
+
+    def __iter__(self):
+        length = len(self.cells)
+        for key, position in six.iteritems(self.index):
+            if position < length:
+                yield key
+
+    def __len__(self):
+        return sum(1 for _ in self)
+
+    def keys(self):
+        return list(self)
+
+    def values(self):
+        return [self[key] for key in self]
+
+    def items(self):
+        return [(key, self[key]) for key in self]
+
+    def __eq__(self, other):
+        if not isinstance(other, collections.Mapping):
+            return NotImplemented
+        return dict(self.items()) == dict(other.items())
+
+    def __ne__(self, other):
+        equal = self.__eq__(other)
+        return equal if equal is NotImplemented else not equal
+
+    __hash__ = None
+
+    def __repr__(self):
+        return '{}({!r})'.format(self.__class__.__name__, self.items())
+
+
+collections.Mapping.register(CsvRow)
+
+
 class CsvReader(object):
     """
     This object reads `fname`, a csv file, and can iterate over the rows.
@@ -35,18 +106,29 @@ class CsvReader(object):
 
     - get_name(name): returns the "canonical" name (if overriden)
       The default returns name unchanged.
+
+    If `fast` is set, the csv module handles the line endings itself, so
+    quoted cells keep their line breaks, and rows are CsvRow records that
+    share a single column index instead of OrderedDicts.
     """
 
-    def __init__(self, fname):
+    def __init__(self, fname, fast=False):
         self.fname = fname
+        self.fast = fast
         self.attributes = []
         self.reader = None
+        self.index = None
 
     def __iter__(self):
         if not self.attributes:
             self.load_attributes()
-        for row in self.reader:
-            yield self.get_row(row)
+        if self.fast:
+            index = self.index
+            for row in self.reader:
+                yield CsvRow(index, row)
+        else:
+            for row in self.reader:
+                yield self.get_row(row)
 
     def get_name(self, name):
         return name
@@ -59,6 +141,19 @@ class CsvReader(object):
             fname.seek(0)
         return csv.reader(filtered)
 
+    @staticmethod
+    def get_fast_reader(fname):
+        if isinstance(fname, str):
+            if six.PY2:
+                fi = open(fname, 'rU')
+            else:
+                fi = open(fname, 'r', newline='')
+        else:
+            fi = fname
+        if hasattr(fname, 'seek'):
+            fname.seek(0)
+        return csv.reader(fi)
+
     def get_row(self, row):
         return collections.OrderedDict(zip(
                 self.attributes,
@@ -67,7 +162,13 @@ class CsvReader(object):
     def load_attributes(self):
         if not self.reader:
             self.load_reader()
-        self.attributes = [self.get_name(c) for c in self.reader.next()]
+        self.attributes = [self.get_name(c) for c in next(self.reader)]
+        self.index = collections.OrderedDict()
+        for position, name in enumerate(self.attributes):
+            self.index[name] = position
 
     def load_reader(self):
-        self.reader = self.get_reader(self.fname)
+        if self.fast:
+            self.reader = self.get_fast_reader(self.fname)
+        else:
+            self.reader = self.get_reader(self.fname)
@@ -3,9 +3,10 @@
 #
 
 
-import simplejson
 import six
 
+from .backends import load_json
+
 
 __all__ = ('JsonReader',)
 
@@ -22,12 +23,14 @@ class JsonReader(object):
         ... data ready for processing
 
     `fname` is either a filename, an open file object, or any object suitable
-    for `json.load`.
+    for `json.load`, and is parsed by the selected JSON backend (see
+    backends.py). If `fname` was parsed before, its parsed document can be
+    passed as `document`, and `fname` is not read again.
     """
 
-    def __init__(self, fname):
+    def __init__(self, fname, document=None):
         self.fname = fname
-        self.reader = None
+        self.reader = document
         self.data = {}
 
     @staticmethod
@@ -36,13 +39,13 @@ class JsonReader(object):
                 if isinstance(fname, six.string_types) else fname
         if hasattr(fi, 'seek'):
             fi.seek(0)
-        return simplejson.load(fi)
+        return load_json(fi)
 
     def load_reader(self):
         self.reader = self.get_reader(self.fname)
 
     def process(self):
-        if not self.reader:
+        if self.reader is None:
             self.load_reader()
         self.data = self.processor(self.reader)
 
@@ -0,0 +1,299 @@
+#
+# Copyright (c) 2016, Prometheus Research, LLC
+#
+# Incremental JSON reader.
+#
+# JsonStream walks a JSON document read from a stream in chunks, one object
+# member or array item at a time. The caller decides, for each value,
+# whether to decode it, to take its JSON text, or to skip it. Skipped values
+# are scanned without being kept, so memory is bounded by the largest value
+# that is decoded rather than by the whole document. Scanning jumps between
+# quotes and brackets with string searches and regular expressions.
+#
+# Values are decoded by the selected JSON backend (see backends.py) straight
+# from the buffer when they are read in full, which runs in C when the
+# backend has a C decoder.
+# Values cut by the end of the buffer are scanned as they are read first.
+
+
+import codecs
+import re
+
+import six
+
+from .backends import json_decoder, loads_json
+
+
+__all__ = (
+    'JsonStream',
+)
+
+
+DEFAULT_CHUNK_SIZE = 65536
+
+# The next quote or bracket
+RE_STRUCTURE = re.compile(r'["{}\[\]]')
+
+# The rest of a number, true, false, or null
+RE_SCALAR = re.compile(r'[^\s,\]}]*')
+
+RE_WHITESPACE = re.compile(r'\s*')
+
+CLOSING = {'{': '}', '[': ']'}
+
+# Characters which may follow a value
+DELIMITERS = frozenset(' \t\n\r,:]}')
+
+DECODER = json_decoder()
+
+
+class JsonStream(object):
+    """
+    Reads a JSON document from `stream`, a filename or a file-like object,
+    `chunk_size` characters at a time.
+
+    Usage:
+
+        document = JsonStream(stream)
+        for key in document.members():
+            if key == 'wanted':
+                value = document.value()
+            else:
+                document.skip()
+
+    members() and items() iterate over the object or array that starts at
+    the current position, and leave it once they are exhausted. Each member
+    or item must be consumed with value(), text(), skip(), or by iterating
+    over it, before the next one is read. A ValueError is raised if the
+    brackets or strings of the document are not balanced, or if a decoded
+    value is not valid JSON.
+
+    Text is read as it comes from the stream; bytes are decoded as UTF-8 on
+    Python 3.
+    """
+
+    def __init__(self, stream, chunk_size=DEFAULT_CHUNK_SIZE):
+        if isinstance(stream, six.string_types):
+            stream = open(stream, 'rU')
+        elif hasattr(stream, 'seek'):
+            stream.seek(0)
+        self.stream = stream
+        self.chunk_size = chunk_size
+        self.charset = None
+        self.buffer = ''
+        self.position = 0
+        # Characters dropped from the start of the buffer
+        self.offset = 0
+        self.eof = False
+        # Start of the value being captured by text(), which is kept in the
+        # buffer; None when nothing is captured
+        self.mark = None
+
+    def read(self):
+        """ Reads a chunk into the buffer; returns False at end of stream """
+
+        if self.eof:
+            return False
+        chunk = self.stream.read(self.chunk_size)
+        if six.PY3 and isinstance(chunk, bytes):
+            if self.charset is None:
+                self.charset = codecs.getincrementaldecoder('utf-8')()
+            chunk = self.charset.decode(chunk, not chunk)
+        if not chunk:
+            self.eof = True
+            return False
+        start = self.position if self.mark is None else self.mark
+        if start:
+            self.buffer = self.buffer[start:]
+            self.position -= start
+            self.offset += start
+            if self.mark is not None:
+                self.mark = 0
+        self.buffer += chunk
+        return True
+
+    def peek(self):
+        """ Returns the next non-blank character, or '' at end of stream """
+
+        while True:
+            match = RE_WHITESPACE.match(self.buffer, self.position)
+            self.position = match.end()
+            if self.position < len(self.buffer):
+                return self.buffer[self.position]
+            if not self.read():
+                return ''
+
+    def expect(self, character):
+        found = self.peek()
+        if found != character:
+            raise ValueError(
+                'Expected {!r} at character {}, got {!r}'.format(
+                    character,
+                    self.offset + self.position,
+                    found or 'end of document',
+                )
+            )
+        self.position += 1
+
+    def scan_string(self):
+        """ Moves past the string whose opening quote is at the position """
+
+        self.position += 1
+        quote = -1
+        while True:
+            if quote < self.position:
+                quote = self.buffer.find('"', self.position)
+            stop = len(self.buffer) if quote < 0 else quote
+            backslash = self.buffer.find('\\', self.position, stop)
+            if backslash >= 0:
+                if backslash + 1 < len(self.buffer):
+                    # The escaped character is skipped
+                    self.position = backslash + 2
+                    continue
+                # The escaped character is in the next chunk
+                self.position = backslash
+            elif quote >= 0:
+                self.position = quote + 1
+                return
+            else:
+                self.position = len(self.buffer)
+            if not self.read():
+                raise ValueError('Unterminated string')
+            quote = -1
+
+    def scan(self):
+        """ Moves past the value that starts at the next character """
+
+        character = self.peek()
+        if character == '"':
+            self.scan_string()
+        elif character in CLOSING:
+            stack = []
+            while True:
+                match = RE_STRUCTURE.search(self.buffer, self.position)
+                if match is None:
+                    self.position = len(self.buffer)
+                    if not self.read():
+                        raise ValueError('Unterminated array or object')
+                    continue
+                self.position = match.start()
+                found = match.group()
+                if found == '"':
+                    self.scan_string()
+                    continue
+                self.position += 1
+                if found in CLOSING:
+                    stack.append(CLOSING[found])
+                elif not stack or stack.pop() != found:
+                    raise ValueError(
+                        'Unexpected {!r} at character {}'.format(
+                            found,
+                            self.offset + self.position - 1,
+                        )
+                    )
+                elif not stack:
+                    return
+        elif character:
+            while True:
+                match = RE_SCALAR.match(self.buffer, self.position)
+                if match.end() < len(self.buffer) or not self.read():
+                    break
+            if match.end() == self.position:
+                raise ValueError(
+                    'Unexpected {!r} at character {}'.format(
+                        character,
+                        self.offset + self.position,
+                    )
+                )
+            self.position = match.end()
+        else:
+            raise ValueError('Unexpected end of document')
+
+    def text(self):
+        """ Returns the JSON text of the next value, and moves past it """
+
+        self.peek()
+        self.mark = self.position
+        try:
+            self.scan()
+            return self.buffer[self.mark:self.position]
+        finally:
+            self.mark = None
+
+    def value(self):
+        """ Decodes the next value, and moves past it """
+
+        self.peek()
+        try:
+            value, end = DECODER.raw_decode(self.buffer, self.position)
+        except ValueError:
+            # Cut by the end of the buffer, or invalid
+            pass
+        else:
+            # A number cut by the end of the buffer decodes as its start,
+            # so the value must be followed by a delimiter
+            if (self.buffer[end:end + 1] in DELIMITERS
+                    or (self.eof and end == len(self.buffer))):
+                self.position = end
+                return value
+        return loads_json(self.text())
+
+    def ahead(self, size):
+        """
+        Returns up to `size` characters of the text already read from the
+        next value on, without moving; it may end anywhere in the value.
+        """
+
+        self.peek()
+        return self.buffer[self.position:self.position + size]
+
+    def skip(self):
+        """ Moves past the next value without keeping it """
+
+        self.scan()
+
+    def separate(self, closing, first):
+        """
+        Moves past the separator before the next member or item, and returns
+        False at the end of the object or array.
+        """
+
+        character = self.peek()
+        if character == closing:
+            self.position += 1
+            return False
+        if not first:
+            self.expect(',')
+        return True
+
+    def members(self):
+        """ Iterates over the keys of the object at the position """
+
+        self.expect('{')
+        first = True
+        while self.separate('}', first):
+            first = False
+            if self.peek() != '"':
+                self.expect('"')
+            key = self.value()
+            self.expect(':')
+            yield key
+
+    def items(self):
+        """ Iterates over the positions of the items of the array """
+
+        self.expect('[')
+        index = 0
+        while self.separate(']', not index):
+            yield index
+            index += 1
+
+    def close(self):
+        """ Checks that nothing but blanks follows the document """
+
+        if self.peek():
+            raise ValueError(
+                'Extra data at character {}'.format(
+                    self.offset + self.position,
+                )
+            )
@@ -0,0 +1,102 @@
+#
+# Copyright (c) 2016, Prometheus Research, LLC
+#
+
+
+import collections
+
+
+__all__ = (
+    'LruTable',
+    'MemoTable',
+)
+
+
+DEFAULT_MAX_SIZE = 65536
+
+
+class MemoTable(object):
+    """
+    Bounded memo table for a function of a single hashable argument.
+
+    Usage:
+
+        names = MemoTable(canonical_name)
+        names('Form Name')  # computed
+        names('Form Name')  # looked up
+
+    Once the table holds `max_size` results, it is emptied before the next
+    result is stored, so memory stays bounded without any bookkeeping on
+    lookups. Exceptions raised by `function` are not stored.
+
+    The ``hits`` and ``misses`` counters record the lookups made so far.
+    """
+
+    def __init__(self, function, max_size=DEFAULT_MAX_SIZE):
+        self.function = function
+        self.max_size = max_size
+        self.table = {}
+        self.hits = 0
+        self.misses = 0
+
+    def __call__(self, key):
+        try:
+            value = self.table[key]
+        except KeyError:
+            self.misses += 1
+            value = self.function(key)
+            if len(self.table) >= self.max_size:
+                self.table.clear()
+            self.table[key] = value
+            return value
+        self.hits += 1
+        return value
+
+    def __len__(self):
+        return len(self.table)
+
+    def clear(self):
+        self.table.clear()
+
+    @property
+    def hit_rate(self):
+        lookups = self.hits + self.misses
+        return (float(self.hits) / lookups) if lookups else 0.0
+
+    @property
+    def stats(self):
+        return {
+            'hits': self.hits,
+            'misses': self.misses,
+            'hit_rate': self.hit_rate,
+            'size': len(self.table),
+        }
+
+
+class LruTable(MemoTable):
+    """
+    Bounded memo table which discards the least recently used result.
+
+    Once the table holds `max_size` results, storing the next one discards
+    the result that was looked up longest ago, so results that keep being
+    looked up stay in the table. Lookups cost a little more than those of
+    MemoTable, which suits functions that are expensive to compute.
+    """
+
+    def __init__(self, function, max_size=DEFAULT_MAX_SIZE):
+        super(LruTable, self).__init__(function, max_size)
+        self.table = collections.OrderedDict()
+
+    def __call__(self, key):
+        table = self.table
+        try:
+            value = table.pop(key)
+        except KeyError:
+            self.misses += 1
+            value = self.function(key)
+            if len(table) >= self.max_size:
+                table.popitem(last=False)
+        else:
+            self.hits += 1
+        table[key] = value
+        return value
@@ -0,0 +1,145 @@
+#
+# Copyright (c) 2016, Prometheus Research, LLC
+#
+
+
+import collections
+import timeit
+
+
+__all__ = (
+    'ConversionMetrics',
+    'NULL_METRICS',
+)
+
+
+# Conversion phases, in the order they occur
+PHASES = (
+    'read',
+    'process',
+    'finalize',
+    'validate',
+    'serialize',
+)
+
+# Counters of the converted data
+COUNTERS = (
+    'rows',
+    'fields',
+    'calculations',
+    'warnings',
+    'errors',
+)
+
+
+class _Phase(object):
+    """ Context manager that adds its wall time to a metrics phase """
+
+    __slots__ = ('metrics', 'name', 'start')
+
+    def __init__(self, metrics, name):
+        self.metrics = metrics
+        self.name = name
+        self.start = None
+
+    def __enter__(self):
+        self.start = timeit.default_timer()
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.metrics.add_time(self.name, timeit.default_timer() - self.start)
+        return False
+
+
+class _NullPhase(object):
+    __slots__ = ()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        return False
+
+
+_NULL_PHASE = _NullPhase()
+
+
+class ConversionMetrics(object):
+    """
+    Records the wall time and count of each conversion phase, and counters of
+    the converted data.
+
+    Usage:
+
+        metrics = ConversionMetrics()
+        with metrics.phase('read'):
+            ...
+        metrics.count('rows')
+
+    Phases are ``read``, ``process`` (row/page processing), ``finalize``,
+    ``validate``, and ``serialize``. Counters are ``rows``, ``fields``,
+    ``calculations``, ``warnings``, and ``errors``. Other names may be used
+    for either and are reported too.
+    """
+
+    __slots__ = ('times', 'calls', 'counters')
+
+    enabled = True
+
+    def __init__(self):
+        self.times = collections.OrderedDict((p, 0.0) for p in PHASES)
+        self.calls = collections.OrderedDict((p, 0) for p in PHASES)
+        self.counters = collections.OrderedDict((c, 0) for c in COUNTERS)
+
+    def phase(self, name):
+        return _Phase(self, name)
+
+    def add_time(self, name, elapsed):
+        self.times[name] = self.times.get(name, 0.0) + elapsed
+        self.calls[name] = self.calls.get(name, 0) + 1
+
+    def count(self, name, n=1):
+        self.counters[name] = self.counters.get(name, 0) + n
+
+    def set(self, name, value):
+        self.counters[name] = value
+
+    def as_dict(self):
+        """
+        Returns a dict with a ``phases`` key mapping each phase to its total
+        ``time`` in seconds and ``count``, and a ``counters`` key.
+        """
+
+        return {
+            'phases': dict(
+                (name, {'time': time, 'count': self.calls[name]})
+                for name, time in self.times.items()
+            ),
+            'counters': dict(self.counters),
+        }
+
+
+class NullMetrics(object):
+    """ Metrics that record nothing, used when metrics are not requested """
+
+    __slots__ = ()
+
+    enabled = False
+
+    def phase(self, name):
+        return _NULL_PHASE
+
+    def add_time(self, name, elapsed):
+        pass
+
+    def count(self, name, n=1):
+        pass
+
+    def set(self, name, value):
+        pass
+
+    def as_dict(self):
+        return {}
+
+
+NULL_METRICS = NullMetrics()
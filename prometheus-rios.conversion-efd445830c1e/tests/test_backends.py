@@ -0,0 +1,112 @@
+import json
+import os
+import shutil
+import sys
+import tempfile
+import types
+
+import yaml
+
+from rios.conversion import (
+    rios_to_qualtrics,
+    rios_to_qualtrics_files,
+    rios_to_redcap,
+    rios_to_redcap_files,
+)
+from rios.conversion.exception import ConversionFailureError
+from rios.conversion.utils import backends, load_definition
+
+
+def rios_files(name):
+    return [
+        './tests/rios/%s_%s.yaml' % (name, suffix)
+        for suffix in ('i', 'f', 'c')
+    ]
+
+
+def test_backends_selected():
+    selected = backends.describe()
+    assert selected['json'] in (
+        'simplejson',
+        'json',
+        'simplejson (python)',
+        'json (python)',
+    )
+    if yaml.__with_libyaml__:
+        assert selected['yaml'] == 'libyaml'
+        assert backends.YamlLoader is yaml.CSafeLoader
+    else:
+        assert selected['yaml'] == 'python'
+        assert backends.YamlLoader is yaml.SafeLoader
+
+
+def test_select_json_fallback():
+    assert backends.select_json(('no_such_json', 'json'))[0] in (
+        'json',
+        'json (python)',
+    )
+    # A module without a C decoder is only used when no other one has one
+    module = types.ModuleType('python_json')
+    sys.modules['python_json'] = module
+    try:
+        assert backends.select_json(('python_json',)) == (
+            'python_json (python)',
+            module,
+        )
+        name, selected = backends.select_json(('python_json', 'json'))
+        if name == 'json':
+            assert selected is json
+        else:
+            assert selected is module
+    finally:
+        del sys.modules['python_json']
+    try:
+        backends.select_json(('no_such_json',))
+    except ImportError:
+        pass
+    else:
+        assert False, 'expected an ImportError'
+
+
+def test_load_definition():
+    instrument, form, calculationset = rios_files('test_1')
+    with open(form, 'r') as stream:
+        expected = yaml.safe_load(stream)
+    assert load_definition(form) == expected
+
+    directory = tempfile.mkdtemp()
+    try:
+        filename = os.path.join(directory, 'test_1_f.json')
+        with open(filename, 'w') as stream:
+            json.dump(expected, stream)
+        assert load_definition(filename) == expected
+    finally:
+        shutil.rmtree(directory)
+
+
+def test_rios_files():
+    filenames = rios_files('test_1')
+    definitions = [load_definition(filename) for filename in filenames]
+    assert rios_to_redcap_files(*filenames) == rios_to_redcap(*definitions)
+    assert rios_to_qualtrics_files(*filenames, localization='en') \
+        == rios_to_qualtrics(*definitions, localization='en')
+
+    # The calculationset is optional
+    package = rios_to_redcap_files(filenames[0], filenames[1])
+    assert package['instrument']
+
+
+def test_rios_files_failure():
+    instrument, form, calculationset = rios_files('test_1')
+    package = rios_to_redcap_files(
+        instrument,
+        './tests/rios/missing_f.yaml',
+        suppress=True,
+    )
+    assert package['failure'].startswith('Unable to read RIOS definitions')
+    try:
+        rios_to_qualtrics_files(instrument, './tests/rios/missing_f.yaml')
+    except ConversionFailureError:
+        pass
+    else:
+        assert False, 'expected a ConversionFailureError'
@@ -0,0 +1,291 @@
+import csv
+import glob
+import json
+import os
+import shutil
+import six
+import tempfile
+
+
+from rios.conversion import (
+    ConversionJob,
+    convert_many,
+    rios_to_redcap_files,
+)
+from rios.conversion.cli import main
+from rios.conversion.exception import ConversionFailureError
+
+
+def batch_jobs(**options):
+    jobs = []
+    for name in sorted(glob.glob('./tests/redcap/*.csv')):
+        jobs.append(ConversionJob(
+            'redcap',
+            name,
+            id='urn:batch-redcap',
+            title='batch',
+            description='',
+            **options
+        ))
+    for name in sorted(glob.glob('./tests/qualtrics/*.qsf')):
+        jobs.append(ConversionJob(
+            'qualtrics',
+            name,
+            id='urn:batch-qualtrics',
+            title='batch',
+            description='',
+            **options
+        ))
+    return jobs
+
+
+def test_convert_many():
+    jobs = batch_jobs(suppress=True)
+    results = list(convert_many(jobs, processes=2))
+    assert sorted(r.index for r in results) == list(range(len(jobs)))
+    for result in results:
+        assert result.job.stream == jobs[result.index].stream
+        assert result.elapsed >= 0
+        if result.failure:
+            assert 'instrument' not in result.package
+        else:
+            assert result.package['instrument']
+            assert result.package['form']
+    assert any(r.failure for r in results)
+    assert any(not r.failure for r in results)
+
+
+def without_cache_logs(package):
+    # The expression cache hit rate depends on the jobs a process ran before
+    package = dict(package)
+    if 'logs' in package:
+        package['logs'] = [
+            log for log in package['logs']
+            if not log.startswith('INFO: Expression cache:')
+        ]
+    return package
+
+
+def test_convert_many_in_process():
+    jobs = batch_jobs(suppress=True)
+    pooled = dict(
+        (r.index, without_cache_logs(r.package))
+        for r in convert_many(jobs, processes=2)
+    )
+    for result in convert_many(jobs, processes=1):
+        assert without_cache_logs(result.package) == pooled[result.index]
+
+
+def test_convert_many_failure():
+    jobs = [ConversionJob(
+        'redcap',
+        './tests/redcap/bad_format.csv',
+        id='urn:batch-redcap',
+        title='batch',
+        description='',
+    )]
+    try:
+        list(convert_many(jobs, processes=2))
+    except ConversionFailureError as exc:
+        assert 'Unknown input CSV header format' in str(exc)
+    else:
+        assert False, 'Non-suppressed job failures must be raised'
+
+
+def test_convert_many_missing_file():
+    jobs = [ConversionJob('redcap', './tests/redcap/missing.csv',
+                          id='urn:batch-redcap', title='batch',
+                          description='', suppress=True)]
+    result, = convert_many(jobs, processes=1)
+    assert 'Unable to read conversion input' in result.failure
+
+
+def test_convert_many_unicode():
+    output = tempfile.mkdtemp()
+    try:
+        definitions = {
+            'i': {
+                'id': 'urn:cafe',
+                'version': '1.0',
+                'title': 'Cafe',
+                'record': [{'id': 'open', 'type': {
+                    'base': 'enumeration',
+                    'enumerations': {'yes': {}, 'no': {}},
+                }}],
+            },
+            'f': {
+                'instrument': {'id': 'urn:cafe', 'version': '1.0'},
+                'defaultLocalization': 'en',
+                'pages': [{'id': 'page1', 'elements': [{
+                    'type': 'question',
+                    'options': {
+                        'fieldId': 'open',
+                        'text': {'en': u'Caf\xe9 open?'},
+                        'enumerations': [
+                            {'id': 'yes', 'text': {'en': 'Yes'}},
+                            {'id': 'no', 'text': {'en': 'No'}},
+                        ],
+                    },
+                }]}],
+            },
+        }
+        filenames = {}
+        for suffix, definition in definitions.items():
+            filenames[suffix] = os.path.join(output, 'cafe_%s.json' % suffix)
+            with open(filenames[suffix], 'w') as stream:
+                json.dump(definition, stream)
+        jobs = [
+            ConversionJob(
+                'rios',
+                filenames['i'],
+                target=target,
+                form=filenames['f'],
+                output=os.path.join(output, 'cafe'),
+                suppress=True,
+            )
+            for target in ('redcap', 'qualtrics')
+        ]
+        results = sorted(
+            convert_many(jobs, processes=1),
+            key=lambda result: result.index,
+        )
+        assert [result.failure for result in results] == [None, None]
+        with open(os.path.join(output, 'cafe.csv'), 'rb') as stream:
+            assert u'Caf\xe9'.encode('utf-8') in stream.read()
+        with open(os.path.join(output, 'cafe.txt'), 'rb') as stream:
+            assert u'Caf\xe9'.encode('utf-8') in stream.read()
+    finally:
+        shutil.rmtree(output)
+
+
+def test_convert_many_write_failure():
+    jobs = [ConversionJob('redcap', './tests/redcap/matrix_1.csv',
+                          id='urn:batch-redcap', title='batch',
+                          description='', suppress=True,
+                          output='./tests/redcap/missing/matrix_1')]
+    result, = convert_many(jobs, processes=1)
+    assert 'Unable to write conversion output' in result.failure
+
+
+def test_cli():
+    output = tempfile.mkdtemp()
+    stdout, stderr = six.StringIO(), six.StringIO()
+    try:
+        status = main(
+            ['redcap-to-rios', './tests/redcap', '-o', output, '-j', '2'],
+            stdout=stdout,
+            stderr=stderr,
+        )
+        assert status == 1
+        assert 'bad_format.csv' in stderr.getvalue()
+        assert os.path.exists(os.path.join(output, 'matrix_1_i.yaml'))
+        assert os.path.exists(os.path.join(output, 'matrix_1_f.yaml'))
+
+        status = main(
+            ['rios-to-redcap', os.path.join(output, 'matrix_1_i.yaml'),
+             '-o', output, '-j', '1'],
+            stdout=stdout,
+            stderr=stderr,
+        )
+        assert status == 0
+        with open(os.path.join(output, 'matrix_1.csv')) as stream:
+            rows = list(csv.reader(stream))
+        assert rows[0][0] == 'Variable / Field Name'
+        assert len(rows) > 1
+    finally:
+        shutil.rmtree(output)
+
+
+def test_cli_compact_json():
+    output = tempfile.mkdtemp()
+    stdout, stderr = six.StringIO(), six.StringIO()
+    try:
+        status = main(
+            ['redcap-to-rios', './tests/redcap/matrix_1.csv', '-o', output,
+             '-j', '1', '-f', 'json', '--compact'],
+            stdout=stdout,
+            stderr=stderr,
+        )
+        assert status == 0
+        with open(os.path.join(output, 'matrix_1_i.json')) as stream:
+            text = stream.read()
+        assert '\n' not in text
+        assert json.loads(text)['id'] == 'urn:matrix-1'
+    finally:
+        shutil.rmtree(output)
+
+
+def test_cli_subdirectories():
+    source = tempfile.mkdtemp()
+    output = tempfile.mkdtemp()
+    stdout, stderr = six.StringIO(), six.StringIO()
+    try:
+        for name in ('a', 'b'):
+            os.mkdir(os.path.join(source, name))
+            shutil.copy(
+                './tests/redcap/matrix_1.csv',
+                os.path.join(source, name, 'form.csv'),
+            )
+        status = main(
+            ['redcap-to-rios', source, '-o', output, '-j', '1'],
+            stdout=stdout,
+            stderr=stderr,
+        )
+        assert status == 0
+        for name in ('a', 'b'):
+            assert os.path.exists(os.path.join(output, name, 'form_i.yaml'))
+            assert os.path.exists(os.path.join(output, name, 'form_f.yaml'))
+
+        # Inputs that would be written to the same output are refused
+        status = main(
+            ['redcap-to-rios',
+             os.path.join(source, 'a', 'form.csv'),
+             os.path.join(source, 'b', 'form.csv'),
+             '-o', output],
+            stdout=stdout,
+            stderr=stderr,
+        )
+        assert status == 2
+        assert 'would both be written to' in stderr.getvalue()
+    finally:
+        shutil.rmtree(source)
+        shutil.rmtree(output)
+
+
+def test_convert_many_streamed():
+    output = tempfile.mkdtemp()
+    try:
+        package = rios_to_redcap_files(
+            './tests/rios/test_1_i.yaml',
+            './tests/rios/test_1_f.yaml',
+        )
+        expected = [row for rows in package['instrument'] for row in rows]
+        jobs = [
+            ConversionJob(
+                'rios',
+                './tests/rios/%s_i.yaml' % name,
+                target='redcap',
+                form='./tests/rios/%s_f.yaml' % name,
+                output=os.path.join(output, name),
+                suppress=True,
+            )
+            for name in ('test_1', 'matrix_bad_column')
+        ]
+        assert all(job.streams_output for job in jobs)
+        results = sorted(
+            convert_many(jobs, processes=1),
+            key=lambda result: result.index,
+        )
+        assert results[0].package['outputs'] == [
+            os.path.join(output, 'test_1.csv'),
+        ]
+        with open(os.path.join(output, 'test_1.csv')) as stream:
+            assert list(csv.reader(stream)) == expected
+
+        # The output of a failed conversion is removed
+        assert results[1].failure
+        assert not os.path.exists(
+            os.path.join(output, 'matrix_bad_column.csv')
+        )
+    finally:
+        shutil.rmtree(output)
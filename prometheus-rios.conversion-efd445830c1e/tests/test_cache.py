@@ -0,0 +1,135 @@
+import io
+import os
+import shutil
+import tempfile
+import yaml
+
+
+from rios.conversion import redcap_to_rios, rios_to_redcap
+from rios.conversion.utils import ConversionCache
+from rios.conversion.utils.cache import CHUNK_SIZE
+
+
+def convert(cache, **arguments):
+    with open('./tests/redcap/matrix_1.csv', 'r') as stream:
+        return redcap_to_rios(
+            id=arguments.get('id', 'urn:cache-test'),
+            title='cache',
+            description='',
+            stream=stream,
+            cache=cache,
+        )
+
+
+def test_conversion_cache():
+    directory = tempfile.mkdtemp()
+    try:
+        cache = ConversionCache(directory)
+        first = convert(cache)
+        assert cache.stats == {'hits': 0, 'misses': 1, 'hit_rate': 0.0}
+        second = convert(cache)
+        assert cache.hits == 1
+        assert first == second
+        convert(cache, id='urn:cache-other')
+        assert cache.misses == 2
+
+        # A separate instance shares the stored packages
+        other = ConversionCache(directory)
+        assert convert(other) == first
+        assert other.hits == 1
+    finally:
+        shutil.rmtree(directory)
+
+
+def test_conversion_cache_from_rios():
+    directory = tempfile.mkdtemp()
+    try:
+        cache = ConversionCache(directory)
+        instrument = yaml.safe_load(open('./tests/rios/matrix_1_i.yaml'))
+        form = yaml.safe_load(open('./tests/rios/matrix_1_f.yaml'))
+        first = rios_to_redcap(instrument, form, cache=cache)
+        second = rios_to_redcap(instrument, form, cache=cache)
+        assert cache.hits == 1
+        assert [list(r) for r in first['instrument'][0]] \
+            == [list(r) for r in second['instrument'][0]]
+    finally:
+        shutil.rmtree(directory)
+
+
+def test_conversion_cache_eviction():
+    directory = tempfile.mkdtemp()
+    try:
+        cache = ConversionCache(directory, max_size=1500)
+        for i in range(5):
+            cache.set('key%d' % i, {'data': 'x' * 500})
+            os.utime(cache.get_filename('key%d' % i), (i, i))
+        cache.evict()
+        names = sorted(os.listdir(directory))
+        assert names == ['key3.pickle', 'key4.pickle'], names
+        assert cache.get('key0') is None
+        assert cache.get('key4') == {'data': 'x' * 500}
+    finally:
+        shutil.rmtree(directory)
+
+
+class Unseekable(object):
+    def __init__(self, data):
+        self.stream = io.BytesIO(data)
+
+    def read(self, size=-1):
+        return self.stream.read(size)
+
+
+def test_stream_key():
+    directory = tempfile.mkdtemp()
+    try:
+        cache = ConversionCache(directory)
+        data = b'x' * (CHUNK_SIZE * 2 + 10)
+        key = cache.make_key('kind', data, id='urn:a')
+
+        stream = io.BytesIO(data)
+        stream.read(5)
+        assert cache.stream_key('kind', stream, id='urn:a') == (key, stream)
+        assert stream.tell() == 0
+
+        unseekable = Unseekable(data)
+        found, replay = cache.stream_key('kind', unseekable, id='urn:a')
+        assert found == key
+        assert replay.read() == data
+
+        filename = os.path.join(directory, 'input.csv')
+        with open(filename, 'wb') as stream:
+            stream.write(data)
+        found, replay = cache.stream_key('kind', filename, id='urn:a')
+        assert found == key
+        with replay:
+            assert replay.read() == data.decode('utf-8')
+    finally:
+        shutil.rmtree(directory)
+
+
+def test_conversion_cache_eviction_threshold():
+    directory = tempfile.mkdtemp()
+    try:
+        cache = ConversionCache(directory, max_size=1500)
+        scans = []
+        evict = cache.evict
+
+        def count_scans():
+            scans.append(1)
+            evict()
+
+        cache.evict = count_scans
+        for i in range(5):
+            cache.set('key%d' % i, {'data': 'x' * 500})
+        # The directory is scanned for the first package, and then only
+        # once the stored packages pass max_size
+        assert len(scans) < 5
+        size = sum(
+            os.path.getsize(os.path.join(directory, name))
+            for name in os.listdir(directory)
+        )
+        assert size <= 1500
+        assert cache.get('key4') == {'data': 'x' * 500}
+    finally:
+        shutil.rmtree(directory)
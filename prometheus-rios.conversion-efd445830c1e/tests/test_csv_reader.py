@@ -0,0 +1,37 @@
+import six
+
+from rios.conversion.utils import CsvReader
+
+
+def test_fast_rows_match():
+    for filename in ('./tests/redcap/complex_1.csv',
+                     './tests/redcap/matrix_1.csv'):
+        with open(filename, 'r') as stream:
+            rows = list(CsvReader(stream))
+        with open(filename, 'r') as stream:
+            fast_rows = list(CsvReader(stream, fast=True))
+        assert len(rows) == len(fast_rows)
+        for row, fast_row in zip(rows, fast_rows):
+            assert fast_row == row
+            assert fast_row.keys() == list(row.keys())
+
+
+def test_fast_row_access():
+    stream = six.StringIO(
+        'name,label,note\n'
+        ' a ,"First\nline",x\n'
+        'b\n'
+    )
+    first, short = list(CsvReader(stream, fast=True))
+    assert first['name'] == 'a'
+    assert first['label'] == 'First\nline'
+    assert not hasattr(first, '__dict__')
+    assert 'label' not in short
+    assert short.get('label', '') == ''
+    assert len(short) == 1
+    try:
+        short['note']
+    except KeyError:
+        pass
+    else:
+        assert False, 'missing cell was returned'
@@ -0,0 +1,136 @@
+from rios.conversion import redcap_to_rios
+from rios.conversion.engine import (
+    CalculationEngine,
+    DependencyGraph,
+    assessment_values,
+)
+from rios.conversion.exception import ConversionValueError
+
+
+def calculationset(*expressions):
+    return {
+        'instrument': {'id': 'urn:test-engine', 'version': '1.0'},
+        'calculations': [
+            {
+                'id': name,
+                'description': name,
+                'type': 'float',
+                'method': 'python',
+                'options': {'expression': expression},
+            }
+            for name, expression in expressions
+        ],
+    }
+
+
+def test_redcap_package():
+    with open('./tests/redcap/complex_1.csv', 'r') as stream:
+        package = redcap_to_rios(
+            id='urn:test-engine',
+            title='engine',
+            description='',
+            stream=stream,
+        )
+    engine = CalculationEngine(package)
+    result = engine.evaluate([
+        {'dob': '1980-01-02', 'weight': 70, 'height': 175},
+        {'dob': '1980-01-02', 'weight': 70},
+    ])
+    assert result.values[0]['bmi'] == 22.9
+    assert result.values[1]['bmi'] is None
+    assert [(e.index, e.calculation) for e in result.errors] == [(1, 'bmi')]
+    assert list(result.timings) == ['age', 'bmi']
+
+
+def test_order():
+    engine = CalculationEngine(calculationset(
+        ('total', 'calculations["double"] + calculations["half"]'),
+        ('double', 'calculations["base"] * 2'),
+        ('base', 'assessment["a"] + 1'),
+        ('half', "calculations['base'] / 2.0"),
+    ))
+    assert [c.id for c in engine.order] == ['base', 'double', 'half', 'total']
+    assert engine.evaluate_record({'a': 3}) == {
+        'base': 4.0,
+        'double': 8.0,
+        'half': 2.0,
+        'total': 10.0,
+    }
+
+
+def test_invalid():
+    for expressions in (
+            [('a', 'calculations["b"]'), ('b', 'calculations["a"]')],
+            [('a', 'calculations["a"] + 1')],
+            [('a', 'calculations["missing"]')],
+            [('a', 'assessment["x"] +')]):
+        try:
+            CalculationEngine(calculationset(*expressions))
+        except ConversionValueError:
+            pass
+        else:
+            assert False, 'accepted: {}'.format(expressions)
+
+
+def test_assessment_document():
+    document = {
+        'instrument': {'id': 'urn:test-engine', 'version': '1.0'},
+        'values': {'a': {'value': 2}, 'b': {'value': None}},
+    }
+    assert assessment_values(document) == {'a': 2, 'b': None}
+    engine = CalculationEngine(calculationset(('x', 'assessment["a"] * 3')))
+    assert engine.evaluate([document]).values == [{'x': 6.0}]
+    try:
+        engine.evaluate_record({'b': 1})
+    except ConversionValueError:
+        pass
+    else:
+        assert False, 'missing value accepted'
+
+
+def test_graph():
+    graph = DependencyGraph(calculationset(
+        ('total', 'calculations["double"] + assessment["b"]'),
+        ('double', 'calculations["base"] * 2'),
+        ('base', 'assessment["a"] + assessment[\'b\']'),
+        ('other', 'assessment["c"]'),
+    ))
+    assert graph.order == ('base', 'double', 'total', 'other')
+    assert graph.fields == {
+        'a': ('base',),
+        'b': ('total', 'base'),
+        'c': ('other',),
+    }
+    assert graph.dependents['base'] == ('double',)
+    assert graph.affected(['a']) == ('base', 'double', 'total')
+    assert graph.affected(['c']) == ('other',)
+    assert graph.affected(['x']) == ()
+    assert graph.affected(calculations=['double']) == ('double', 'total')
+
+
+def test_update():
+    engine = CalculationEngine(calculationset(
+        ('total', 'calculations["double"] + assessment["b"]'),
+        ('double', 'calculations["base"] * 2'),
+        ('base', 'assessment["a"] + 1'),
+        ('other', 'assessment["c"] * 1'),
+    ))
+    record = {'a': 1, 'b': 10, 'c': 5}
+    values = engine.evaluate_record(record)
+    assert values['total'] == 14.0
+    record['b'] = 20
+    assert engine.update(record, values, ['b']) == ('total',)
+    assert values == {'base': 2.0, 'double': 4.0, 'total': 24.0, 'other': 5}
+    record['a'] = 2
+    record['c'] = 'stale'
+    assert engine.update(record, values, ['a']) == ('base', 'double', 'total')
+    assert values['total'] == 26.0
+    assert values['other'] == 5
+    assert engine.update(record, values, ['unused']) == ()
+    record['a'] = None
+    try:
+        engine.update(record, values, ['a'])
+    except ConversionValueError:
+        pass
+    else:
+        assert False, 'missing value accepted'
@@ -0,0 +1,102 @@
+import copy
+import json
+import sys
+
+import six
+import yaml
+
+from rios.conversion.base import (
+    export_definition,
+    write_definition,
+    structures,
+    write_json,
+    write_yaml,
+)
+
+from utils import convert
+
+
+def test_export_matches_clean():
+    converter = convert('./tests/redcap/complex_1.csv')
+    for definition in (converter._instrument, converter._form):
+        expected = copy.deepcopy(definition).clean().as_dict()
+        assert export_definition(definition) == expected
+
+
+def test_export_empty_values():
+    field = structures.FieldObject(id='f1', type='text', description='')
+    field['description']
+    assert export_definition(field) == {
+        'id': 'f1',
+        'type': 'text',
+        'identifiable': False,
+        'required': False,
+    }
+    question = structures.QuestionObject(fieldId='q1')
+    question.add_enumeration(structures.DescriptorObject(id=''))
+    question.add_event(structures.EventObject(targets=['a', 'b']))
+    assert export_definition(question) == {
+        'fieldId': 'q1',
+        'events': [{'targets': ['a', 'b']}],
+    }
+
+
+def test_export_deep():
+    depth = sys.getrecursionlimit() * 2
+    root = structures.LocalizedStringObject()
+    child = root
+    for _ in range(depth):
+        child['child'] = structures.LocalizedStringObject()
+        child = child['child']
+    child['en'] = 'leaf'
+    stream = six.StringIO()
+    write_json(root, stream)
+    assert stream.getvalue() == (
+        '{"child": ' * depth + '{"en": "leaf"}' + '}' * depth
+    )
+
+
+def test_write_json():
+    converter = convert('./tests/redcap/matrix_1.csv')
+    expected = export_definition(converter._form)
+    for indent in (None, 2):
+        stream = six.StringIO()
+        write_json(converter._form, stream, indent=indent)
+        assert json.loads(stream.getvalue()) == expected
+
+
+def test_write_yaml():
+    converter = convert('./tests/redcap/matrix_1.csv')
+    stream = six.StringIO()
+    write_yaml(converter._form, stream)
+    assert yaml.safe_load(stream.getvalue()) == export_definition(
+        converter._form
+    )
+
+
+def test_write_package():
+    converter = convert('./tests/redcap/matrix_1.csv')
+    expected = {
+        'instrument': converter.instrument,
+        'form': converter.form,
+    }
+    for compact in (False, True):
+        stream = six.StringIO()
+        converter.write_package(stream, 'json', compact=compact)
+        assert json.loads(stream.getvalue()) == expected
+        stream = six.StringIO()
+        converter.write_package(stream, 'yaml', compact=compact)
+        assert yaml.safe_load(stream.getvalue()) == expected
+    assert '\n' not in stream.getvalue().strip()
+
+
+def test_write_definition_dict():
+    stream = six.StringIO()
+    write_definition({'b': [1, {'c': ''}], 'a': ''}, stream, compact=True)
+    assert stream.getvalue() == '{"b":[1]}'
+    try:
+        write_definition({}, stream, 'xml')
+    except ValueError:
+        pass
+    else:
+        assert False, 'invalid format was accepted'
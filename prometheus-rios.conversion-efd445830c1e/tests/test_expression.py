@@ -0,0 +1,214 @@
+import six
+
+from rios.conversion import redcap_to_rios, rios_to_redcap
+from rios.conversion.engine import CalculationEngine
+from rios.conversion.exception import ConversionValueError
+from rios.conversion.redcap.expression import (
+    parse,
+    to_python,
+    to_redcap,
+    to_rexl,
+    tokenize,
+    translate_text,
+)
+
+
+def python(text, calculations=(), get_name=None):
+    return to_python(parse(text), calculations, get_name)
+
+
+def test_tokenize():
+    assert [token[:2] for token in tokenize('[a] <> "x" AND 1.5')] == [
+        ('field', '[a]'),
+        ('operator', '<>'),
+        ('string', '"x"'),
+        ('operator', 'and'),
+        ('number', '1.5'),
+    ]
+
+
+def test_references():
+    assert python('[a] + [c]', calculations={'c'}) == \
+        'assessment["a"] + calculations["c"]'
+    assert python('[event_1][a]') == 'event_1["a"]'
+    assert python('[chk(1)]', get_name=lambda n: 'id_' + n) == \
+        '("id_1" in assessment["chk"])'
+
+
+def test_checkbox_comparisons():
+    def get_name(code):
+        return 'id_' + code
+
+    for text, checked in (("[chk(1)] = '1'", True),
+                          ("[chk(1)] = 1", True),
+                          ("'0' = ([chk(1)])", False),
+                          ("[chk(1)] <> '1'", False),
+                          ("[chk(1)] <> 0", True)):
+        expression = python(text, get_name=get_name)
+        assert expression == '("id_1" %s assessment["chk"])' % (
+            'in' if checked else 'not in'
+        )
+        engine = CalculationEngine({'calculations': [{
+            'id': 'score',
+            'type': 'float',
+            'method': 'python',
+            'options': {
+                'expression': python(
+                    'if(%s, 1, 0)' % text,
+                    get_name=get_name,
+                ),
+            },
+        }]})
+        result = engine.evaluate([{'chk': ['id_1']}, {'chk': ['id_2']}])
+        assert [values['score'] for values in result.values] == (
+            [1.0, 0.0] if checked else [0.0, 1.0]
+        )
+    assert python("[chk(1)] = '2'") == '("1" in assessment["chk"]) == \'2\''
+
+
+def test_functions_and_operators():
+    assert python('round(([w]*10000)/(([h])^(2)),1)') == (
+        'rios.conversion.redcap.functions.round_('
+        '(assessment["w"] * 10000) / (math.pow(assessment["h"], 2)), 1)'
+    )
+    assert python('[a]^2^3') == 'math.pow(math.pow(assessment["a"], 2), 3)'
+    assert python('median([a], [b])') == \
+        'rios.conversion.redcap.functions.median(assessment["a"], ' \
+        'assessment["b"])'
+    assert python('if([a] > 1, 2, 3)') == '(2 if assessment["a"] > 1 else 3)'
+    assert python('[a] <> "1" OR not [b] = -1') == \
+        'assessment["a"] != "1" or not assessment["b"] == -1'
+
+
+def test_rexl():
+    node = parse('[sex] = "0" and [given_birth] <> "1"')
+    assert to_rexl(node) == \
+        'assessment["sex"] = "0" and assessment["given_birth"] != "1"'
+
+
+def test_python_compiles():
+    for text in ('datediff([dob], "today", "y")', '(([a])^(2))*-[b]',
+                 'if([x(2)], [y] / 2, sum([a], [b], [c]))'):
+        compile(python(text), '<calculation>', 'eval')
+
+
+def test_errors():
+    for text in ('', '[a] +', '([a]', 'sum([a],', '[a] [b] $', '[(]'):
+        try:
+            parse(text)
+        except ConversionValueError:
+            pass
+        else:
+            assert False, 'parsed: ' + text
+
+
+def test_translate_text():
+    assert translate_text('[a] % ([b])^(2) <> [c]', {'c'}) == \
+        'assessment["a"] % math.pow(assessment["b"], 2) != calculations["c"]'
+    assert translate_text('[ev][a] + sum([b], 1)') == \
+        'ev["a"] + rios.conversion.redcap.functions.sum_(assessment["b"], 1)'
+
+
+def test_unparsed_expressions():
+    stream = six.StringIO(
+        'Variable / Field Name,Form Name,Section Header,Field Type,'
+        'Field Label,"Choices, Calculations, OR Slider Labels",Field Note,'
+        'Text Validation Type OR Show Slider Number,Text Validation Min,'
+        'Text Validation Max,Identifier?,'
+        'Branching Logic (Show field only if...),Required Field?\n'
+        'num,form,,text,Number,,,integer,,,,,\n'
+        'odd,form,,calc,Odd,[num] % 2,,,,,,,\n'
+        'other,form,,text,Other,,,,,,,[num] % 2 = 1,\n'
+    )
+    package = redcap_to_rios(
+        id='urn:test-expression',
+        title='expression',
+        description='',
+        stream=stream,
+    )
+    calculations = package['calculationset']['calculations']
+    assert [calculation['options']['expression']
+            for calculation in calculations] == ['assessment["num"] % 2']
+    events = [
+        element['options']['events']
+        for element in package['form']['pages'][0]['elements']
+        if element['options']['fieldId'] == 'other'
+    ][0]
+    assert events[0]['trigger'] == '!(assessment["num"] % 2 = 1)'
+    warnings = [log for log in package['logs'] if 'as text' in log]
+    assert len(warnings) == 2
+
+
+def test_long_expression():
+    text = ' + '.join('[f%d]' % i for i in range(5000))
+    result = python(text)
+    assert result.count('assessment[') == 5000
+    compile(result, '<calculation>', 'eval')
+
+
+def test_redcap():
+    assert to_redcap(
+        '!(assessment["sex"] = "0" and assessment["given_birth"] != "1")'
+    ) == '!([sex] = "0" and [given_birth] <> "1")'
+    assert to_redcap(
+        'math.pow(math.pow(assessment["a"], 2), min(3, calculations["c"]))'
+    ) == '(([a])^(2))^(min(3, [c]))'
+    assert to_redcap('("1" in assessment["chk"])') == "([chk(1)] = '1')"
+    assert to_redcap('("1" not in assessment["chk"])') == \
+        "([chk(1)] = '0')"
+    assert to_redcap("ev['x'] + (\"2\" in ev['y'])") == \
+        "[ev][x] + ([ev][y(2)] = '1')"
+    assert to_redcap('(1 if assessment["a"] > 2 else (0 if x else 3))') == \
+        'if([a] > 2, 1, if(x, 0, 3))'
+    assert to_redcap('"a != b" + name') == '"a != b" + name'
+
+
+def test_redcap_round_trip():
+    for text in ('round(([w] * 10000) / (([h])^(2)), 1)',
+                 'sum([x], [y] / 2, max([a], [b], [c]))',
+                 '[a] <> "1" or not [b] = -1',
+                 'datediff([dob], "today", "y")',
+                 'if([a] > 1, if([b] = 2, 1, 2), 0) + 1',
+                 "if(([chk(1)] = '1'), 1, 0)",
+                 "if(([chk(1)] = '0') and ([ev][chk(2)] = '1'), [a], 0)"):
+        assert to_redcap(python(text)) == text
+    # The checkbox comparisons are written in their canonical form
+    assert to_redcap(python("if([chk(1)] <> 0, 1, 0)")) == \
+        "if(([chk(1)] = '1'), 1, 0)"
+
+
+def test_redcap_package_round_trip():
+    stream = six.StringIO(
+        'Variable / Field Name,Form Name,Section Header,Field Type,'
+        'Field Label,"Choices, Calculations, OR Slider Labels",Field Note,'
+        'Text Validation Type OR Show Slider Number,Text Validation Min,'
+        'Text Validation Max,Identifier?,'
+        'Branching Logic (Show field only if...),Required Field?\n'
+        'race,form,,checkbox,Race,"1, Asian | 2, White",,,,,,,\n'
+        'num,form,,text,Number,,,integer,,,,,\n'
+        'asian,form,,calc,Asian,"if([race(1)] = \'1\', [num], 0)",,,,,,,\n'
+        'other,form,,text,Other,,,,,,,"[race(2)] = \'0\'",\n'
+    )
+    package = redcap_to_rios(
+        id='urn:test-expression',
+        title='expression',
+        description='',
+        stream=stream,
+    )
+    rows = dict(
+        (row[0], row)
+        for rows in rios_to_redcap(
+            package['instrument'],
+            package['form'],
+            package['calculationset'],
+        )['instrument']
+        for row in rows
+    )
+    # Checkbox codes are canonical RIOS names
+    assert rows['asian'][5] == "if(([race(id_1)] = '1'), [num], 0)"
+    assert rows['other'][11] == "!(([race(id_2)] = '0'))"
+
+
+def test_redcap_long_expression():
+    text = ' + '.join('(([f%d])^(2))' % i for i in range(5000))
+    assert to_redcap(python(text)) == text
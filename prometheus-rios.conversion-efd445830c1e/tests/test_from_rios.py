@@ -0,0 +1,183 @@
+import csv
+
+import six
+import yaml
+
+from rios.conversion import rios_to_redcap
+from rios.conversion.redcap.from_rios import RedcapFromRios
+from rios.conversion.qualtrics.from_rios import LineWriter, QualtricsFromRios
+
+
+def load(name):
+    definitions = {}
+    for key, suffix in (('instrument', 'i'), ('form', 'f'),
+                        ('calculationset', 'c')):
+        try:
+            with open('./tests/rios/%s_%s.yaml' % (name, suffix)) as stream:
+                definitions[key] = yaml.safe_load(stream)
+        except IOError:
+            pass
+    return definitions
+
+
+def test_from_rios_types():
+    instrument = {
+        'id': 'urn:test-types',
+        'version': '1.0',
+        'title': 'types',
+        'types': {
+            'score': {'base': 'integer', 'range': {'min': 0, 'max': 10}},
+            'small_score': {'base': 'score', 'range': {'max': 5}},
+            'yes_no': {
+                'base': 'enumeration',
+                'enumerations': {'yes': {}, 'no': {}},
+            },
+        },
+        'record': [
+            {'id': 'q1', 'type': 'small_score'},
+            {'id': 'q2', 'type': 'small_score'},
+            {'id': 'q3', 'type': 'yes_no'},
+            {'id': 'q4', 'type': 'text'},
+            {'id': 'q5', 'type': {'base': 'score', 'range': {'min': 1}}},
+            {'id': 'q6', 'type': 'undefined'},
+        ],
+    }
+    converter = RedcapFromRios(form={}, instrument=instrument)
+    assert converter.types['q1'] == {
+        'base': 'integer',
+        'range': {'max': 5},
+    }
+    assert converter.types['q1'] is converter.types['q2']
+    assert converter.types['q3']['base'] == 'enumeration'
+    assert sorted(converter.types['q3']['enumerations']) == ['no', 'yes']
+    assert converter.get_type('q4') == {'base': 'text'}
+    assert converter.types['q5'] == {'base': 'integer', 'range': {'min': 1}}
+    assert 'q6' not in converter.types
+    try:
+        converter.get_type('q6')
+    except ValueError:
+        pass
+    else:
+        assert False, 'undefined type accepted'
+
+
+def test_redcap_stream():
+    for name in ('test_1', 'matrix_1', 'format_2'):
+        definitions = load(name)
+        package = rios_to_redcap(metrics=True, **definitions)
+        stream = six.StringIO()
+        streamed = rios_to_redcap(stream=stream, metrics=True, **definitions)
+        rows = [list(row) for row in package['instrument'][0]]
+        stream.seek(0)
+        assert list(csv.reader(stream)) == rows
+        assert streamed['instrument'] == []
+        assert streamed.get('logs') == package.get('logs')
+        assert streamed['metrics']['counters']['rows'] == len(rows) - 1
+
+
+def test_redcap_stream_unicode():
+    definitions = load('test_1')
+    question = definitions['form']['pages'][0]['elements'][0]
+    question['options']['text'] = {'en': u'Caf\xe9'}
+    package = rios_to_redcap(**definitions)
+    stream = six.BytesIO() if six.PY2 else six.StringIO()
+    rios_to_redcap(stream=stream, **definitions)
+    stream.seek(0)
+    rows = list(csv.reader(stream))
+    if six.PY2:
+        rows = [[cell.decode('utf-8') for cell in row] for row in rows]
+    assert rows == [list(row) for row in package['instrument'][0]]
+    assert rows[1][4] == u'Caf\xe9'
+
+
+def test_redcap_stream_failure():
+    definitions = load('test_1')
+    definitions['form'] = dict(definitions['form'], pages=[])
+    stream = six.StringIO()
+    package = rios_to_redcap(stream=stream, suppress=True, **definitions)
+    assert 'failure' in package
+
+
+def qualtrics_definitions():
+    def question(name):
+        return {
+            'type': 'question',
+            'options': {
+                'fieldId': name,
+                'text': {'en': name.title()},
+                'enumerations': [
+                    {'id': 'yes', 'text': {'en': 'Yes'}},
+                    {'id': 'no', 'text': {'en': 'No'}},
+                ],
+            },
+        }
+
+    return {
+        'instrument': {
+            'id': 'urn:test-qualtrics',
+            'version': '1.0',
+            'title': 'qualtrics',
+            'types': {
+                'yes_no': {
+                    'base': 'enumeration',
+                    'enumerations': {'yes': {}, 'no': {}},
+                },
+            },
+            'record': [
+                {'id': 'q1', 'type': 'yes_no'},
+                {'id': 'q2', 'type': {
+                    'base': 'enumerationSet',
+                    'enumerations': {'yes': {}, 'no': {}},
+                }},
+                {'id': 'q3', 'type': 'text'},
+            ],
+        },
+        'form': {
+            'pages': [
+                {'id': 'page1', 'elements': [question('q1')]},
+                {'id': 'page2', 'elements': [question('q2')]},
+                {'id': 'page3', 'elements': [question('q3')]},
+            ],
+        },
+    }
+
+
+def test_qualtrics_lines():
+    converter = QualtricsFromRios(**qualtrics_definitions())
+    converter()
+    assert converter.instrument == [
+        '1. Q1', '', 'Yes', 'No', '', '',
+        '[[PageBreak]]',
+        '2. Q2', '[[MultipleAnswer]]', '', 'Yes', 'No', '', '',
+        '[[PageBreak]]',
+    ]
+    assert len(converter.logs) == 1
+
+    stream = six.StringIO()
+    converter = QualtricsFromRios(stream=stream, **qualtrics_definitions())
+    converter()
+    assert converter.instrument == []
+    assert stream.getvalue() == '1. Q1\n\nYes\nNo\n\n\n[[PageBreak]]\n' \
+        '2. Q2\n[[MultipleAnswer]]\n\nYes\nNo\n\n\n[[PageBreak]]\n'
+
+
+def test_qualtrics_stream_unicode():
+    definitions = qualtrics_definitions()
+    question = definitions['form']['pages'][0]['elements'][0]
+    question['options']['text'] = {'en': u'Caf\xe9'}
+    stream = six.BytesIO() if six.PY2 else six.StringIO()
+    QualtricsFromRios(stream=stream, **definitions)()
+    text = stream.getvalue()
+    if six.PY2:
+        text = text.decode('utf-8')
+    assert text.startswith(u'1. Caf\xe9\n')
+
+
+def test_line_writer():
+    lines = []
+    writer = LineWriter(lines.append)
+    for line in ['[[PageBreak]]', '[[PageBreak]]', 'a', '', '', 'b', '', '']:
+        writer.append(line)
+    writer.close()
+    assert lines == ['a', '', '', 'b']
+    assert len(writer) == 4
@@ -0,0 +1,157 @@
+# -*- coding: utf-8 -*-
+import io
+import json
+import random
+
+import six
+
+from rios.conversion.exception import Error
+from rios.conversion.utils import JsonStream
+from rios.conversion.utils.backends import load_json
+from rios.conversion.qualtrics.to_rios import QualtricsToRios, read_survey
+
+
+def build(document):
+    character = document.peek()
+    if character == '{':
+        return dict((key, build(document)) for key in document.members())
+    if character == '[':
+        return [build(document) for _ in document.items()]
+    return document.value()
+
+
+def load(text, chunk_size):
+    document = JsonStream(six.StringIO(text), chunk_size)
+    value = build(document)
+    document.close()
+    return value
+
+
+def generate(generator, depth=0):
+    kind = generator.randrange(7 if depth < 4 else 4)
+    if kind == 0:
+        return generator.randrange(-100000, 100000)
+    if kind == 1:
+        return generator.choice([True, False, None, 1.5e10, -0.25])
+    if kind in (2, 3):
+        return u''.join(
+            generator.choice(u'ab"\\\né{}[],: ')
+            for _ in range(generator.randrange(12))
+        )
+    if kind in (4, 5):
+        return dict(
+            (u'k%d"\\' % index, generate(generator, depth + 1))
+            for index in range(generator.randrange(4))
+        )
+    return [
+        generate(generator, depth + 1)
+        for _ in range(generator.randrange(4))
+    ]
+
+
+def test_json_stream():
+    generator = random.Random(0)
+    for _ in range(200):
+        value = generate(generator)
+        text = json.dumps(value, indent=generator.choice([None, 1]))
+        for chunk_size in (1, 2, 3, 7, 4096):
+            assert load(text, chunk_size) == value, (text, chunk_size)
+
+
+def test_json_stream_skip():
+    text = json.dumps({
+        'skipped': {'a': [1, 2, {'b': '}]"'}], 'c': 'x' * 100},
+        'kept': [1, 'two', None],
+        'number': 12345,
+    })
+    for chunk_size in (1, 5, 4096):
+        document = JsonStream(six.StringIO(text), chunk_size)
+        found = {}
+        for key in document.members():
+            if key == 'skipped':
+                document.skip()
+            elif key == 'kept':
+                found[key] = document.text()
+            else:
+                found[key] = document.value()
+        document.close()
+        assert found == {'kept': '[1, "two", null]', 'number': 12345}
+
+
+def test_json_stream_bytes():
+    text = u'{"text": "été", "list": [1]}'
+    document = JsonStream(io.BytesIO(text.encode('utf-8')), 1)
+    assert build(document) == {u'text': u'été', u'list': [1]}
+
+
+def test_json_stream_invalid():
+    for text in ('{"a": 1', '[1, 2', '{"a" 1}', '"abc', '{"a": }',
+                 '[1,]', '{,}', '[1] x', '{"a": [}', ''):
+        try:
+            load(text, 2)
+        except ValueError:
+            pass
+        else:
+            assert False, 'accepted: {!r}'.format(text)
+
+
+def test_read_survey():
+    question = {'QuestionID': 'QID1', 'QuestionText': 'Question'}
+    text = (
+        '{"SurveyEntry": {"SurveyID": "SV_1"},'
+        ' "SurveyElements": ['
+        '{"SurveyID": "SV_1", "Element": "FL", "Payload": {"a": [1, 2]}},'
+        '{"SurveyID": "SV_1", "Element": "SQ", "Payload": %s},'
+        '{"Payload": {"Element": "FL"}, "Element": "SQ"},'
+        '{"Payload": null, "Element": "QO"},'
+        '{"Payload": null},'
+        'null'
+        '], "Other": {"Element": "SQ"}}'
+    ) % json.dumps(question)
+    survey = read_survey(six.StringIO(text))
+    assert survey == {
+        'SurveyEntry': {'SurveyID': 'SV_1'},
+        'SurveyElements': [
+            {'SurveyID': 'SV_1', 'Element': 'SQ', 'Payload': question},
+            {'Payload': {'Element': 'FL'}, 'Element': 'SQ'},
+            {'Payload': None},
+            None,
+        ],
+    }
+
+
+def test_read_survey_invalid():
+    filename = './tests/qualtrics/bad_json.qsf'
+    with open(filename, 'r') as stream:
+        try:
+            load_json(stream)
+        except ValueError as exc:
+            expected = str(exc)
+    for stream in (filename, open(filename, 'r')):
+        try:
+            read_survey(stream)
+        except ValueError as exc:
+            assert str(exc) == expected, str(exc)
+        else:
+            assert False, 'accepted: {!r}'.format(filename)
+
+
+class UnreadableStream(object):
+    def read(self, size=-1):
+        raise AssertionError('stream read again')
+
+
+def test_qualtrics_to_rios_empty_document():
+    converter = QualtricsToRios(
+        id='urn:empty',
+        title='empty',
+        description='',
+        stream=UnreadableStream(),
+        document={},
+    )
+    try:
+        converter()
+    except Error as exc:
+        assert 'stream read again' not in str(exc), str(exc)
+    else:
+        assert False, 'accepted an empty document'
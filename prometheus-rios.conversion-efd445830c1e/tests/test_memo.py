@@ -0,0 +1,134 @@
+from rios.conversion import redcap_to_rios
+from rios.conversion.redcap.to_rios import (
+    canonical_name,
+    expression_table,
+    translate_expression,
+)
+from rios.conversion.utils import LruTable, MemoTable
+
+
+def test_memo_table():
+    calls = []
+
+    def upper(key):
+        calls.append(key)
+        return key.upper()
+
+    table = MemoTable(upper, max_size=2)
+    assert table('a') == 'A'
+    assert table('a') == 'A'
+    assert calls == ['a']
+    assert table.stats == {
+        'hits': 1,
+        'misses': 1,
+        'hit_rate': 0.5,
+        'size': 1,
+    }
+    table('b')
+    table('c')
+    assert len(table) == 1
+    table('a')
+    assert calls == ['a', 'b', 'c', 'a']
+
+
+def test_canonical_name():
+    names = MemoTable(canonical_name)
+    assert names('Choices, Calculations, OR Slider Labels') == \
+        'choices_or_calculations'
+    assert names(' 1st Form ') == 'id_1st_form'
+    try:
+        names(None)
+    except ValueError:
+        pass
+    else:
+        assert False, 'None was accepted'
+
+
+def test_shared_names():
+    names = MemoTable(canonical_name)
+    counters = []
+    for _ in range(2):
+        with open('./tests/redcap/matrix_1.csv', 'r') as stream:
+            package = redcap_to_rios(
+                id='urn:memo-test',
+                title='memo',
+                description='',
+                stream=stream,
+                metrics=True,
+                names=names,
+            )
+        counters.append(package['metrics']['counters'])
+    assert counters[0]['name_misses'] > 0
+    assert counters[1]['name_misses'] == 0
+    assert counters[1]['name_hits'] == (
+        counters[0]['name_hits'] + counters[0]['name_misses']
+    )
+    assert names.hit_rate > 0.5
+
+
+def test_lru_table():
+    calls = []
+
+    def upper(key):
+        calls.append(key)
+        return key.upper()
+
+    table = LruTable(upper, max_size=2)
+    table('a')
+    table('b')
+    assert table('a') == 'A'
+    table('c')
+    assert len(table) == 2
+    table('a')
+    table('b')
+    assert calls == ['a', 'b', 'c', 'b']
+    assert table.hits == 2
+
+
+def test_translate_expression():
+    assert translate_expression(('trigger', '[c] = 1', frozenset())) == \
+        '!(assessment["c"] = 1)'
+    assert translate_expression(('trigger', '[c] = 1', frozenset(['c']))) \
+        == '!(calculations["c"] = 1)'
+    assert translate_expression(('calculation', '[a]^2', frozenset())) == \
+        'math.pow(assessment["a"], 2)'
+    assert translate_expression(
+        ('redcap', 'math.pow(assessment["a"], 2)', frozenset())
+    ) == '([a])^(2)'
+
+
+def test_shared_expressions():
+    expressions = expression_table()
+    packages = []
+    for _ in range(2):
+        with open('./tests/redcap/complex_1.csv', 'r') as stream:
+            packages.append(redcap_to_rios(
+                id='urn:memo-test',
+                title='memo',
+                description='',
+                stream=stream,
+                metrics=True,
+                expressions=expressions,
+            ))
+    first, second = [package['metrics']['counters'] for package in packages]
+    assert first['expression_misses'] > 0
+    assert second['expression_misses'] == 0
+    assert second['expression_hits'] == (
+        first['expression_hits'] + first['expression_misses']
+    )
+    assert 'INFO: Expression cache: 4 hits, 0 misses, 100.0% hit rate' in \
+        packages[1]['logs']
+    assert packages[0]['calculationset'] == packages[1]['calculationset']
+
+
+def test_expression_lookups_logged():
+    with open('./tests/redcap/complex_1.csv', 'r') as stream:
+        package = redcap_to_rios(
+            id='urn:memo-test',
+            title='memo',
+            description='',
+            stream=stream,
+        )
+    assert 'metrics' not in package
+    assert 'INFO: Expression cache: 0 hits, 4 misses, 0.0% hit rate' in \
+        package['logs']
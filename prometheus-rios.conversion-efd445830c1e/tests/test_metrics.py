@@ -0,0 +1,105 @@
+import yaml
+
+
+from rios.conversion import (
+    redcap_to_rios,
+    qualtrics_to_rios,
+    rios_to_redcap,
+    rios_to_qualtrics,
+)
+from rios.conversion.utils import ConversionMetrics, NULL_METRICS
+
+
+def check_metrics(package, phases):
+    metrics = package['metrics']
+    for phase in phases:
+        assert metrics['phases'][phase]['count'] == 1, phase
+        assert metrics['phases'][phase]['time'] >= 0
+    return metrics['counters']
+
+
+def test_metrics_disabled():
+    with open('./tests/redcap/matrix_1.csv', 'r') as stream:
+        package = redcap_to_rios(
+            id='urn:metrics-test',
+            title='metrics',
+            description='',
+            stream=stream,
+        )
+    assert 'metrics' not in package
+    with NULL_METRICS.phase('read'):
+        NULL_METRICS.count('rows')
+    assert NULL_METRICS.as_dict() == {}
+
+
+def test_metrics_phases():
+    metrics = ConversionMetrics()
+    with metrics.phase('read'):
+        metrics.count('rows', 3)
+    with metrics.phase('read'):
+        pass
+    report = metrics.as_dict()
+    assert report['phases']['read']['count'] == 2
+    assert report['phases']['process']['count'] == 0
+    assert report['counters']['rows'] == 3
+
+
+def test_to_rios_metrics():
+    with open('./tests/redcap/matrix_1.csv', 'r') as stream:
+        package = redcap_to_rios(
+            id='urn:metrics-test',
+            title='metrics',
+            description='',
+            stream=stream,
+            metrics=True,
+        )
+    counters = check_metrics(
+        package,
+        ('read', 'process', 'finalize', 'validate', 'serialize'),
+    )
+    assert counters['rows'] > 0
+    assert counters['fields'] == len(package['instrument']['record'])
+    assert counters['errors'] == 0
+
+
+def test_failure_metrics():
+    with open('./tests/redcap/bad_format.csv', 'r') as stream:
+        package = redcap_to_rios(
+            id='urn:metrics-test',
+            title='metrics',
+            description='',
+            stream=stream,
+            suppress=True,
+            metrics=True,
+        )
+    assert 'failure' in package
+    assert package['metrics']['counters']['errors'] == 1
+
+    with open('./tests/qualtrics/bad_element_type.qsf', 'r') as stream:
+        package = qualtrics_to_rios(
+            stream=stream,
+            filemetadata=True,
+            suppress=True,
+            metrics=True,
+        )
+    assert 'failure' in package
+    # The metadata and the questions are read in two phases, from one parse
+    assert package['metrics']['phases']['read']['count'] == 2
+
+
+def test_from_rios_metrics():
+    definitions = {}
+    for key, suffix in (('instrument', 'i'), ('form', 'f'),
+                        ('calculationset', 'c')):
+        with open('./tests/rios/test_1_%s.yaml' % suffix, 'r') as stream:
+            definitions[key] = yaml.safe_load(stream)
+    for convert in (rios_to_redcap, rios_to_qualtrics):
+        package = convert(metrics=True, suppress=True, **definitions)
+        counters = check_metrics(
+            package,
+            ('read', 'process', 'validate', 'serialize'),
+        )
+        assert counters['fields'] == len(definitions['instrument']['record'])
+        assert counters['calculations'] == len(
+            definitions['calculationset']['calculations']
+        )
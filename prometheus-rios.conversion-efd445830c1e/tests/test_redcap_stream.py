@@ -0,0 +1,52 @@
+import six
+
+from rios.conversion.redcap.to_rios import RedcapToRios
+
+from utils import convert
+
+
+def test_page_order():
+    converter = convert('./tests/redcap/complex_1.csv')
+    assert [page['id'] for page in converter.form['pages']] == [
+        'demographics',
+        'baseline_data',
+        'month_1_data',
+        'month_2_data',
+        'month_3_data',
+        'completion_data',
+    ]
+
+
+def test_line_numbers():
+    converter = convert('./tests/redcap/bad_field_type.csv')
+    assert converter.logs[0].startswith('WARNING: Skipping line: 4.')
+
+
+def test_rows_read_lazily():
+    with open('./tests/redcap/matrix_1.csv', 'r') as stream:
+        lines = stream.readlines()
+    read = []
+
+    class Lines(object):
+        def __iter__(self):
+            for line in lines:
+                read.append(line)
+                yield line
+
+    converter = RedcapToRios(
+        id='urn:stream-test',
+        title='stream',
+        description='',
+        stream=Lines(),
+    )
+    seen = []
+    process_page = converter.get_page
+
+    def get_page(row):
+        seen.append(len(read))
+        return process_page(row)
+
+    converter.get_page = get_page
+    converter()
+    # Each row is processed right after it is read
+    assert seen == list(six.moves.range(2, len(lines) + 1))
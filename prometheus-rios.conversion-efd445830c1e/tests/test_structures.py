@@ -0,0 +1,95 @@
+import pickle
+
+from rios.conversion.base import structures
+
+from utils import convert
+
+
+def test_finalize_memoizes():
+    converter = convert('./tests/redcap/complex_1.csv')
+    instrument = converter.instrument
+    assert converter.instrument is instrument
+    assert converter.form is converter.form
+    package = converter.package
+    assert package['instrument'] is instrument
+    assert package['form'] is converter.form
+
+
+def test_finalize_invalidation():
+    converter = convert('./tests/redcap/matrix_1.csv')
+    instrument = converter.instrument
+    package = converter.package
+    count = structures.mutation_count()
+    converter._instrument.add_field(structures.FieldObject(
+        id='added_field',
+        type='text',
+    ))
+    assert structures.mutation_count() > count
+    updated = converter.package['instrument']
+    assert updated is not package['instrument']
+    assert updated['record'][-1]['id'] == 'added_field'
+    assert converter.instrument is updated
+    assert instrument['record'][-1]['id'] != 'added_field'
+
+    converter._instrument['title'] = 'Changed'
+    assert converter.package['instrument']['title'] == 'Changed'
+
+
+def test_finalize_calculationset():
+    converter = convert('./tests/redcap/matrix_1.csv')
+    assert converter.calculationset == {}
+    converter._calculationset.add(structures.CalculationObject(
+        id='total',
+        type='float',
+        method='python',
+        options={'expression': '1.0'},
+    ))
+    package = converter.package
+    assert package['calculationset']['calculations'][0]['id'] == 'total'
+    assert package['calculationset'] is converter.calculationset
+
+
+def test_record_lazy_children():
+    question = structures.QuestionObject(fieldId='q1')
+    assert 'enumerations' not in question
+    assert list(question.keys()) == ['fieldId']
+    # Reading an unset attribute does not set it
+    assert question['enumerations'] == []
+    assert question['text'] == {}
+    assert list(question.keys()) == ['fieldId']
+    question.add_enumeration(structures.DescriptorObject(id='yes'))
+    assert 'enumerations' in question
+    assert question['enumerations'][0]['id'] == 'yes'
+    assert not hasattr(question, '__dict__')
+
+
+def test_record_defaults():
+    field = structures.FieldObject(id='f1')
+    assert field['required'] is False
+    assert field.get('description') is None
+    assert field['description'] == ''
+    try:
+        field['undeclared'] = 1
+    except KeyError:
+        pass
+    else:
+        assert False, 'undeclared attribute was set'
+
+
+def test_record_clean_as_dict():
+    field = structures.FieldObject(id='f1', type='text')
+    field['description'] = ''
+    field.clean()
+    assert field.as_dict() == {
+        'id': 'f1',
+        'type': 'text',
+        'identifiable': False,
+        'required': False,
+    }
+
+
+def test_record_pickle():
+    converter = convert('./tests/redcap/matrix_1.csv')
+    instrument = pickle.loads(pickle.dumps(converter._instrument))
+    assert type(instrument) is structures.Instrument
+    assert instrument == converter._instrument
@@ -0,0 +1,77 @@
+import os
+import shutil
+import sys
+import tempfile
+
+import six
+
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'benchmarks'))
+import synthetic  # noqa:E402
+import run  # noqa:E402
+
+
+def test_synthetic_conversions():
+    directory = tempfile.mkdtemp()
+    try:
+        filenames = synthetic.write_all(200, directory, headers=False)
+        assert len(filenames) == 5
+        base = os.path.join(directory, 'synthetic_200')
+        for function in run.FUNCTIONS:
+            result = run.measure(function, base, 1)
+            assert result['failure'] is None, result['failure']
+    finally:
+        shutil.rmtree(directory)
+
+
+def test_synthetic_mix():
+    fields = synthetic.generate_fields(
+        100,
+        mix=synthetic.parse_mix('matrix=1,dropdown=1'),
+        branching=1.0,
+    )
+    assert len(fields) == 100
+    assert set(f['kind'] for f in fields) == set(['matrix', 'dropdown'])
+    assert all(
+        f['branch'] for f in fields
+        if f['kind'] == 'dropdown' and f['name'] != 'dropdown_1'
+    )
+    assert fields == synthetic.generate_fields(
+        100,
+        mix=synthetic.parse_mix('matrix=1,dropdown=1'),
+        branching=1.0,
+    )
+
+
+def test_scaling_slopes():
+    results = [
+        {'size': 100, 'seconds': 1.0},
+        {'size': 1000, 'seconds': 10.0},
+        {'size': 10000, 'seconds': 1000.0},
+    ]
+    linear, quadratic = run.slopes(results)
+    assert abs(linear - 1.0) < 1e-9
+    assert abs(quadratic - 2.0) < 1e-9
+
+
+class CountingStream(six.StringIO):
+    def __init__(self, *args):
+        six.StringIO.__init__(self, *args)
+        self.passes = 0
+
+    def seek(self, *args):
+        self.passes += 1
+        return six.StringIO.seek(self, *args)
+
+
+def test_qualtrics_single_read():
+    from rios.conversion import qualtrics_to_rios
+
+    output = six.StringIO()
+    synthetic.write_qualtrics(synthetic.generate_fields(50), output)
+    stream = CountingStream(output.getvalue())
+    package = qualtrics_to_rios(stream=stream, filemetadata=True)
+    assert stream.passes == 1
+    assert package['instrument']['id'] == 'urn:SV_synthetic'
+    assert package['instrument']['title'] == 'Synthetic survey'
+    assert len(package['instrument']['record']) > 0
@@ -0,0 +1,92 @@
+from nose.plugins.skip import SkipTest
+
+try:
+    import numpy
+except ImportError:
+    raise SkipTest('NumPy is not installed')
+
+import rios.conversion.redcap.functions as F
+import rios.conversion.redcap.vectorized as V
+
+
+def same(array, values):
+    return numpy.allclose(array, values, equal_nan=True)
+
+
+def test_aggregates():
+    a = [1, 2, None, 4.5]
+    b = [3, '', None, 0.5]
+    c = numpy.array([2, 2, numpy.nan, -1])
+    records = [
+        [x for x in values if x not in (None, '') and x == x]
+        for values in zip(a, b, c)
+    ]
+    for name in ('mean', 'median', 'stdev', 'sum_'):
+        expected = [getattr(F, name)(*values) for values in records]
+        expected = [numpy.nan if x is None else x for x in expected]
+        assert same(getattr(V, name)(a, b, c), expected), name
+    # Records without values aggregate as the functions without arguments
+    assert same(V.mean([None], ['']), [0.0])
+    assert same(V.sum_([None], ['']), [0])
+    assert same(V.stdev([None], ['']), [0.0])
+    assert numpy.isnan(V.median([None], [''])).all()
+    assert same(V.sum_([1, 2], 10), [11, 12])
+
+
+def test_rounding():
+    numbers = [0.1235, -0.1235, 0.1234, 2.5, -2.5, 1.1, numpy.nan]
+    for name in ('round_', 'roundup', 'rounddown'):
+        for places in (0, 1, 3):
+            expected = [
+                getattr(F, name)(x, places) if x == x else numpy.nan
+                for x in numbers
+            ]
+            assert same(getattr(V, name)(numbers, places), expected), name
+
+
+def test_datediff():
+    first = ['12-25-2000', '02-01-2000', None, '01-01-2001']
+    second = ['01-01-2001', '03-01-2000', '01-01-2001', '']
+    for redcap in (False, True):
+        for units in ('y', 'M', 'd', 'h', 'm', 's'):
+            result = V.datediff(first, second, units, 'mdy', redcap)
+            assert same(result[:2], [
+                F.datediff(x, y, units, 'mdy', redcap)
+                for x, y in zip(first[:2], second[:2])
+            ]), (redcap, units)
+            assert numpy.isnan(result[2:]).all()
+    assert same(V.datediff('2000-01-31', ['2000-01-01'], 'd', signed=True,
+                           redcap=True),
+                [30.0])
+    today = V.datediff('today', ['2000-01-01', '2010-01-01'], 'y')
+    assert same(today, [F.datediff('today', '2000-01-01', 'y'),
+                        F.datediff('today', '2010-01-01', 'y')])
+    today = V.datediff('today', ['2000-01-01'], 'y', redcap=True)
+    assert same(today, [F.datediff('today', '2000-01-01', 'y',
+                                   redcap=True)])
+    try:
+        V.datediff(first, second, 'x')
+    except ValueError:
+        pass
+    else:
+        assert False, "'x' is not supposed to be a valid unit."
+
+
+def test_median():
+    assert F.median(1, 2, 3) == 2.0
+    assert F.median(4, 1, 3, 2) == 2.5
+
+
+def test_datediff_semantics():
+    # By default, the difference is signed, with 365 day years and 30 day
+    # months, divided as the "/" operator does
+    assert F.datediff('2000-01-01', '2001-01-01', 'd') == -366
+    assert F.datediff('2001-01-01', '2000-01-01', 'y') == 366 / 365
+    assert F.datediff('2000-03-01', '2000-01-01', 'M') == 60 / 30
+    assert F.datediff('2000-01-02', '2000-01-01', 'h') == 24
+    # REDCap's float difference, absolute unless signed
+    assert F.datediff('2000-01-01', '2001-01-01', 'd', redcap=True) == 366.0
+    assert F.datediff('2000-01-01', '2001-01-01', 'd', redcap=True,
+                      signed=True) == -366.0
+    assert F.datediff('2001-01-01', '2000-01-01', 'y', redcap=True) \
+        == 366 * 86400 / F.SECONDS_PER_UNIT['y']
@@ -0,0 +1,103 @@
+from nose.plugins.skip import SkipTest
+
+try:
+    # The evaluator requires NumPy
+    from rios.conversion.engine.visibility import VisibilityEvaluator
+except ImportError:
+    raise SkipTest('NumPy is not installed')
+
+from rios.conversion import redcap_to_rios
+from rios.conversion.exception import ConversionValueError
+
+
+def form(*questions):
+    return {
+        'instrument': {'id': 'urn:test-visibility', 'version': '1.0'},
+        'pages': [{
+            'id': 'page1',
+            'elements': [
+                {
+                    'type': 'question',
+                    'options': dict(
+                        {'fieldId': field},
+                        **({'events': [{
+                            'trigger': trigger,
+                            'action': 'disable',
+                        }]} if trigger else {})
+                    ),
+                }
+                for field, trigger in questions
+            ],
+        }],
+    }
+
+
+def test_redcap_package():
+    with open('./tests/redcap/complex_1.csv', 'r') as stream:
+        package = redcap_to_rios(
+            id='urn:test-visibility',
+            title='visibility',
+            description='',
+            stream=stream,
+        )
+    evaluator = VisibilityEvaluator(package)
+    matrix = evaluator.evaluate([
+        {'sex': '0', 'given_birth': '1'},
+        {'sex': 0, 'given_birth': '0'},
+        {'sex': '1'},
+        {},
+    ])
+    assert matrix.visible.shape == (4, len(evaluator.fields))
+    assert matrix.column('given_birth').tolist() == [True, True, False, False]
+    assert matrix.column('num_children').tolist() == \
+        [True, False, False, False]
+    assert matrix.counts()['sex'] == 4
+
+
+def test_expressions():
+    evaluator = VisibilityEvaluator(form(
+        ('a', None),
+        ('b', '!(assessment["a"] > 2 and assessment["a"] != "5")'),
+        ('c', '!(("yes" in assessment["d"]) or assessment["a"] = "")'),
+        ('e', '!(rios.conversion.redcap.functions.sum_(assessment["a"], 1)'
+              ' >= 4)'),
+        ('f', '!(math.pow(assessment["a"], 2) = 9 or not assessment["x"])'),
+        ('g', '!(if(assessment["a"] < 3, "low", "high") = "high")'),
+    ))
+    matrix = evaluator.evaluate([
+        {'a': '3', 'd': ['yes']},
+        {'a': 5, 'd': [], 'x': 0},
+        {'a': '', 'x': '1'},
+        {'instrument': {}, 'values': {'a': {'value': 1.0}}},
+    ])
+    assert evaluator.fields == ('a', 'b', 'c', 'e', 'f', 'g')
+    assert matrix.visible.tolist() == [
+        [True, True, True, True, True, True],
+        [True, False, False, True, True, True],
+        [True, False, True, False, False, True],
+        [True, False, False, False, True, False],
+    ]
+
+
+def test_targets():
+    definition = form(('a', None), ('b', None), ('c', None))
+    definition['pages'][0]['elements'][0]['options']['events'] = [{
+        'trigger': 'assessment["a"] = 1',
+        'action': 'hide',
+        'targets': ['b', 'c', 'unknown'],
+    }]
+    matrix = VisibilityEvaluator(definition).evaluate([{'a': 1}, {'a': 2}])
+    assert matrix.visible.tolist() == [
+        [True, False, False],
+        [True, True, True],
+    ]
+
+
+def test_invalid():
+    for trigger in ('!(unknown_function(assessment["a"]))', '!(['):
+        try:
+            VisibilityEvaluator(form(('a', trigger)))
+        except ConversionValueError:
+            pass
+        else:
+            assert False, 'accepted: ' + trigger
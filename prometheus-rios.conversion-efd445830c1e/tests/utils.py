@@ -2,9 +2,25 @@ import glob
 import os
 import re
 import simplejson
-import yaml
 import six
 
+from rios.conversion.redcap.to_rios import RedcapToRios
+from rios.conversion.utils import load_definition
+
+
+def convert(filename):
+    """ Returns the RedcapToRios converter run on a REDCap CSV file """
+
+    with open(filename, 'r') as stream:
+        converter = RedcapToRios(
+            id='urn:test',
+            title='test',
+            description='',
+            stream=stream,
+        )
+        converter()
+    return converter
+
 
 def flatten(array):
     result = []
@@ -44,32 +60,34 @@ def qualtrics_to_rios_tsts(name):
         dict(test_base, **test_combined)
     ]
 
-rios_redcap_mismatch_tests = [
-    {
-        'calculationset': open('./tests/rios/format_1_c.yaml', 'r'),
-        'instrument': open('./tests/rios/matrix_1_i.yaml', 'r'),
-        'form': open('./tests/rios/matrix_1_f.yaml', 'r'),
-        'localization': None,
-    },
-    {
-        'calculationset': open('./tests/rios/format_1_c.yaml', 'r'),
-        'instrument': open('./tests/rios/matrix_1_i.yaml', 'r'),
-        'form': open('./tests/rios/format_1_f.yaml', 'r'),
-        'localization': None,
-    },
-]
+def rios_redcap_mismatch_tsts():
+    # Opened when called: the format_1 fixtures are not part of the tree
+    return [
+        {
+            'calculationset': open('./tests/rios/format_1_c.yaml', 'r'),
+            'instrument': open('./tests/rios/matrix_1_i.yaml', 'r'),
+            'form': open('./tests/rios/matrix_1_f.yaml', 'r'),
+            'localization': None,
+        },
+        {
+            'calculationset': open('./tests/rios/format_1_c.yaml', 'r'),
+            'instrument': open('./tests/rios/matrix_1_i.yaml', 'r'),
+            'form': open('./tests/rios/format_1_f.yaml', 'r'),
+            'localization': None,
+        },
+    ]
 
 def rios_tst(name):
     calc_filename = './tests/rios/%s_c.yaml' % name
     test_base = {
-        'instrument': yaml.load(open('./tests/rios/%s_i.yaml' % name, 'r')),
-        'form': yaml.load(open('./tests/rios/%s_f.yaml' % name, 'r')),
+        'instrument': load_definition('./tests/rios/%s_i.yaml' % name),
+        'form': load_definition('./tests/rios/%s_f.yaml' % name),
         'localization': None,
     }
 
     if os.access(calc_filename, os.F_OK):
         test = dict(
-            {'calculationset': yaml.load(open(calc_filename, 'r'))},
+            {'calculationset': load_definition(calc_filename)},
             **test_base
         )
     else: